@@ -0,0 +1,89 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Building networks: creating components and adding them to networks and
+    institutions.
+"""
+
+from pynsim import Network
+
+from benchmarks.common import (DummyNode, DummyInstitution, make_nodes, make_links)
+
+
+class Construction(object):
+    """
+        Adding components which already exist to a new network.
+    """
+    params = [1000, 10000, 100000]
+    param_names = ['components']
+
+    def setup(self, components):
+        self.nodes = make_nodes(components)
+        self.links = make_links(self.nodes)
+        self.institutions = [DummyInstitution(name="Institution %s" % i)
+                             for i in range(components)]
+
+    def time_add_node(self, components):
+        network = Network("Construction")
+        for n in self.nodes:
+            network.add_node(n)
+
+    def time_add_nodes(self, components):
+        Network("Construction").add_nodes(*self.nodes)
+
+    def time_add_link(self, components):
+        network = Network("Construction")
+        for l in self.links:
+            network.add_link(l)
+
+    def time_add_institution(self, components):
+        network = Network("Construction")
+        for i in self.institutions:
+            network.add_institution(i)
+
+
+class InstitutionMembership(object):
+    """
+        Filling institutions with the nodes of a network: institutions x
+        nodes in each.
+    """
+    params = ([10, 100], [1000, 10000])
+    param_names = ['institutions', 'nodes']
+    timeout = 300
+
+    def setup(self, institutions, nodes):
+        self.nodes = make_nodes(nodes)
+
+    def time_add_nodes(self, institutions, nodes):
+        for i in range(institutions):
+            DummyInstitution(name="Institution %s" % i).add_nodes(*self.nodes)
+
+
+class ComponentCreation(object):
+    """
+        Creating the components themselves.
+    """
+    params = [1000, 10000, 100000]
+    param_names = ['components']
+
+    def time_make_nodes(self, components):
+        make_nodes(components)
+
+    def time_make_node_with_properties(self, components):
+        for i in range(components):
+            DummyNode(x=i, y=i, name="Node %s" % i, value=float(i))
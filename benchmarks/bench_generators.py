@@ -0,0 +1,99 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Generating synthetic networks, and simulating them.
+"""
+
+from pynsim.generators import irrigation_districts, overlapping_institutions, river_network
+
+from benchmarks.common import SEED, build_river_simulator, traced
+
+
+class GenerateRiver(object):
+    """
+        A river of nodes, with about as many reaches and a tenth as many
+        demand nodes and diversions. 500000 nodes make about 1M components.
+    """
+    params = [1000, 10000, 100000, 500000]
+    param_names = ['nodes']
+    timeout = 600
+
+    def time_river_network(self, nodes):
+        river_network(nodes, seed=SEED)
+
+    def peakmem_river_network(self, nodes):
+        river_network(nodes, seed=SEED)
+
+    def track_river_network_bytes(self, nodes):
+        return traced(river_network, nodes, SEED)[2]
+    track_river_network_bytes.unit = 'bytes'
+
+
+class GenerateIrrigation(object):
+    """
+        A square grid of fields in districts of 10 x 10.
+    """
+    params = [10, 100, 700]
+    param_names = ['side']
+    timeout = 600
+
+    def time_irrigation_districts(self, side):
+        irrigation_districts(side, side, seed=SEED)
+
+    def peakmem_irrigation_districts(self, side):
+        irrigation_districts(side, side, seed=SEED)
+
+
+class GenerateInstitutions(object):
+    """
+        Institutions holding a random tenth of the nodes of a river each.
+    """
+    params = ([10, 100], [10000, 100000])
+    param_names = ['institutions', 'nodes']
+    number = 1
+    repeat = (3, 10, 60.0)
+    warmup_time = 0
+    timeout = 600
+
+    def setup(self, institutions, nodes):
+        self.network = river_network(nodes, seed=SEED)
+
+    def time_overlapping_institutions(self, institutions, nodes):
+        overlapping_institutions(self.network, institutions, 0.1, seed=SEED)
+
+
+class RiverSimulation(object):
+    """
+        Simulator.start on a synthetic river, whose headwaters and demand
+        nodes read their time series at each timestep.
+    """
+    params = ([1000, 10000, 100000], [100, 365])
+    param_names = ['nodes', 'timesteps']
+    number = 1
+    repeat = (3, 10, 60.0)
+    warmup_time = 0
+    timeout = 600
+
+    def setup(self, nodes, timesteps):
+        self.simulator = build_river_simulator(nodes, timesteps)
+
+    def time_start(self, nodes, timesteps):
+        self.simulator.start()
+
+    def peakmem_start(self, nodes, timesteps):
+        self.simulator.start()
@@ -0,0 +1,82 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Recording the history of a simulation, and exporting and loading it.
+"""
+
+import logging
+import os
+import shutil
+import tempfile
+
+from pynsim import history
+
+from benchmarks.common import DummyNode, DictNode, build_network, build_simulator
+
+
+class PostProcess(object):
+    """
+        Recording a timestep in the history, with scalar properties or with
+        dict properties, which are copied.
+    """
+    params = (['scalar', 'dict'], [1000, 10000, 100000])
+    param_names = ['properties', 'components']
+
+    def setup(self, properties, components):
+        node_class = DictNode if properties == 'dict' else DummyNode
+        self.network = build_network(components, node_class=node_class)
+        self.network.setup_components(0)
+
+    def time_post_process(self, properties, components):
+        self.network.post_process()
+
+
+class ExportLoad(object):
+    """
+        Exporting the history of a run of 100 timesteps as json, and loading
+        it.
+    """
+    params = [1000, 10000]
+    param_names = ['components']
+    number = 1
+    repeat = (3, 10, 60.0)
+    warmup_time = 0
+    timeout = 300
+
+    def setup(self, components):
+        #export_history warns about exporting the complete history each time
+        logging.disable(logging.WARNING)
+        self.tmp_dir = tempfile.mkdtemp()
+        s = build_simulator(components, 100)
+        s.start()
+        self.network = s.network
+        self.path = self.network.export_history(target_dir=self.tmp_dir)
+
+    def teardown(self, components):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.tmp_dir)
+
+    def time_export(self, components):
+        self.network.export_history(target_dir=self.tmp_dir)
+
+    def time_load(self, components):
+        history.load(self.path)
+
+    def track_export_bytes(self, components):
+        return os.path.getsize(self.path)
+    track_export_bytes.unit = 'bytes'
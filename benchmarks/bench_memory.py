@@ -0,0 +1,158 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    The memory used by building networks, by the history of long runs, by
+    running simulations one after another in the same process and by
+    exporting the history.
+
+    The peakmem benchmarks give the peak resident memory of the process
+    which runs them, setup included. The track benchmarks give the bytes
+    allocated by python while the benchmark runs, from tracemalloc, which
+    do not depend on what else the process has done and so compare well
+    between versions.
+"""
+
+import gc
+import logging
+import shutil
+import tempfile
+
+from pynsim.metrics import history_bytes, resident_memory
+
+from benchmarks.common import build_membership, build_network, build_simulator, traced
+
+
+class ConstructionMemory(object):
+    """
+        The memory held by a network of nodes and links.
+    """
+    params = [1000, 10000, 100000]
+    param_names = ['components']
+    timeout = 300
+
+    def peakmem_build_network(self, components):
+        build_network(components)
+
+    def track_network_bytes(self, components):
+        return traced(build_network, components)[2]
+    track_network_bytes.unit = 'bytes'
+
+
+class InstitutionMemory(object):
+    """
+        The memory held by institutions which overlap, each holding all the
+        nodes of the network.
+    """
+    params = ([10, 100], [1000, 10000])
+    param_names = ['institutions', 'nodes']
+    timeout = 300
+
+    def peakmem_build_membership(self, institutions, nodes):
+        build_membership(institutions, nodes)
+
+    def track_membership_bytes(self, institutions, nodes):
+        return traced(build_membership, institutions, nodes)[2]
+    track_membership_bytes.unit = 'bytes'
+
+
+class HistoryMemory(object):
+    """
+        The memory held by the history as a run goes on.
+    """
+    params = ([100, 1000], [100, 1000, 10000])
+    param_names = ['components', 'timesteps']
+    timeout = 600
+
+    def setup(self, components, timesteps):
+        self.simulator = build_simulator(components, timesteps)
+
+    def peakmem_start(self, components, timesteps):
+        self.simulator.start()
+
+    def track_start_bytes(self, components, timesteps):
+        return traced(self.simulator.start)[2]
+    track_start_bytes.unit = 'bytes'
+
+    def track_history_bytes(self, components, timesteps):
+        self.simulator.start()
+        return history_bytes(self.simulator.network)
+    track_history_bytes.unit = 'bytes'
+
+
+class RepeatedRuns(object):
+    """
+        Running simulations one after another in the same process, as in
+        examples/multiple_simulations, each with a new simulator or all
+        with the same one. Once a new simulator's run has finished, it
+        should hold on to nothing.
+    """
+    params = (['new', 'same'], [1, 5, 20])
+    param_names = ['simulator', 'runs']
+    timeout = 600
+
+    def setup(self, simulator, runs):
+        self.simulator = build_simulator(1000, 100)
+
+    def run(self, simulator, runs):
+        for i in range(runs):
+            if simulator == 'new':
+                build_simulator(1000, 100).start()
+            else:
+                self.simulator.start()
+
+    def peakmem_runs(self, simulator, runs):
+        self.run(simulator, runs)
+
+    def track_retained_bytes(self, simulator, runs):
+        return traced(self.run, simulator, runs)[2]
+    track_retained_bytes.unit = 'bytes'
+
+    def track_resident_growth_bytes(self, simulator, runs):
+        gc.collect()
+        before = resident_memory()
+        self.run(simulator, runs)
+        gc.collect()
+        return resident_memory() - before
+    track_resident_growth_bytes.unit = 'bytes'
+
+
+class ExportMemory(object):
+    """
+        The memory used to export the history of a run of 100 timesteps.
+    """
+    params = [1000, 10000]
+    param_names = ['components']
+    timeout = 300
+
+    def setup(self, components):
+        logging.disable(logging.WARNING)
+        self.tmp_dir = tempfile.mkdtemp()
+        s = build_simulator(components, 100)
+        s.start()
+        self.network = s.network
+
+    def teardown(self, components):
+        logging.disable(logging.NOTSET)
+        shutil.rmtree(self.tmp_dir)
+
+    def peakmem_export(self, components):
+        self.network.export_history(target_dir=self.tmp_dir)
+
+    def track_export_peak_bytes(self, components):
+        return traced(lambda: self.network.export_history(target_dir=self.tmp_dir))[1]
+    track_export_peak_bytes.unit = 'bytes'
@@ -0,0 +1,60 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Bulk random draws, from a stream per component or from one shared
+    stream. The first is a python loop over the components' streams, the
+    second a single call to numpy.
+"""
+
+import time
+
+from pynsim.rng import RandomStreams
+from benchmarks.common import SEED, make_nodes
+
+
+class RandomDraw(object):
+    """
+        One draw for every component, once their streams exist.
+    """
+    params = ([1000, 10000, 100000], ['components', 'shared'])
+    param_names = ['components', 'streams']
+    number = 1
+    repeat = (3, 10, 60.0)
+    warmup_time = 0
+    timeout = 600
+
+    def setup(self, components, streams):
+        self.nodes = make_nodes(components)
+        self.streams = RandomStreams(SEED)
+        self.shared = ('benchmark',) if streams == 'shared' else None
+        self.draw()
+
+    def draw(self):
+        return self.streams.draw(self.nodes, 'normal', 10, 2, shared=self.shared)
+
+    def time_draw(self, components, streams):
+        self.draw()
+
+    def track_draw_ns_per_component(self, components, streams):
+        times = []
+        for i in range(3):
+            start = time.perf_counter_ns()
+            self.draw()
+            times.append(time.perf_counter_ns() - start)
+        return min(times) / len(self.nodes)
+    track_draw_ns_per_component.unit = 'ns'
@@ -0,0 +1,77 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    The routing engine on synthetic rivers of increasing size. Its cost per
+    timestep should be linear in the size of the network, so the time per
+    node should stay about the same from one size to the next.
+"""
+
+import time
+
+from benchmarks.common import build_routing_engine, run_routing
+
+
+class Routing(object):
+    """
+        One timestep of RoutingEngine, once its structure has been built.
+    """
+    params = ([1000, 10000, 100000, 500000], [None, 'muskingum'])
+    param_names = ['nodes', 'routing']
+    number = 1
+    repeat = (3, 10, 60.0)
+    warmup_time = 0
+    timeout = 600
+
+    def setup(self, nodes, routing):
+        self.network, self.engine = build_routing_engine(nodes, routing)
+        run_routing(self.engine, 1)
+
+    def time_run(self, nodes, routing):
+        self.engine.run()
+
+    def track_run_ns_per_node(self, nodes, routing):
+        times = []
+        for i in range(3):
+            start = time.perf_counter_ns()
+            self.engine.run()
+            times.append(time.perf_counter_ns() - start)
+        return min(times) / len(self.network.nodes)
+    track_run_ns_per_node.unit = 'ns'
+
+    def peakmem_run(self, nodes, routing):
+        self.engine.run()
+
+
+class RoutingStructure(object):
+    """
+        Building the topological levels and index arrays, which is done again
+        when the topology of the network changes.
+    """
+    params = [1000, 10000, 100000, 500000]
+    param_names = ['nodes']
+    number = 1
+    repeat = (3, 10, 60.0)
+    warmup_time = 0
+    timeout = 600
+
+    def setup(self, nodes):
+        self.network, self.engine = build_routing_engine(nodes)
+
+    def time_structure(self, nodes):
+        self.engine.clear_memo()
+        self.engine.structure()
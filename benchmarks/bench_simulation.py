@@ -0,0 +1,73 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    The overhead of the simulation loop: Simulator.start with engines which
+    do nothing.
+"""
+
+from benchmarks.common import build_simulator
+
+
+class SimulationOverhead(object):
+    """
+        Simulator.start over components x timesteps x engines x iterations.
+    """
+    params = ([100, 1000, 10000], [10, 100], [1, 4], [1, 3])
+    param_names = ['components', 'timesteps', 'engines', 'iterations']
+    #A run adds to the history, so each sample starts from a new simulator
+    number = 1
+    repeat = (5, 20, 30.0)
+    warmup_time = 0
+    timeout = 300
+
+    def setup(self, components, timesteps, engines, iterations):
+        self.simulator = build_simulator(components, timesteps, engines, iterations)
+
+    def time_start(self, components, timesteps, engines, iterations):
+        self.simulator.start()
+
+
+class TimedSimulation(object):
+    """
+        Simulator.start with record_time, which times every setup function.
+    """
+    params = [1000, 10000]
+    param_names = ['components']
+    number = 1
+    repeat = (5, 20, 30.0)
+    warmup_time = 0
+
+    def setup(self, components):
+        self.simulator = build_simulator(components, 100, record_time=True)
+
+    def time_start(self, components):
+        self.simulator.start()
+
+
+class Setup(object):
+    """
+        Calling the setup function of every component, on its own.
+    """
+    params = [1000, 10000, 100000]
+    param_names = ['components']
+
+    def setup(self, components):
+        self.network = build_simulator(components, 1).network
+
+    def time_setup_components(self, components):
+        self.network.setup_components(0)
@@ -0,0 +1,27 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    The components, engines and networks shared by the benchmarks, which
+    are those of pynsim-bench, so that the two measure the same things.
+"""
+
+from pynsim.bench.scenarios import traced
+from pynsim.bench.workloads import (SEED, DummyNode, DummyLink, DummyInstitution, DictNode,
+                                    EmptyEngine, make_nodes, make_links, build_network,
+                                    build_simulator, build_membership, build_river_simulator,
+                                    build_routing_engine, run_routing)
@@ -10,6 +10,9 @@ class RiverNode(Node):
     """
 
     colour = 'blue'
+    # Chains of river nodes only pass flow on, so they can be collapsed
+    # with network.coarsen(additive=['dQdx'], accumulate={'Q': 'dQdx'})
+    pass_through = True
     _properties = {'Q': None,  # Discharge
                    'dQdx': None,  # Incremental flow
                    }
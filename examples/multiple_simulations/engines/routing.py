@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 from pynsim import Engine
+from pynsim.engines import memoize
 
 
 class Routing(Engine):
@@ -10,8 +11,11 @@ class Routing(Engine):
     name = "Simple flow routing."
     target = None
 
-    def run(self):
-        # Find head nodes
+    @memoize
+    def head_and_outlet_nodes(self):
+        """Find the head nodes and the outlet. This is only recalculated if
+        nodes or links are added to the network.
+        """
         head_nodes = []
         outlet_node = None
         for node in self.target.nodes:
@@ -19,6 +23,11 @@ class Routing(Engine):
                 head_nodes.append(node)
             if len(node.downstream_nodes) == 0:
                 outlet_node = node
+        return head_nodes, outlet_node
+
+    def run(self):
+        head_nodes, outlet_node = self.head_and_outlet_nodes()
+        head_nodes = list(head_nodes)
 
         while len(head_nodes) > 0:
             h_node = head_nodes.pop(0)
@@ -14,6 +14,7 @@ import copy
 import pandas as pd
 
 from pynsim import Simulator
+from pynsim.shared import SharedHistory
 
 from agents.agents import RiverNode
 from agents.agents import Diversion
@@ -125,11 +126,22 @@ def run_simulation(diversion_pos, discharge_data, draw=False, queue=None):
 
     simulation.start()
 
-    if queue is None:
-        return simulation.network.discharge
-    else:
+    if queue is not None:
         queue.put(simulation.network.discharge)
 
+    return simulation.network
+
+
+def run_shared_simulation(diversion_pos, discharge_data, descriptor, queue):
+    """Run a simulation and write its history into shared memory allocated
+    by the parent process. Only the position is sent back through the queue.
+    """
+    network = run_simulation(diversion_pos, discharge_data)
+    results = SharedHistory.attach(descriptor)
+    results.write(diversion_pos, network)
+    results.close()
+    queue.put(diversion_pos)
+
 
 if __name__ == '__main__':
     discharge_data = pd.read_csv('data/discharge.csv', header=0,
@@ -145,7 +157,7 @@ if __name__ == '__main__':
     memory_tracker.print(_diff())
     for diversion_pos in diversion_positions:
         st = time.time()
-        result = run_simulation(diversion_pos, discharge_data)
+        result = run_simulation(diversion_pos, discharge_data).discharge
         print( "Simulation time: %s\n" % (time.time() - st))
         print( result )
         memory_tracker.print(_diff())
@@ -167,3 +179,22 @@ if __name__ == '__main__':
         print( "Simulation time: %s" % (time.time() - st()))
         print( result )
         memory_tracker.print(_diff() )
+
+    print( "===================================================================")
+    print( " Spawn processes writing into shared memory:")
+    print( "+++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++++")
+    st = time.time()
+    fields = [('River network with diversion', 'discharge')]
+    with SharedHistory(fields, members=len(diversion_positions),
+                       timesteps=1) as results:
+        q = Queue()
+        processes = [Process(target=run_shared_simulation,
+                             args=(pos, discharge_data, results.descriptor, q))
+                     for pos in diversion_positions]
+        for p in processes:
+            p.start()
+        for p in processes:
+            q.get()
+            p.join()
+        print( "Simulation time: %s" % (time.time() - st))
+        print( results.get('River network with diversion', 'discharge') )
@@ -1,15 +1,19 @@
 # -*- coding: utf-8 -*-
 
-from pynsim import Engine
+from pynsim.engines import OptimisationEngine
 
 import pyomo.opt as opt
 import pyomo.environ as pyomo
 
 
-class PriorityBased(Engine):
+class PriorityBased(OptimisationEngine):
     """Priority based water allocation engine. This alogorithm is based on the
     method described by Israel and Lund (1999).
 
+    The Pyomo model is built once, when the engine is initialised. Its
+    parameters are mutable, so each time step only updates their values
+    before the model is solved again.
+
     Israel, M. and Lund, J.: Priority Preserving Unit Penalties in Network Flow
     Modeling. Journal of Water Resources Planning and Management, 125,
     205-214, 1999.
@@ -17,51 +21,44 @@ class PriorityBased(Engine):
     name = "Priority based allocation engine using Coopr.pyomo and GLPK."
     target = None
 
-    def _assign_id(self):
-        n = 1
-        while True:
-            yield n
-            n += 1
-
-    def run(self):
-        """Calculate optimal allocation for one time step.
+    def build_model(self):
+        """Build the structure of the allocation model for the network.
         """
         # Create a concrete model
         model = pyomo.ConcreteModel()
 
-        solver = opt.SolverFactory('glpk')
+        self.solver = opt.SolverFactory('glpk')
 
-        # Determine node types
-        node_types = dict()
+        # Determine node and link types
+        node_types = dict(InAndOut=[], Junction=[], Reservoir=[], Demand=[])
         nodes = dict()
-        node_names = dict()  # Needed to build connectivity matrix from links
-        id_generator = self._assign_id()
-        for node in self.target.nodes:
-            n_id = id_generator.next()
+        node_ids = dict()
+        for n_id, node in enumerate(self.target.nodes, 1):
             nodes[n_id] = node
-            node_names[node.name] = n_id
-            if node.type not in node_types.keys():
-                node_types[node.type] = [n_id]
-            else:
-                node_types[node.type].append(n_id)
-
-        # Determine link types
-        link_types = dict()
+            node_ids[node.name] = n_id
+            if node.type not in node_types:
+                raise Exception("Node %s is of unknown type %s. The allocation "
+                                "model has nodes of type %s."
+                                % (node.name, node.type, ", ".join(sorted(node_types))))
+            node_types[node.type].append(n_id)
+
+        link_types = dict(Channel=[])
         links = dict()
-        connectivity = dict()
-        for i in nodes.keys():
-            for j in nodes.keys():
-                connectivity[i, j] = 0
-        for link in self.target.links:
-            l_id = id_generator.next()
+        in_links = dict((n_id, []) for n_id in nodes)
+        out_links = dict((n_id, []) for n_id in nodes)
+        for l_id, link in enumerate(self.target.links, len(nodes) + 1):
             links[l_id] = link
-            startnode_id = node_names[link.start_node.name]
-            endnode_id = node_names[link.end_node.name]
-            connectivity[startnode_id, endnode_id] = l_id
-            if link.type not in link_types.keys():
-                link_types[link.type] = [l_id]
-            else:
-                link_types[link.type].append(l_id)
+            out_links[node_ids[link.start_node.name]].append(l_id)
+            in_links[node_ids[link.end_node.name]].append(l_id)
+            if link.type not in link_types:
+                raise Exception("Link %s is of unknown type %s. The allocation "
+                                "model has links of type %s."
+                                % (link.name, link.type, ", ".join(sorted(link_types))))
+            link_types[link.type].append(l_id)
+
+        self.nodes = nodes
+        self.links = links
+        self.node_types = node_types
 
         # Define node and link type sets
 
@@ -81,66 +78,34 @@ class PriorityBased(Engine):
         model.Channel = pyomo.Set(initialize=link_types['Channel'],
                                   domain=pyomo.NonNegativeIntegers)
 
-        # Assign parameters
+        # Define parameters. Their values are set in update_model.
         # 'InAndOut' and 'Junction' nodes do not have any data
 
         #-- Reservoir
-        init_stor = dict()
-        max_stor = dict()
-        min_stor = dict()
-        carryover_penalty = dict()
-        for res in node_types['Reservoir']:
-            # Assign storage of the last simulation, if available. Use
-            # init_stor otherwise
-            if len(nodes[res]._history['S']) == 0:
-                init_stor[res] = nodes[res].init_stor
-            else:
-                init_stor[res] = nodes[res]._history['S'][-1]
-            max_stor[res] = nodes[res].max_stor
-            min_stor[res] = nodes[res].min_stor
-            carryover_penalty[res] = nodes[res].carryover_penalty
-
         model.Res_init_stor = pyomo.Param(model.Reservoir, within=pyomo.Reals,
-                                          initialize=init_stor)
+                                          mutable=True, initialize=0)
         model.Res_max_stor = pyomo.Param(model.Reservoir, within=pyomo.Reals,
-                                         initialize=max_stor)
+                                         mutable=True, initialize=0)
         model.Res_min_stor = pyomo.Param(model.Reservoir, within=pyomo.Reals,
-                                         initialize=min_stor)
+                                         mutable=True, initialize=0)
         model.Res_carryover_penalty = pyomo.Param(model.Reservoir,
                                                   within=pyomo.Reals,
-                                                  initialize=carryover_penalty)
+                                                  mutable=True, initialize=0)
 
         #-- Demand
-        cons_coeff = dict()
-        for dem in node_types['Demand']:
-            cons_coeff[dem] = nodes[dem].consumption_coeff
         model.Dem_consumption_coeff = pyomo.Param(model.Demand,
                                                   within=pyomo.Reals,
-                                                  initialize=cons_coeff)
+                                                  mutable=True, initialize=0)
 
         #-- Channel
-        cost = dict()
-        flowmult = dict()
-        max_flow = dict()
-        min_flow = dict()
-        for cha in link_types['Channel']:
-            cost[cha] = links[cha].cost
-            flowmult[cha] = links[cha].flowmult
-            max_flow[cha] = links[cha].max_flow
-            min_flow[cha] = links[cha].min_flow
         model.Cha_cost = pyomo.Param(model.Channel, within=pyomo.Reals,
-                                     initialize=cost)
+                                     mutable=True, initialize=0)
         model.Cha_flowmult = pyomo.Param(model.Channel, within=pyomo.Reals,
-                                         initialize=flowmult)
+                                         mutable=True, initialize=0)
         model.Cha_max_flow = pyomo.Param(model.Channel, within=pyomo.Reals,
-                                         initialize=max_flow)
+                                         mutable=True, initialize=0)
         model.Cha_min_flow = pyomo.Param(model.Channel, within=pyomo.Reals,
-                                         initialize=min_flow)
-
-        # Connectivity matrix
-        model.connectivity = pyomo.Param(model.nodes, model.nodes,
-                                         within=pyomo.NonNegativeIntegers,
-                                         initialize=connectivity)
+                                         mutable=True, initialize=0)
 
         # Assign variables
         #-- InAndOut
@@ -174,16 +139,9 @@ class PriorityBased(Engine):
 
         def mass_balance(model, node):
             "Make sure the mass balance is closed in all nodes."
-            tot_outflow = 0  # Flow from node
-            tot_inflow = 0  # Flow to node
-            for i in model.nodes:
-                out_link = model.connectivity[node, i]
-                if out_link != 0:
-                    tot_outflow += model.Cha_Q[out_link]
-                in_link = model.connectivity[i, node]
-                if in_link != 0:
-                    tot_inflow += model.Cha_Q[in_link] \
-                        * model.Cha_flowmult[in_link]
+            tot_outflow = sum(model.Cha_Q[l] for l in out_links[node])
+            tot_inflow = sum(model.Cha_Q[l] * model.Cha_flowmult[l]
+                             for l in in_links[node])
 
             if node in model.InAndOut:
                 return model.InA_Q[node] == tot_outflow - tot_inflow
@@ -211,40 +169,71 @@ class PriorityBased(Engine):
 
         model.objective = pyomo.Objective(rule=objective, sense=pyomo.minimize)
 
-        # Run optimisation
-        #model_instance = model.create_instance()
-        #result = solver.solve(model_instance)
-        #model_instance.load(result)
-        result = solver.solve(model)
+        return model
+
+    def update_model(self, model):
+        """Set the parameters of the model for this time step.
+        """
+        nodes = self.nodes
+        links = self.links
+
+        #-- Reservoir
+        for res in model.Reservoir:
+            # Assign storage of the last simulation, if available. Use
+            # init_stor otherwise
+            if len(nodes[res]._history['S']) == 0:
+                model.Res_init_stor[res] = nodes[res].init_stor
+            else:
+                model.Res_init_stor[res] = nodes[res]._history['S'][-1]
+            model.Res_max_stor[res] = nodes[res].max_stor
+            model.Res_min_stor[res] = nodes[res].min_stor
+            model.Res_carryover_penalty[res] = nodes[res].carryover_penalty
+
+        #-- Demand
+        for dem in model.Demand:
+            model.Dem_consumption_coeff[dem] = nodes[dem].consumption_coeff
+
+        #-- Channel
+        for cha in model.Channel:
+            model.Cha_cost[cha] = links[cha].cost
+            model.Cha_flowmult[cha] = links[cha].flowmult
+            model.Cha_max_flow[cha] = links[cha].max_flow
+            model.Cha_min_flow[cha] = links[cha].min_flow
+
+    def solve(self, model, warm_start=None):
+        """Run the optimisation, starting from the previous solution if the
+        solver supports it.
+        """
+        kwargs = dict()
+        if warm_start is not None and self.solver.warm_start_capable():
+            for var in model.component_objects(pyomo.Var):
+                for index in var:
+                    var[index].value = warm_start.get((var.name, index))
+            kwargs['warmstart'] = True
+
+        result = self.solver.solve(model, **kwargs)
         model.solutions.load_from(result)
 
-        # Extract results
+        solution = dict()
+        for var in model.component_objects(pyomo.Var):
+            for index in var:
+                solution[(var.name, index)] = var[index].value
+        return solution
+
+    def extract_results(self, model, solution):
+        """Set the results on the nodes and links of the network.
+        """
         #-- Assign node variables
-        self.target.nodes = []
-
-        for node_id in node_types['Reservoir']:
-            node = nodes[node_id]
-            node.S = model.Res_S[node_id].value
-            self.target.nodes.append(node)
-        for node_id in node_types['Demand']:
-            node = nodes[node_id]
-            node.delivery = model.Dem_delivery[node_id].value
-            self.target.nodes.append(node)
-        for node_id in node_types['InAndOut']:
-            node = nodes[node_id]
-            node.Q = model.InA_Q[node_id].value
-            self.target.nodes.append(node)
-        for node_id in node_types['Junction']:
-            # No results here, but the node is needed in the following
-            # timesteps
-            self.target.nodes.append(nodes[node_id])
+        for node_id in model.Reservoir:
+            self.nodes[node_id].S = model.Res_S[node_id].value
+        for node_id in model.Demand:
+            self.nodes[node_id].delivery = model.Dem_delivery[node_id].value
+        for node_id in model.InAndOut:
+            self.nodes[node_id].Q = model.InA_Q[node_id].value
 
         #-- Assign link variables
-        self.target.links = []
-
-        for link_id, link in links.iteritems():
+        for link_id, link in self.links.items():
             link.Q = model.Cha_Q[link_id].value
-            self.target.links.append(link)
 
         #-- Assign objective
         self.target.cost = sum(link.cost * link.Q for link in self.target.links)
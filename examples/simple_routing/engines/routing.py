@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*
 
 from pynsim import Engine
+from pynsim.engines import memoize
 
 
 class SimpleRouting(Engine):
@@ -16,21 +17,7 @@ class SimpleRouting(Engine):
         """Flow routing for one time step.
         """
 
-        # Create indices on nodes and links
-        node_types = dict()
-
-        for i, node in enumerate(self.target.nodes):
-            if node.component_type not in node_types.keys():
-                node_types[node.component_type] = [i]
-            else:
-                node_types[node.component_type].append(i)
-
-        link_types = dict()
-        for i, link in enumerate(self.target.links):
-            if link.component_type not in link_types.keys():
-                link_types[link.component_type] = [i]
-            else:
-                link_types[link.component_type].append(i)
+        node_types = self.node_types()
 
         # Set initial storage for this simulation time step
         init_stor = dict()
@@ -85,12 +72,38 @@ class SimpleRouting(Engine):
                        > self.target.tol
                        for res in node_types['Reservoir']]
 
+    @memoize
+    def node_types(self):
+        """Index the nodes by type. This is only recalculated if nodes or
+        links are added to the network.
+        """
+        node_types = dict()
+        for i, node in enumerate(self.target.nodes):
+            node_types.setdefault(node.component_type, []).append(i)
+        return node_types
+
+    @memoize
+    def upstream(self):
+        """The indices of the nodes directly upstream of each node. A node
+        joined to another by parallel links is only listed once.
+        """
+        node_index = dict((node.name, i)
+                          for i, node in enumerate(self.target.nodes))
+        upstream = dict((i, []) for i in range(len(self.target.nodes)))
+        for link in self.target.links:
+            start = node_index[link.start_node.name]
+            end = node_index[link.end_node.name]
+            if start not in upstream[end]:
+                upstream[end].append(start)
+        return upstream
+
     def update_mass_balance(self, nodes, init_stor):
         "Calculate the mass balance for all nodes"
+        upstream = self.upstream()
         for res in nodes:
             self.target.nodes[res].S = init_stor[res] \
                 + self.target.nodes[res].inflow * self.target.timestep \
                 - self.target.nodes[res].actual_release * self.target.timestep\
                 + sum([self.target.nodes[i].actual_release
-                       * self.target.connectivity[i, res]
-                       for i in nodes]) * self.target.timestep
+                       for i in upstream[res] if i in nodes]) \
+                * self.target.timestep
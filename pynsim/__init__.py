@@ -42,4 +42,4 @@ else:
 
 from .components import Network, Node, Link, Institution
 from .engines import Engine
-from .simulators import Simulator
+from .simulators import Simulator, DecomposedSimulator
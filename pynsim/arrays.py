@@ -0,0 +1,103 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Read and write a property of many components at once, as numpy arrays,
+    and combine values along the links of a network.
+"""
+
+import numpy as np
+
+
+def get_values(components, property_name, default=0.0, dtype=float):
+    """
+        Get the value of a property from each of a list of components.
+        Components which do not have the property, or where it is None, get
+        the default value.
+
+        :returns A numpy array, in the order of the components.
+    """
+    values = [getattr(c, property_name, None) for c in components]
+    return np.array([default if v is None else v for v in values], dtype=dtype)
+
+
+def set_values(components, property_name, values):
+    """
+        Set a property on each of a list of components from an array (or a
+        single value, which is set on every component).
+    """
+    if np.ndim(values) == 0:
+        for c in components:
+            setattr(c, property_name, values)
+    else:
+        for c, v in zip(components, np.asarray(values).tolist()):
+            setattr(c, property_name, v)
+
+
+def get_history(components, property_name, dtype=float):
+    """
+        Get the history of a property from each of a list of components.
+
+        :returns A numpy array of shape (components, timesteps)
+    """
+    return np.array([c._history[property_name] for c in components], dtype=dtype)
+
+
+def incidence(nodes, links):
+    """
+        The positions of the start and end node of each link in a list of
+        nodes, and the number of links into and out of each node.
+
+        :returns A dict of numpy arrays: 'start' and 'end' (one value per
+                 link), 'in_degree' and 'out_degree' (one value per node).
+    """
+    index = dict((id(n), i) for i, n in enumerate(nodes))
+    start = np.fromiter((index[id(l.start_node)] for l in links), dtype=np.int64, count=len(links))
+    end = np.fromiter((index[id(l.end_node)] for l in links), dtype=np.int64, count=len(links))
+    return {
+        'start': start,
+        'end': end,
+        'in_degree': np.bincount(end, minlength=len(nodes)),
+        'out_degree': np.bincount(start, minlength=len(nodes)),
+    }
+
+
+def aggregate(values, positions, size, how='sum', empty=0.0):
+    """
+        Combine values into an array of length size, where each value goes
+        to the element at its position.
+
+        args:
+            how string: 'sum', 'max', 'min' or 'mean'
+            empty: The value of elements which receive no values.
+    """
+    values = np.asarray(values, dtype=float)
+    counts = np.bincount(positions, minlength=size)
+    if how == 'sum' or how == 'mean':
+        result = np.bincount(positions, weights=values, minlength=size)
+        if how == 'mean':
+            result[counts > 0] /= counts[counts > 0]
+    elif how == 'max':
+        result = np.full(size, -np.inf)
+        np.maximum.at(result, positions, values)
+    elif how == 'min':
+        result = np.full(size, np.inf)
+        np.minimum.at(result, positions, values)
+    else:
+        raise Exception("Unknown aggregation %s. Use 'sum', 'max', 'min' or 'mean'." % how)
+    result[counts == 0] = empty
+    return result
@@ -0,0 +1,31 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Performance scenarios, and their comparison with a baseline. From the
+    command line:
+
+        $ pynsim-bench --full --save-baseline baseline.json
+        ...
+        $ pynsim-bench --full --baseline baseline.json
+
+    The second run prints a table of each scenario against the baseline,
+    and exits with 1 if any of them has regressed beyond its tolerance.
+"""
+
+from .scenarios import SCENARIOS, Scenario, run_scenarios, traced
+from .compare import compare, format_table, load_results, results_document, save_results
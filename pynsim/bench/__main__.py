@@ -0,0 +1,5 @@
+import sys
+
+from pynsim.bench.cli import main
+
+sys.exit(main())
@@ -0,0 +1,113 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    The pynsim-bench command. It exits with 1 when a scenario has regressed
+    beyond its tolerance, and with 2 when it cannot compare the results with
+    the baseline.
+"""
+
+import argparse
+import logging
+import sys
+
+from pynsim.bench.compare import (compare, format_table, load_results, results_document,
+                                  save_results)
+from pynsim.bench.scenarios import SCENARIOS, run_scenarios
+
+DEFAULT_REPEAT = {'quick': 5, 'full': 10}
+
+
+def parser():
+    p = argparse.ArgumentParser(
+        prog='pynsim-bench',
+        description="Run pynsim's performance scenarios and compare them with a baseline.")
+    mode = p.add_mutually_exclusive_group()
+    mode.add_argument('--quick', dest='mode', action='store_const', const='quick',
+                      help="Small sizes, which take a few seconds (the default).")
+    mode.add_argument('--full', dest='mode', action='store_const', const='full',
+                      help="Large sizes, which take a few minutes.")
+    p.add_argument('-b', '--baseline', help="A results file to compare with.")
+    p.add_argument('-o', '--output', help="Write the results to this file.")
+    p.add_argument('--save-baseline', metavar='PATH',
+                   help="Write the results to this file, for use as a baseline.")
+    p.add_argument('-t', '--tolerance', type=float,
+                   help="The fraction by which a scenario may be worse than the baseline. "
+                        "Replaces the baseline's own, but not those of its scenarios.")
+    p.add_argument('-r', '--repeat', type=int,
+                   help="The number of times each scenario is run. The least is kept.")
+    p.add_argument('-k', '--filter', metavar='PATTERN',
+                   help="Only run the scenarios whose names match this regular expression.")
+    p.add_argument('-l', '--list', action='store_true', help="List the scenarios and exit.")
+    p.add_argument('-v', '--verbose', action='store_true', help="Show pynsim's logging.")
+    return p
+
+
+def main(argv=None):
+    args = parser().parse_args(argv)
+    mode = args.mode or 'quick'
+
+    if args.list:
+        for scenario in SCENARIOS:
+            print("%-24s %-8s %s" % (scenario.name, scenario.unit, scenario.params[mode]))
+        return 0
+
+    baseline = None
+    if args.baseline is not None:
+        try:
+            baseline = load_results(args.baseline)
+        except Exception as e:
+            print("Unable to read the baseline: %s" % e, file=sys.stderr)
+            return 2
+        if baseline.get('mode', mode) != mode:
+            print("The baseline was run in %s mode, not %s mode." % (baseline['mode'], mode),
+                  file=sys.stderr)
+            return 2
+
+    root = logging.getLogger()
+    level = root.level
+    if not args.verbose:
+        #Every simulation logs its start
+        root.setLevel(logging.ERROR)
+    try:
+        results = run_scenarios(mode, args.repeat or DEFAULT_REPEAT[mode], args.filter,
+                                log=lambda name: print("Running %s" % name, file=sys.stderr))
+    finally:
+        root.setLevel(level)
+    document = results_document(results, mode, args.tolerance)
+    for path in (args.output, args.save_baseline):
+        if path is not None:
+            save_results(path, document)
+
+    if baseline is None:
+        rows = [{'name': k, 'unit': v['unit'], 'current': v['value']} for k, v in results.items()]
+        print(format_table(rows))
+        return 0
+
+    rows = compare(results, baseline, args.tolerance)
+    if args.filter is not None:
+        rows = [row for row in rows if row['status'] != 'missing']
+    print(format_table(rows))
+    regressions = [row['name'] for row in rows if row['status'] == 'regression']
+    if regressions:
+        print("\n%s regressed: %s" % (len(regressions), ", ".join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
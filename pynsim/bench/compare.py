@@ -0,0 +1,157 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Results files, and the comparison of results with a baseline.
+
+    A results file is json:
+
+        {"mode": "quick",
+         "pynsim": "0.1.4",
+         ...
+         "tolerance": 0.2,
+         "benchmarks": {"simulation": {"value": 0.12, "unit": "seconds",
+                                       "tolerance": 0.3, ...}}}
+
+    A results file is used as a baseline as it is. The tolerance of a
+    benchmark is the fraction by which it may be worse than the baseline
+    before it counts as a regression: its own tolerance if it has one, else
+    the file's, else the default for its unit.
+"""
+
+import datetime
+import json
+import platform
+
+import pynsim
+
+DEFAULT_TOLERANCES = {'seconds': 0.2, 'bytes': 0.05}
+
+
+def results_document(results, mode, tolerance=None):
+    """
+        The results of a run, with what they were run on.
+    """
+    document = {'mode': mode,
+                'pynsim': pynsim.__version__,
+                'python': platform.python_version(),
+                'machine': platform.node(),
+                'platform': platform.platform(),
+                'date': datetime.datetime.now().isoformat(),
+                'benchmarks': results}
+    if tolerance is not None:
+        document['tolerance'] = tolerance
+    return document
+
+
+def save_results(path, document):
+    with open(path, 'w') as f:
+        json.dump(document, f, indent=4, sort_keys=True)
+
+
+def load_results(path):
+    with open(path, 'r') as f:
+        document = json.load(f)
+    if 'benchmarks' not in document:
+        raise Exception("%s is not a results file: it has no 'benchmarks'." % path)
+    return document
+
+
+def compare(results, baseline, tolerance=None):
+    """
+        Compare the results of a run with a baseline document. A tolerance
+        given here replaces the baseline's own, but not those of its
+        benchmarks.
+
+        :returns A row for each benchmark in either, in the order of the
+                 results then of the baseline: {'name', 'baseline', 'current',
+                 'ratio', 'tolerance', 'unit', 'status'}, where the status is
+                 'ok', 'regression', 'improvement', 'new' or 'missing'.
+    """
+    if tolerance is None:
+        tolerance = baseline.get('tolerance')
+    benchmarks = baseline['benchmarks']
+
+    rows = []
+    names = list(results) + [k for k in sorted(benchmarks) if k not in results]
+    for name in names:
+        current = results.get(name)
+        base = benchmarks.get(name)
+        entry = current if current is not None else base
+        unit = entry.get('unit', 'seconds')
+        allowed = base.get('tolerance') if base is not None else None
+        if allowed is None:
+            allowed = tolerance if tolerance is not None else DEFAULT_TOLERANCES.get(unit, 0.2)
+        row = {'name': name, 'unit': unit, 'tolerance': allowed,
+               'baseline': base['value'] if base is not None else None,
+               'current': current['value'] if current is not None else None,
+               'ratio': None}
+        if base is None:
+            row['status'] = 'new'
+        elif current is None:
+            row['status'] = 'missing'
+        else:
+            row['ratio'] = row['current'] / row['baseline'] if row['baseline'] else float('inf')
+            if row['ratio'] > 1 + allowed:
+                row['status'] = 'regression'
+            elif row['ratio'] < 1 - allowed:
+                row['status'] = 'improvement'
+            else:
+                row['status'] = 'ok'
+        rows.append(row)
+    return rows
+
+
+def format_value(value, unit):
+    if value is None:
+        return '-'
+    if unit == 'seconds':
+        for scale, suffix in ((1.0, 's'), (1e-3, 'ms'), (1e-6, 'us')):
+            if abs(value) >= scale:
+                return "%.3g%s" % (value / scale, suffix)
+        return "%.3gns" % (value * 1e9)
+    if unit == 'bytes':
+        for scale, suffix in ((2 ** 30, 'GB'), (2 ** 20, 'MB'), (2 ** 10, 'kB')):
+            if abs(value) >= scale:
+                return "%.3g%s" % (value / scale, suffix)
+        return "%dB" % value
+    return "%.4g" % value
+
+
+def format_table(rows):
+    """
+        A table of the rows of a comparison, or of results without a
+        baseline.
+    """
+    header = ('Benchmark', 'Baseline', 'Current', 'Ratio', 'Tolerance', 'Status')
+    lines = [header]
+    for row in rows:
+        lines.append((row['name'],
+                      format_value(row.get('baseline'), row['unit']),
+                      format_value(row.get('current'), row['unit']),
+                      "%.2f" % row['ratio'] if row.get('ratio') is not None else '-',
+                      "%d%%" % round(row['tolerance'] * 100) if row.get('tolerance') is not None else '-',
+                      row.get('status', '')))
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    text = []
+    for i, line in enumerate(lines):
+        text.append("  ".join([line[0].ljust(widths[0])] +
+                              [v.rjust(w) for v, w in zip(line[1:-1], widths[1:-1])] +
+                              [line[-1]]).rstrip())
+        if i == 0:
+            text.append("  ".join('-' * w for w in widths))
+    return "\n".join(text)
@@ -0,0 +1,276 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    The performance scenarios which pynsim-bench runs. Each has a small size
+    for the quick mode and a large one for the full mode, and is built from
+    the same random numbers every time, so that its results can be compared
+    from one version of pynsim to the next.
+"""
+
+import gc
+import logging
+import re
+import shutil
+import statistics
+import tempfile
+import time
+import tracemalloc
+
+from pynsim import Network, history
+from pynsim.bench.workloads import (SEED, DictNode, DummyNode, DummyInstitution,
+                                    build_membership, build_network, build_river_simulator,
+                                    build_routing_engine, build_simulator, make_links,
+                                    make_nodes, run_routing)
+from pynsim.generators import irrigation_districts, overlapping_institutions, river_network
+
+MODES = ('quick', 'full')
+
+
+def traced(func, *args):
+    """
+        Call func, tracing the memory allocated while it runs.
+
+        :returns The result of func, the peak bytes allocated while it ran
+                 and the bytes still allocated when it had finished.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        result = func(*args)
+        peak = tracemalloc.get_traced_memory()[1]
+        gc.collect()
+        retained = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    return result, peak, retained
+
+
+class Scenario(object):
+    """
+        Something to measure.
+
+        args:
+            name string: The name of the scenario in results and baselines.
+            prepare function: Called with the parameters of a mode, returns
+                              a function to measure and a function to call
+                              afterwards to clean up (or None). It is called
+                              again for each repeat.
+            quick dict: The parameters of the quick mode.
+            full dict: The parameters of the full mode.
+            measure string: 'time' for the seconds the function takes,
+                            'peak' for the peak bytes it allocates or
+                            'retained' for the bytes it leaves allocated.
+            tolerance float: The fraction by which the scenario may be worse
+                             than a baseline, written with its results so
+                             that a baseline made from them keeps it. By
+                             default, that of the baseline or of the unit.
+    """
+
+    def __init__(self, name, prepare, quick, full, measure='time', tolerance=None):
+        if measure not in ('time', 'peak', 'retained'):
+            raise Exception("Unknown measure %s. Use 'time', 'peak' or 'retained'." % measure)
+        self.name = name
+        self.prepare = prepare
+        self.params = {'quick': quick, 'full': full}
+        self.measure = measure
+        self.tolerance = tolerance
+
+    def __repr__(self):
+        return "Scenario(name=%s, measure=%s)" % (self.name, self.measure)
+
+    @property
+    def unit(self):
+        return 'seconds' if self.measure == 'time' else 'bytes'
+
+    def run_once(self, mode):
+        func, cleanup = self.prepare(**self.params[mode])
+        try:
+            if self.measure == 'time':
+                gc.collect()
+                start = time.perf_counter()
+                func()
+                return time.perf_counter() - start
+            result, peak, retained = traced(func)
+            return peak if self.measure == 'peak' else retained
+        finally:
+            if cleanup is not None:
+                cleanup()
+
+    def run(self, mode, repeat):
+        """
+            :returns The result of the scenario: the least of repeat runs,
+                     which is the one the rest of the machine disturbed
+                     least, with their median and maximum.
+        """
+        if mode not in MODES:
+            raise Exception("Unknown mode %s. Use %s." % (mode, " or ".join(MODES)))
+        if self.measure == 'time':
+            #Imports, caches and the allocator warm up on the first run
+            self.run_once(mode)
+        values = [self.run_once(mode) for i in range(repeat)]
+        result = {'value': min(values),
+                  'median': statistics.median(values),
+                  'max': max(values),
+                  'repeat': repeat,
+                  'unit': self.unit,
+                  'params': self.params[mode]}
+        if self.tolerance is not None:
+            result['tolerance'] = self.tolerance
+        return result
+
+
+def _simulation(components, timesteps, engines=1, iterations=1, record_time=False):
+    s = build_simulator(components, timesteps, engines, iterations, record_time=record_time)
+    return s.start, None
+
+
+def _construction(components):
+    nodes = make_nodes(components // 2)
+    links = make_links(nodes)
+
+    def construct():
+        network = Network("Construction")
+        network.add_nodes(*nodes)
+        network.add_links(*links)
+    return construct, None
+
+
+def _institutions(institutions, nodes):
+    all_nodes = make_nodes(nodes)
+
+    def fill():
+        for i in range(institutions):
+            DummyInstitution(name="Institution %s" % i).add_nodes(*all_nodes)
+    return fill, None
+
+
+def _post_process(components, properties):
+    network = build_network(components, node_class=DictNode if properties == 'dict' else DummyNode)
+    network.setup_components(0)
+    return network.post_process, None
+
+
+def _history_run(components, timesteps):
+    tmp_dir = tempfile.mkdtemp()
+    s = build_simulator(components, timesteps)
+    s.start()
+    return s.network, tmp_dir, lambda: shutil.rmtree(tmp_dir)
+
+
+def _export(components, timesteps):
+    network, tmp_dir, cleanup = _history_run(components, timesteps)
+    return lambda: network.export_history(target_dir=tmp_dir), cleanup
+
+
+def _load(components, timesteps):
+    network, tmp_dir, cleanup = _history_run(components, timesteps)
+    path = network.export_history(target_dir=tmp_dir)
+    return lambda: history.load(path), cleanup
+
+
+def _river(nodes, timesteps):
+    return build_river_simulator(nodes, timesteps).start, None
+
+
+def _routing(nodes, timesteps):
+    network, engine = build_routing_engine(nodes)
+    return lambda: run_routing(engine, timesteps), None
+
+
+def _generate_river(nodes):
+    return lambda: river_network(nodes, seed=SEED), None
+
+
+def _generate_irrigation(rows, columns):
+    return lambda: irrigation_districts(rows, columns, seed=SEED), None
+
+
+def _generate_institutions(nodes, institutions, size):
+    network = river_network(nodes, seed=SEED)
+    return lambda: overlapping_institutions(network, institutions, size, seed=SEED), None
+
+
+def _membership(institutions, nodes):
+    return lambda: build_membership(institutions, nodes), None
+
+
+SCENARIOS = [
+    Scenario('simulation', _simulation,
+             dict(components=2000, timesteps=50, engines=2),
+             dict(components=10000, timesteps=100, engines=2)),
+    Scenario('simulation_iterations', _simulation,
+             dict(components=2000, timesteps=50, engines=2, iterations=3),
+             dict(components=10000, timesteps=100, engines=2, iterations=3)),
+    Scenario('simulation_record_time', _simulation,
+             dict(components=2000, timesteps=50, record_time=True),
+             dict(components=10000, timesteps=100, record_time=True)),
+    Scenario('river_simulation', _river,
+             dict(nodes=2000, timesteps=50), dict(nodes=20000, timesteps=365)),
+    Scenario('routing', _routing,
+             dict(nodes=20000, timesteps=10), dict(nodes=500000, timesteps=10)),
+    Scenario('construction', _construction,
+             dict(components=50000), dict(components=200000)),
+    Scenario('institutions', _institutions,
+             dict(institutions=20, nodes=2000), dict(institutions=100, nodes=10000)),
+    Scenario('post_process_scalar', _post_process,
+             dict(components=50000, properties='scalar'),
+             dict(components=200000, properties='scalar')),
+    Scenario('post_process_dict', _post_process,
+             dict(components=50000, properties='dict'),
+             dict(components=200000, properties='dict')),
+    #About 1M components in the full mode
+    Scenario('generate_river', _generate_river,
+             dict(nodes=20000), dict(nodes=500000)),
+    Scenario('generate_irrigation', _generate_irrigation,
+             dict(rows=100, columns=100), dict(rows=700, columns=700)),
+    Scenario('generate_institutions', _generate_institutions,
+             dict(nodes=20000, institutions=10, size=0.1),
+             dict(nodes=100000, institutions=100, size=0.1)),
+    #Writing and reading files varies more than the rest
+    Scenario('export', _export,
+             dict(components=2000, timesteps=50), dict(components=10000, timesteps=100),
+             tolerance=0.5),
+    Scenario('load', _load,
+             dict(components=2000, timesteps=50), dict(components=10000, timesteps=100),
+             tolerance=0.5),
+    Scenario('history_memory', _simulation,
+             dict(components=2000, timesteps=50), dict(components=10000, timesteps=100),
+             measure='retained'),
+    Scenario('membership_memory', _membership,
+             dict(institutions=10, nodes=1000), dict(institutions=100, nodes=10000),
+             measure='retained'),
+]
+
+
+def run_scenarios(mode='quick', repeat=5, pattern=None, scenarios=None, log=None):
+    """
+        Run each scenario whose name matches the regular expression pattern.
+
+        :returns {scenario name: result}. See Scenario.run.
+    """
+    if scenarios is None:
+        scenarios = SCENARIOS
+    results = {}
+    for scenario in scenarios:
+        if pattern is not None and re.search(pattern, scenario.name) is None:
+            continue
+        if log is not None:
+            log(scenario.name)
+        logging.debug("Running scenario %s (%s)", scenario.name, mode)
+        results[scenario.name] = scenario.run(mode, repeat)
+    return results
@@ -0,0 +1,162 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    The components, engines and networks which the benchmarks are run on.
+    They do as little as possible, so that the benchmarks measure pynsim
+    itself.
+"""
+
+import random
+
+from pynsim import Simulator, Network, Node, Link, Institution, Engine
+
+#Every network is built from the same random numbers
+SEED = 42
+
+
+class DummyNode(Node):
+    _properties = {'value': 42}
+
+
+class DummyLink(Link):
+    _properties = {'flow': 0.0}
+
+
+class DummyInstitution(Institution):
+    _properties = {'demand': 0.0}
+
+
+class DictNode(Node):
+    _properties = {'flows': None}
+
+    def setup(self, timestamp):
+        self.flows = {'inflow': float(timestamp), 'outflow': 0.0, 'losses': 0.0}
+
+
+class EmptyEngine(Engine):
+    name = "Empty engine"
+
+    def run(self):
+        pass
+
+
+def make_nodes(n, node_class=DummyNode):
+    return [node_class(x=i, y=i, name="Node %s" % i) for i in range(n)]
+
+
+def make_links(nodes):
+    """
+        Link each node to a random node before it, which makes a tree.
+    """
+    rng = random.Random(SEED)
+    links = []
+    for i in range(1, len(nodes)):
+        start = nodes[rng.randrange(i)]
+        links.append(DummyLink(start_node=start, end_node=nodes[i], name="Link %s" % i))
+    return links
+
+
+def build_network(n_components, node_class=DummyNode):
+    """
+        A network of n_components nodes and links, about half of each.
+    """
+    network = Network("Benchmark network")
+    nodes = make_nodes(n_components // 2 + 1, node_class)
+    network.add_nodes(*nodes)
+    network.add_links(*make_links(nodes)[:n_components - len(nodes)])
+    return network
+
+
+def build_simulator(n_components, n_timesteps, n_engines=1, max_iterations=1, **kwargs):
+    network = build_network(n_components)
+    s = Simulator(network, max_iterations=max_iterations, **kwargs)
+    for i in range(n_engines):
+        engine = EmptyEngine(network)
+        engine.name = "Empty engine %s" % i
+        s.add_engine(engine)
+    s.set_timesteps(range(n_timesteps))
+    return s
+
+
+def build_membership(institutions, nodes):
+    """
+        The pattern of examples/overhead_test: every institution holds every
+        node of the network.
+    """
+    network = Network("Membership")
+    all_nodes = make_nodes(nodes)
+    network.add_nodes(*all_nodes)
+    for i in range(institutions):
+        institution = DummyInstitution(name="Institution %s" % i)
+        institution.add_nodes(*all_nodes)
+        network.add_institution(institution)
+    return network
+
+
+def build_river_simulator(n_nodes, n_timesteps, n_engines=1, seed=SEED):
+    """
+        A simulation of a synthetic river, whose headwaters and demand nodes
+        read their time series at each timestep.
+    """
+    from pynsim.generators import river_network
+
+    network = river_network(n_nodes, seed=seed, timesteps=n_timesteps)
+    s = Simulator(network)
+    for i in range(n_engines):
+        engine = EmptyEngine(network)
+        engine.name = "Empty engine %s" % i
+        s.add_engine(engine)
+    s.set_timesteps(range(n_timesteps))
+    return s
+
+
+#The properties of the reservoirs of pynsim.generators, by the names which
+#RoutingEngine uses. Each reservoir starts from the storage it was given.
+RIVER_ROUTING_PROPERTIES = {
+    'storage': 'storage',
+    'init_stor': 'storage',
+    'max_stor': 'capacity',
+    'release': 'release',
+}
+
+
+def build_routing_engine(n_nodes, routing=None, seed=SEED):
+    """
+        A RoutingEngine on a synthetic river whose components have been set
+        up for the first timestep, with its structure already built, so that
+        only the routing is left to run.
+    """
+    from pynsim.engines import RoutingEngine
+    from pynsim.generators import river_network
+
+    network = river_network(n_nodes, seed=seed)
+    network.set_timestep(0, 0)
+    network.setup_components(0)
+    engine = RoutingEngine(network, storage_types=['Reservoir'], routing=routing,
+                           property_names=RIVER_ROUTING_PROPERTIES)
+    engine.initialise()
+    return network, engine
+
+
+def run_routing(engine, n_timesteps):
+    """
+        Run a routing engine for n timesteps, without a simulator.
+    """
+    for i in range(n_timesteps):
+        engine.timestep = engine.timestep_idx = i
+        engine.run()
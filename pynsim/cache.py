@@ -0,0 +1,309 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    A content-addressed cache of simulation results.
+
+    The cache is keyed on a hash of everything which determines the outcome
+    of a simulation: the network topology, the state of every component
+    (property values and any time-series inputs stored on it), the timesteps
+    and the class, version and state of each engine. Results are stored on
+    local disk as the history recorded during the run, so a cache hit can
+    restore the history of each component without running the simulation.
+
+    Usage:
+
+        s = Simulator(network, cache=ResultCache('/tmp/pynsim_cache'))
+        s.start()
+"""
+
+import hashlib
+import logging
+import os
+import pickle
+import tempfile
+from copy import deepcopy
+
+import pynsim
+
+#Attributes which are either back-references, indexes which are derived
+#from other attributes, bookkeeping which has no effect on the results or
+#the history recorded by earlier runs (see ResultCache.mark).
+EXCLUDED_ATTRIBUTES = set([
+    '_history',
+    'network',
+    'timing',
+    'timer',
+    'current_timestep',
+    'current_timestep_idx',
+    'random_streams',
+    'topology_version',
+    '_incidence',
+    '_node_map',
+    '_link_map',
+    '_institution_map',
+    '_component_map',
+    '_node_type_map',
+    '_link_type_map',
+    '_institution_type_map',
+])
+
+
+def _engine_exclusions(engine):
+    """
+        The run-time attributes of an engine: the cache_exclude of its class
+        and of every class it derives from.
+    """
+    excluded = set()
+    for cls in type(engine).__mro__:
+        excluded.update(cls.__dict__.get('cache_exclude', ()))
+    return excluded
+
+
+class _Hasher(object):
+    """
+        Feed arbitrary (nested) python objects into a sha256 digest in a way
+        which does not depend on memory addresses or dict ordering.
+    """
+    def __init__(self):
+        self._digest = hashlib.sha256()
+        self._active = set()
+
+    def hexdigest(self):
+        return self._digest.hexdigest()
+
+    def _write(self, tag, data=b''):
+        self._digest.update(tag.encode('utf-8'))
+        self._digest.update(str(len(data)).encode('utf-8'))
+        self._digest.update(b':')
+        self._digest.update(data)
+
+    def update(self, obj):
+        #Avoid importing the component module at import time
+        from pynsim.components.component import Component
+
+        if obj is None or isinstance(obj, (bool, int, float, complex)):
+            self._write(type(obj).__name__, repr(obj).encode('utf-8'))
+        elif isinstance(obj, str):
+            self._write('str', obj.encode('utf-8'))
+        elif isinstance(obj, bytes):
+            self._write('bytes', obj)
+        elif isinstance(obj, Component):
+            #Components are hashed by reference. Their state is hashed
+            #separately by ResultCache.key
+            self._write('component', ("%s:%s" % (obj.base_type, obj.name)).encode('utf-8'))
+        elif id(obj) in self._active:
+            self._write('cycle')
+        else:
+            self._active.add(id(obj))
+            try:
+                self._update_container(obj)
+            finally:
+                self._active.discard(id(obj))
+
+    def _update_container(self, obj):
+        if isinstance(obj, dict):
+            self._write('dict', str(len(obj)).encode('utf-8'))
+            for k in sorted(obj.keys(), key=repr):
+                self.update(k)
+                self.update(obj[k])
+        elif isinstance(obj, (list, tuple, range)):
+            self._write(type(obj).__name__, str(len(obj)).encode('utf-8'))
+            for v in obj:
+                self.update(v)
+        elif isinstance(obj, (set, frozenset)):
+            self._write('set', str(len(obj)).encode('utf-8'))
+            for v in sorted(obj, key=repr):
+                self.update(v)
+        elif hasattr(obj, 'tobytes') and hasattr(obj, 'dtype'):
+            #numpy arrays and scalars
+            if obj.dtype.hasobject:
+                self._write('ndarray-object')
+                self.update(obj.tolist())
+            else:
+                self._write('ndarray', ("%s%s" % (obj.dtype.str, getattr(obj, 'shape', ()))).encode('utf-8'))
+                self._write('data', obj.tobytes())
+        elif hasattr(obj, 'to_numpy'):
+            #pandas objects
+            self._write(type(obj).__name__)
+            self.update(obj.to_numpy())
+            self.update(getattr(obj, 'index', None))
+            self.update(getattr(obj, 'columns', None))
+        elif callable(obj) and hasattr(obj, '__qualname__'):
+            self._write('callable', ("%s.%s" % (obj.__module__, obj.__qualname__)).encode('utf-8'))
+        elif hasattr(obj, '__dict__'):
+            self._write('object', ("%s.%s" % (type(obj).__module__, type(obj).__name__)).encode('utf-8'))
+            self.update(vars(obj))
+        else:
+            self._write('pickle', pickle.dumps(obj, protocol=2))
+
+
+class ResultCache(object):
+    """
+        An on-disk cache of simulation results, with least-recently-used
+        eviction once the total size of the cache exceeds max_size (in bytes).
+    """
+
+    def __init__(self, cache_dir=None, max_size=1024 ** 3):
+        if cache_dir is None:
+            cache_dir = os.path.join(os.path.expanduser('~'), '.pynsim', 'cache')
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+    def __repr__(self):
+        return "ResultCache(cache_dir=%s, max_size=%s)" % (self.cache_dir, self.max_size)
+
+    def key(self, simulator):
+        """
+            Return a hex digest which identifies the result of running the
+            simulator in its current state.
+        """
+        hasher = _Hasher()
+        hasher.update(pynsim.__version__)
+        hasher.update(list(simulator.timesteps))
+        hasher.update(simulator.max_iterations)
+        seed = simulator.seed
+        hasher.update((getattr(seed, 'seed', seed), getattr(seed, 'scenario', None)))
+
+        network = simulator.network
+        for c in [network] + network.components:
+            hasher.update(c)
+            hasher.update("%s.%s" % (c.__class__.__module__, c.__class__.__name__))
+            hasher.update(dict((k, v) for k, v in vars(c).items()
+                               if k not in EXCLUDED_ATTRIBUTES))
+
+        for engine in simulator.engines:
+            hasher.update("%s.%s" % (engine.__class__.__module__, engine.__class__.__name__))
+            hasher.update(getattr(engine, 'version', None))
+            hasher.update(engine.target)
+            excluded = _engine_exclusions(engine)
+            hasher.update(dict((k, v) for k, v in vars(engine).items() if k not in excluded))
+
+        return hasher.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + '.pickle')
+
+    def mark(self, network):
+        """
+            Record the length of each history in the network, so that only
+            the history recorded by a subsequent run is stored.
+        """
+        marks = {}
+        for c in [network] + network.components:
+            marks[(c.base_type, c.name)] = \
+                dict((k, len(v)) for k, v in c._history.items())
+        return marks
+
+    def save(self, key, network, marks):
+        """
+            Store the history recorded since 'marks' were taken.
+        """
+        results = {}
+        for c in [network] + network.components:
+            mark = marks.get((c.base_type, c.name), {})
+            results[(c.base_type, c.name)] = \
+                dict((k, v[mark.get(k, 0):]) for k, v in c._history.items())
+
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(results, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, self._path(key))
+        except (pickle.PicklingError, TypeError, AttributeError):
+            logging.warning("Unable to cache the results of this simulation. "
+                            "Are any of the component properties unpicklable?")
+            os.remove(tmp_path)
+            return False
+
+        self.evict()
+        return True
+
+    def load(self, key, network):
+        """
+            Restore a cached result into the history of the network and its
+            components, setting each property to its final value.
+
+            :returns True if the result was found in the cache, False otherwise.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                results = pickle.load(f)
+        except (IOError, OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return False
+
+        #Mark the entry as recently used
+        os.utime(path, None)
+        self.hits += 1
+
+        for c in [network] + network.components:
+            for k, values in results.get((c.base_type, c.name), {}).items():
+                c._history.setdefault(k, []).extend(values)
+                if len(values) > 0:
+                    setattr(c, k, deepcopy(values[-1]))
+
+        return True
+
+    def size(self):
+        """
+            The total size of the cache, in bytes.
+        """
+        return sum(os.path.getsize(p) for p, _ in self._entries())
+
+    def _entries(self):
+        entries = []
+        for filename in os.listdir(self.cache_dir):
+            if filename.endswith('.pickle'):
+                path = os.path.join(self.cache_dir, filename)
+                try:
+                    entries.append((path, os.path.getmtime(path)))
+                except OSError:
+                    continue
+        return entries
+
+    def evict(self):
+        """
+            Remove the least recently used entries until the cache is no
+            larger than max_size.
+        """
+        entries = sorted(self._entries(), key=lambda e: e[1])
+        sizes = dict((p, os.path.getsize(p)) for p, _ in entries)
+        total = sum(sizes.values())
+
+        for path, _ in entries:
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+                logging.debug("Evicted %s from result cache", path)
+            except OSError:
+                pass
+            total -= sizes[path]
+
+    def clear(self):
+        """
+            Remove every entry from the cache.
+        """
+        for path, _ in self._entries():
+            os.remove(path)
@@ -0,0 +1,330 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Reduce a network by collapsing chains of pass-through nodes, such as
+    the reaches of a river between two confluences, into single composite
+    nodes:
+
+        with network.coarsen(additive=['dQdx'], accumulate={'Q': 'dQdx'}) as coarse:
+            simulator = Simulator(coarse.network)
+            ...
+            simulator.start()
+
+    A chain is a run of two or more nodes of the same pass-through type,
+    where each node's only link (in the network) leads to the next node, and
+    that is the next node's only link in. The values of the original nodes
+    are reconstructed from their composite at every timestep, so their
+    history is as if they had been simulated.
+
+    Nodes which belong to an institution, or whose links do, are not part of
+    any chain: the institution would act on nodes which are not simulated.
+"""
+
+from pynsim.components.component import Node
+
+
+class CompositeNode(Node):
+    """
+        A node which stands in for a chain of nodes. It has the same type
+        and properties as the last node of the chain.
+
+        At each timestep the setup function of every node in the chain is
+        called. The composite's additive properties are then the sum of the
+        nodes' values, and its other properties those of the last node.
+
+        When the timestep is over the values of the result properties are
+        set on the nodes of the chain before their history is recorded. Each
+        node gets the composite's value, except for accumulated properties,
+        which only include the additive values up to that node:
+
+            Q of node i = Q of composite - sum of dQdx of nodes after i
+
+        The nodes of the chain have the same network as the composite, so
+        that they see the reduced network while it is simulated.
+    """
+
+    def __init__(self, name, members, additive=None, accumulate=None, results=None):
+        tail = members[-1]
+        self.members = members
+        #The properties of the chain, rather than of the class
+        self._properties = tail._properties
+        super(CompositeNode, self).__init__(name, tail.x, tail.y)
+        self.component_type = tail.component_type
+        self.colour = tail.colour
+        self.network = tail.network
+        self.additive = list(additive or [])
+        self.accumulate = dict(accumulate or {})
+        self.results = list(results or [])
+        self._gather()
+
+    def __repr__(self):
+        return "CompositeNode(name=%s, members=%s)" % (self.name, [m.name for m in self.members])
+
+    @property
+    def network(self):
+        return self.__dict__.get('network')
+
+    @network.setter
+    def network(self, network):
+        self.__dict__['network'] = network
+        for m in self.members:
+            m.network = network
+
+    def _gather(self):
+        """
+            Set the composite's properties from the nodes of the chain.
+        """
+        tail = self.members[-1]
+        for k in self._properties:
+            if k in self.additive:
+                values = [getattr(m, k) for m in self.members]
+                if any(v is None for v in values):
+                    total = None
+                else:
+                    total = values[0]
+                    for v in values[1:]:
+                        total = total + v
+                setattr(self, k, total)
+            elif k not in self.results and k not in self.accumulate:
+                setattr(self, k, getattr(tail, k))
+
+    def setup(self, timestamp):
+        for m in self.members:
+            m.setup(timestamp)
+        self._gather()
+
+    def post_process(self):
+        super(CompositeNode, self).post_process()
+
+        for k in self.results:
+            for m in self.members:
+                setattr(m, k, getattr(self, k))
+
+        for k, additive in self.accumulate.items():
+            value = getattr(self, k)
+            for m in reversed(self.members):
+                setattr(m, k, value)
+                value = value - getattr(m, additive)
+
+        for m in self.members:
+            m.post_process()
+
+
+class Coarsening(object):
+    """
+        A reduced version of a network, in which chains of pass-through nodes
+        have been replaced by composite nodes.
+
+        While the coarsening is in place, the links into and out of each
+        chain are connected to its composite node instead. The links within
+        the chains are not part of the reduced network, so their history is
+        not recorded. Call restore() (or use the coarsening as a context
+        manager) to connect the links back to the original nodes.
+
+        attributes:
+            network Network: The reduced network, a subnetwork of the
+                             original sharing its components.
+            chains list: The CompositeNodes.
+    """
+
+    def __init__(self, network, chains, additive=None, accumulate=None, results=None):
+        in_institutions = _institution_nodes(network)
+        for chain in chains:
+            for node in chain:
+                if id(node) in in_institutions:
+                    raise Exception("Node %s belongs to an institution (or one of its "
+                                    "links does), so it cannot be part of a chain."
+                                    % node.name)
+
+        self.original = network
+        self.chains = []
+        self._rewired = []
+
+        in_network = set(id(l) for l in network.links)
+        replaced = {}
+        internal = set()
+        for chain in chains:
+            composite = CompositeNode("%s..%s" % (chain[0].name, chain[-1].name), chain,
+                                      additive=additive, accumulate=accumulate,
+                                      results=results)
+            self.chains.append(composite)
+            for node in chain:
+                replaced[id(node)] = composite
+            for node in chain[:-1]:
+                internal.update(id(l) for l in node.out_links if id(l) in in_network)
+
+        nodes = []
+        for node in network.nodes:
+            composite = replaced.get(id(node))
+            if composite is None:
+                nodes.append(node)
+            elif node is composite.members[-1]:
+                #Composites take the place of the last node of their chain
+                nodes.append(composite)
+
+        links = [l for l in network.links if id(l) not in internal]
+        for link in links:
+            start = replaced.get(id(link.start_node))
+            end = replaced.get(id(link.end_node))
+            if start is not None:
+                self._rewire(link, 'start_node', start)
+                start.out_links.append(link)
+            if end is not None:
+                self._rewire(link, 'end_node', end)
+                end.in_links.append(link)
+
+        self.network = network.subnetwork(nodes, links, network.institutions,
+                                          name="%s (coarse)" % network.name)
+        self.network.add_components(*[c for c in network.components
+                                      if c.base_type not in ('node', 'link', 'institution')])
+
+    def __repr__(self):
+        return "Coarsening(network=%s, chains=%s)" % (self.original.name, len(self.chains))
+
+    def _rewire(self, link, end, node):
+        self._rewired.append((link, end, getattr(link, end)))
+        setattr(link, end, node)
+
+    def restore(self):
+        """
+            Connect the links back to the nodes of the original network.
+        """
+        for link, end, node in reversed(self._rewired):
+            setattr(link, end, node)
+        self._rewired = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.restore()
+        return False
+
+
+def _institution_nodes(network):
+    """
+        The ids of the nodes which belong to an institution of the network,
+        or which a link belonging to one starts or ends at.
+    """
+    nodes = set()
+    for institution in network.institutions:
+        nodes.update(id(n) for n in institution.nodes)
+        for link in institution.links:
+            nodes.add(id(link.start_node))
+            nodes.add(id(link.end_node))
+    return nodes
+
+
+def find_chains(network, pass_through_types=None, min_length=2):
+    """
+        Find the chains of pass-through nodes in a network, leaving out the
+        nodes which belong to an institution.
+
+        args:
+            pass_through_types list: The component types of the pass-through
+                                     nodes. Defaults to the types of the
+                                     nodes whose class sets pass_through.
+            min_length int: The smallest number of nodes worth collapsing.
+
+        :returns A list of lists of nodes, from upstream to downstream.
+    """
+    in_network = set(id(l) for l in network.links)
+    in_institutions = _institution_nodes(network)
+
+    def links_in(node):
+        return [l for l in node.in_links if id(l) in in_network]
+
+    def links_out(node):
+        return [l for l in node.out_links if id(l) in in_network]
+
+    def is_pass_through(node):
+        if id(node) in in_institutions:
+            return False
+        if pass_through_types is None:
+            return node.pass_through is True
+        return node.component_type in pass_through_types
+
+    def next_node(node):
+        #The node this node leads on to in a chain, if any
+        out = links_out(node)
+        if len(out) != 1:
+            return None
+        following = out[0].end_node
+        if following is node or not is_pass_through(following) or \
+           following.component_type != node.component_type or \
+           len(links_in(following)) != 1:
+            return None
+        return following
+
+    def previous_node(node):
+        incoming = links_in(node)
+        if len(incoming) != 1:
+            return None
+        previous = incoming[0].start_node
+        if previous is not node and next_node(previous) is node:
+            return previous
+        return None
+
+    chains = []
+    seen = set()
+    for node in network.nodes:
+        if id(node) in seen or not is_pass_through(node) or previous_node(node) is not None:
+            continue
+        chain = [node]
+        seen.add(id(node))
+        following = next_node(node)
+        while following is not None and id(following) not in seen:
+            chain.append(following)
+            seen.add(id(following))
+            following = next_node(following)
+        if len(chain) >= min_length:
+            chains.append(chain)
+
+    return chains
+
+
+def coarsen(network, pass_through_types=None, additive=None, accumulate=None,
+            results=None, min_length=2):
+    """
+        Collapse the chains of pass-through nodes in a network into
+        composite nodes. See CompositeNode and Coarsening.
+
+        args:
+            pass_through_types list: See find_chains.
+            additive list: Properties which are summed along a chain, such
+                           as local inflows.
+            accumulate dict: Result properties which build up along a chain,
+                             each mapped to the additive property it
+                             accumulates, e.g. {'Q': 'dQdx'}.
+            results list: Result properties which are the same all along a
+                          chain. Defaults to the _result_properties of the
+                          nodes which are not accumulated.
+            min_length int: See find_chains.
+
+        :returns A Coarsening
+    """
+    chains = find_chains(network, pass_through_types, min_length)
+    if results is None:
+        accumulated = set(accumulate or {})
+        results = []
+        for chain in chains:
+            for k in chain[-1]._result_properties:
+                if k not in accumulated and k not in results:
+                    results.append(k)
+    return Coarsening(network, chains, additive=additive, accumulate=accumulate,
+                      results=results)
@@ -15,16 +15,23 @@
 #    You should have received a copy of the GNU General Public License
 #    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
+import inspect
 import logging
 import os
-import time
 import pickle
 from copy import deepcopy, copy
 import sys
 import datetime
+from time import perf_counter_ns
 from pynsim.history import Map
+from pynsim.timing import ComponentTimer
 import json
 
+#Default property values of these types are shared, as copying them would
+#give the same object back anyway
+IMMUTABLE_TYPES = frozenset([int, float, complex, bool, str, bytes, type(None)])
+
 class Component(object):
     """
         A top level object, from which Networks, Nodes, Links and Institions
@@ -47,7 +54,7 @@ class Component(object):
         self._history = dict()
                 
         for k, v in self._properties.items():
-            setattr(self, k, deepcopy(v))
+            setattr(self, k, v if type(v) in IMMUTABLE_TYPES else deepcopy(v))
             self._history[k] = []
 
         for k, v in kwargs.items():
@@ -74,6 +81,14 @@ class Component(object):
         for k in self._properties:
             self._history[k] = []        
 
+    def trim_history(self, keep=1):
+        """
+            Keep only the last keep values of the history of each property.
+        """
+        for values in self._history.values():
+            if len(values) > keep:
+                del values[:len(values) - keep]
+
     def get_properties(self):
         """
             Get all the properties for this component (as defined in
@@ -95,6 +110,18 @@ class Component(object):
     def __repr__(self):
         return "Component(name=%s)" % (self.name)
 
+    @property
+    def rng(self):
+        """
+            This component's own random number generator (a numpy Generator).
+            This is only available when the simulator has been given a seed.
+        """
+        network = self if self.base_type == 'network' else getattr(self, 'network', None)
+        if network is None or network.random_streams is None:
+            raise RuntimeError("No random number streams are available for %s. "
+                               "Please set a seed on the simulator." % self.name)
+        return network.random_streams.component(self)
+
     def setup(self, timestamp):
         """
             Setup function to be overwritten in each component implementation
@@ -155,11 +182,51 @@ class Container(Component):
         self._node_type_map = {}
         self._link_type_map = {}
         self._institution_type_map = {}
+        #Incremented whenever a node, link, institution or component is
+        #added, so that structures derived from the topology can be rebuilt.
+        self.topology_version = 0
 
         self.add_nodes(*nodes)
         self.add_links(*links)
         self.add_institutions(*institutions)
 
+    def _topology_changed(self, count=1):
+        """
+            Increment the topology version, and that of an institution's
+            network, as what is derived from the network's topology may
+            depend on the members of its institutions.
+        """
+        self.topology_version += count
+        if self.base_type == 'institution' and self.network is not None:
+            self.network._topology_changed(count)
+
+    def _add_many(self, components, members, name_map, type_map):
+        """
+            Add nodes, links or institutions in one go, as adding them one
+            at a time would. If any of their names is taken, nothing is added
+            and False is returned, so that they can be added one at a time
+            to raise the error at the right component.
+        """
+        new_names = dict((c.name, c) for c in components)
+        if len(new_names) != len(components) or not name_map.keys().isdisjoint(new_names):
+            return False
+
+        members.extend(components)
+        self.components.extend(components)
+        name_map.update(new_names)
+        self._topology_changed(len(components))
+
+        if self.base_type == 'network' and self.parent is None:
+            for c in components:
+                c.network = self
+
+        for c in components:
+            of_type = type_map.get(c.component_type)
+            if of_type is None:
+                of_type = type_map[c.component_type] = []
+            of_type.append(c)
+        return True
+
     def add_link(self, link):
         """
             Add a single link to the network.
@@ -176,6 +243,7 @@ class Container(Component):
 
         self.links.append(link)
         self.components.append(link)
+        self._topology_changed()
 
         if link.name in self._link_map:
             raise Exception("An link with the name %s is already defined. Link names must be unique."%link.name)
@@ -183,8 +251,8 @@ class Container(Component):
         self._link_map[link.name] = link
 
         if self.base_type == 'network':
-            self.timing['links'][link.name] = 0
-            link.network = self
+            if self.parent is None:
+                link.network = self
 
         links_of_type = self._link_type_map.get(link.component_type, [])
         links_of_type.append(link)
@@ -196,8 +264,19 @@ class Container(Component):
             Add multiple links to the network like so:
             net.add_links(link1, link2)
         """
+        if any(l.start_node is None or l.end_node is None for l in args):
+            #Fail at the same link as adding them one at a time would
+            for l in args:
+                self.add_link(l)
+            return
+
         for l in args:
-            self.add_link(l)
+            if l.name is None:
+                l.name = l.start_node.name + " . " + l.end_node.name
+
+        if not self._add_many(args, self.links, self._link_map, self._link_type_map):
+            for l in args:
+                self.add_link(l)
 
     def get_link(self, link_name):
         """
@@ -222,6 +301,7 @@ class Container(Component):
         """
         self.nodes.append(node)
         self.components.append(node)
+        self._topology_changed()
 
         if node.name in self._node_map:
             raise Exception("An node with the name %s is already defined. Node names must be unique."%node.name)
@@ -230,8 +310,8 @@ class Container(Component):
 
         #If i'm a network, as opposed to an institution
         if self.base_type == 'network':
-            self.timing['nodes'][node.name] = 0
-            node.network = self
+            if self.parent is None:
+                node.network = self
 
         nodes_of_type = self._node_type_map.get(node.component_type, [])
         nodes_of_type.append(node)
@@ -243,8 +323,9 @@ class Container(Component):
             Add multiple nodes to the network, like so:
             net.add_nodes(node1, node2)
         """
-        for n in args:
-            self.add_node(n)
+        if not self._add_many(args, self.nodes, self._node_map, self._node_type_map):
+            for n in args:
+                self.add_node(n)
 
     def get_node(self, node_name):
         """
@@ -269,6 +350,7 @@ class Container(Component):
         """
         self.institutions.append(institution)
         self.components.append(institution)
+        self._topology_changed()
 
         if institution.name in self._institution_map:
             raise Exception("An institution with the name %s is already defined. Institutions names must be unique."%institution.name)
@@ -277,8 +359,8 @@ class Container(Component):
 
         #If i'm a network, as opposed to an institution
         if self.base_type == 'network':
-            self.timing['institutions'][institution.name] = 0
-            institution.network = self
+            if self.parent is None:
+                institution.network = self
 
         institutions_of_type = \
             self._institution_type_map.get(institution.component_type, [])
@@ -292,8 +374,10 @@ class Container(Component):
             Add multiple institutions to the network, like so:
             net.add_institutions(inst1, inst2)
         """
-        for institution in args:
-            self.add_institution(institution)
+        if not self._add_many(args, self.institutions, self._institution_map,
+                              self._institution_type_map):
+            for institution in args:
+                self.add_institution(institution)
 
     def get_institution(self, institution_name):
         """
@@ -313,23 +397,37 @@ class Container(Component):
         else:
             return self._institution_type_map.get(component_type, [])
 
+    def get_component(self, name):
+        """
+            Get a node, link, institution or other component by name (or
+            this container itself). Returns None if it is not found.
+        """
+        if self.name == name:
+            return self
+        for component_map in (self._node_map, self._link_map,
+                              self._institution_map, self._component_map):
+            component = component_map.get(name)
+            if component is not None:
+                return component
+        return None
+
     def add_component(self, component):
         """
             Add a single component to the network.
         """
 
         self.components.append(component)
+        self._topology_changed()
 
         if component.name in self._component_map:
             raise Exception("An component with the name %s is already defined. Component names must be unique."%component.name)
 
         self._component_map[component.name] = component
 
-        #If i'm a network, as opposed to a component, then setup timing parameters, and set
-        #the network parameter
+        #If i'm a network, as opposed to a component, then set the network parameter
         if self.base_type == 'network':
-            self.timing['unknown'][component.name] = 0
-            component.network = self
+            if self.parent is None:
+                component.network = self
 
     def add_components(self, *args):
         """
@@ -349,16 +447,23 @@ class Network(Container):
         A container for nodes, links and institutions.
     """
     base_type = 'network'
+    #The pynsim.rng.RandomStreams of the current simulation, if seeded.
+    random_streams = None
+    #The network from which this network was taken, if it is a subnetwork.
+    parent = None
 
     def __init__(self, name, **kwargs):
         super(Network, self).__init__(name, **kwargs)
 
         #Track the timing of the setup functions for each node,link and institution
-        self.timing = {'nodes':{}, 'links':{}, 'institutions':{}, 'unknown':{}}
+        self.timer = ComponentTimer()
 
         self.current_timestep = None
         self.current_timestep_idx = None
 
+        #(topology version, incidence arrays), see incidence()
+        self._incidence = None
+
 
     def export_history(self, export_type='pickle',
                       complete=True,
@@ -384,54 +489,10 @@ class Network(Container):
                             "properties you wish to export in your agents class like so: _result_properties = [propa, prob, ...]")
 
 
-        history = Map({'nodes' : Map(), 'links' : Map(), 'institutions' : Map(), 'network': Map(), 'other': Map()})
-      
-        if complete is True:
-            Map(self._history)
-        else:
-            truncated_history = {}
-            for param_name in self._result_properties:
-                truncated_history[param_name] = self._history[param_name]
-            history['network'][self.name] = Map(truncated_history)
-    
-        for c in self.components:
+        history = self.collect_history(complete=complete,
+                                       include_all_components=include_all_components,
+                                       validate_before_export=validate_before_export)
 
-            if validate_before_export is True:
-                if not c.validate_history():
-                    continue
-
-            if c.base_type == 'node':
-                if complete is True:
-                    history['nodes'][c.name] = Map(c._history)
-                else:
-                    truncated_history = {}
-                    for param_name in c._result_properties:
-                        truncated_history[param_name] = c._history[param_name]
-                    history['nodes'][c.name] = Map(truncated_history)
-            elif c.base_type == 'link':
-                if complete is True:
-                    history['links'][c.name] = Map(c._history)
-                else:
-                    truncated_history = {}
-                    for param_name in c._result_properties:
-                        truncated_history[param_name] = c._history[param_name]
-            elif c.base_type == 'institution':
-                if complete is True:
-                    history['institutions'][c.name] = Map(c._history)
-                else:
-                    truncated_history = {}
-                    for param_name in c._result_properties:
-                        truncated_history[param_name] = c._history[param_name]
-
-            else:
-                if include_all_components is True:
-                    if complete is True:
-                        history['other'][c.name] = Map(c._history)
-                else:
-                    truncated_history = {}
-                    for param_name in c._result_properties:
-                        truncated_history[param_name] = c._history[param_name]
-    
         if target_dir is None:
             target_dir  = os.path.dirname(os.path.realpath(sys.argv[0]))
 
@@ -451,7 +512,7 @@ class Network(Container):
             os.remove(os.path.join(hist_dir, 'sim_'+now+'.json'))
 
             logging.warning('Unable to dump to JSON, trying a pickle')
-            with open(os.path.join(hist_dir, 'sim_'+now+'.pickle'), 'w') as f:
+            with open(os.path.join(hist_dir, 'sim_'+now+'.pickle'), 'wb') as f:
                 pickle.dump(history, f)
                 export_path = os.path.join(hist_dir, 'sim_'+now+'.pickle')
         except Exception:
@@ -466,6 +527,50 @@ class Network(Container):
         
         logging.info('History Dumped to %s' % export_path)
 
+        return export_path
+
+    def collect_history(self, complete=True, include_all_components=False,
+                        validate_before_export=False):
+        """
+            Gather the history of the network and all sub-components into a
+            single Map, keyed on 'network', 'nodes', 'links', 'institutions'
+            and 'other', then on component name. This is what export_history
+            writes to file.
+
+            args:
+                complete Boolean: When set to False, only include the properties set in the '_result_properties' attribute
+                include_all_components Boolean: Include the history of components which are not nodes, links or institutions
+                validate_before_export Boolean: Skip components whose history cannot be exported
+        """
+        def component_history(c):
+            if complete is True:
+                return Map(c._history)
+            truncated_history = {}
+            for param_name in c._result_properties:
+                truncated_history[param_name] = c._history[param_name]
+            return Map(truncated_history)
+
+        history = Map({'nodes' : Map(), 'links' : Map(), 'institutions' : Map(), 'network': Map(), 'other': Map()})
+
+        history['network'][self.name] = component_history(self)
+
+        for c in self.components:
+
+            if validate_before_export is True:
+                if not c.validate_history():
+                    continue
+
+            if c.base_type == 'node':
+                history['nodes'][c.name] = component_history(c)
+            elif c.base_type == 'link':
+                history['links'][c.name] = component_history(c)
+            elif c.base_type == 'institution':
+                history['institutions'][c.name] = component_history(c)
+            elif include_all_components is True:
+                history['other'][c.name] = component_history(c)
+
+        return history
+
     def set_timestep(self, timestamp, timestep_idx):
         """
             Set the current timestep in the simulation as an attribute
@@ -474,6 +579,120 @@ class Network(Container):
         self.current_timestep = timestamp
         self.current_timestep_idx = timestep_idx
 
+        #The components of a subnetwork still refer to the parent network
+        if self.parent is not None:
+            self.parent.set_timestep(timestamp, timestep_idx)
+
+    def subnetwork(self, nodes, links=None, institutions=None, name=None):
+        """
+            Create a network of the same type containing a subset of this
+            network's nodes, links and institutions, which can be simulated
+            on its own.
+
+            The components are shared with this network rather than copied,
+            and continue to refer to this network as their 'network', except
+            while the subnetwork is simulated (see bind_components). The
+            network's own property values are copied to the subnetwork, which
+            has its own (empty) history.
+
+            args:
+                nodes list: The nodes in the subnetwork
+                links list: The links in the subnetwork. If None, every link
+                            in this network between two of the nodes.
+                institutions list: The institutions in the subnetwork.
+                name string: Defaults to the name of this network.
+        """
+        if links is None:
+            node_set = set(nodes)
+            links = [l for l in self.links
+                     if l.start_node in node_set and l.end_node in node_set]
+        if institutions is None:
+            institutions = []
+
+        subnetwork = self.__class__.__new__(self.__class__)
+        subnetwork.__dict__.update(self.__dict__)
+        if name is not None:
+            subnetwork.name = name
+        subnetwork.parent = self
+        subnetwork._history = dict((k, []) for k in self._history)
+        subnetwork.topology_version = 0
+        subnetwork._incidence = None
+
+        subnetwork.timer = ComponentTimer()
+        subnetwork.components = []
+        subnetwork.nodes = []
+        subnetwork.links = []
+        subnetwork.institutions = []
+        subnetwork._node_map = {}
+        subnetwork._link_map = {}
+        subnetwork._institution_map = {}
+        subnetwork._component_map = {}
+        subnetwork._node_type_map = {}
+        subnetwork._link_type_map = {}
+        subnetwork._institution_type_map = {}
+
+        subnetwork.add_nodes(*nodes)
+        subnetwork.add_links(*links)
+        subnetwork.add_institutions(*institutions)
+
+        return subnetwork
+
+    def bind_components(self):
+        """
+            Make this network the 'network' of its components, so that they
+            see the values which its setup sets. A subnetwork is simulated
+            like this, as its components otherwise refer to the network it
+            was taken from.
+
+            :returns A function which makes the components refer to their
+                     previous networks again.
+        """
+        previous = [(c, c.network) for c in self.components]
+        for c, network in previous:
+            c.network = self
+
+        def unbind():
+            for c, network in previous:
+                c.network = network
+        return unbind
+
+    def upstream_closure(self, targets, name=None):
+        """
+            Create a subnetwork containing only what can affect some nodes or
+            links: the targets, everything upstream of them and the
+            institutions controlling any of it, with all their members. See
+            pynsim.topology.upstream_closure and subnetwork.
+
+            args:
+                targets list: Nodes or links, or their names.
+                name string: Defaults to the name of this network.
+        """
+        from pynsim.topology import upstream_closure
+
+        nodes, links, institutions = upstream_closure(self, targets)
+        return self.subnetwork(nodes, links, institutions, name=name)
+
+    def coarsen(self, pass_through_types=None, additive=None, accumulate=None,
+                results=None, min_length=2):
+        """
+            Collapse chains of pass-through nodes into composite nodes, to
+            simulate a smaller network. See pynsim.coarsening.coarsen.
+
+            :returns A pynsim.coarsening.Coarsening, whose 'network' is the
+                     reduced network.
+        """
+        from pynsim.coarsening import coarsen
+        return coarsen(self, pass_through_types, additive=additive, accumulate=accumulate,
+                       results=results, min_length=min_length)
+
+    def memory_report(self):
+        """
+            The bytes held by each component type's instances, properties and
+            history, and by the network's indexes. See pynsim.memory.
+        """
+        from pynsim.memory import memory_report
+        return memory_report(self)
+
     def post_process(self):
         """
             Once all the appropriate values have been set, ensure that the
@@ -484,45 +703,258 @@ class Network(Container):
         for c in self.components:
             c.post_process()
 
-    def setup_components(self, timestamp, record_time=False):
+    def trim_history(self, keep=1):
+        """
+            Keep only the last keep values of the history of the network and
+            each of its components.
+        """
+        super(Network, self).trim_history(keep)
+        for c in self.components:
+            c.trim_history(keep)
+
+    def draw_random(self, component_type, method='random', *args, **kwargs):
+        """
+            Draw a random value for every node, link or institution of the
+            given type in a single call. See pynsim.rng.RandomStreams.draw.
+
+            :returns A numpy array, in the order of get_nodes(component_type)
+                     (or get_links, get_institutions)
+        """
+        if self.random_streams is None:
+            raise RuntimeError("No random number streams are available. "
+                               "Please set a seed on the simulator.")
+
+        components = self._node_type_map.get(component_type) or \
+            self._link_type_map.get(component_type) or \
+            self._institution_type_map.get(component_type, [])
+
+        return self.random_streams.draw(components, method, *args, **kwargs)
+
+    def incidence(self):
+        """
+            The positions (in self.nodes) of the start and end node of each
+            link (in self.links), and the number of links into and out of each
+            node, as numpy arrays. See pynsim.arrays.incidence.
+
+            The arrays are cached until a node or link is added.
+        """
+        if self._incidence is None or self._incidence[0] != self.topology_version:
+            from pynsim.arrays import incidence
+            self._incidence = (self.topology_version, incidence(self.nodes, self.links))
+        return self._incidence[1]
+
+    def gather(self, property_name, to='end', how='sum', default=0.0, empty=0.0,
+               target=None):
+        """
+            Combine a property of the links onto their end nodes (or start
+            nodes), in one call. For example, the total inflow of every node:
+
+                inflow = network.gather('flow')
+
+            args:
+                to string: 'end' or 'start'
+                how string: 'sum', 'max', 'min' or 'mean'
+                default: The value of links where the property is not set.
+                empty: The value of nodes with no links.
+                target string: If set, also set the result as this property
+                               of the nodes.
+
+            :returns A numpy array, in the order of self.nodes
+        """
+        from pynsim.arrays import get_values, set_values, aggregate
+
+        if to not in ('end', 'start'):
+            raise Exception("Invalid value %s for 'to'. Use 'end' or 'start'." % to)
+        positions = self.incidence()[to]
+        result = aggregate(get_values(self.links, property_name, default=default),
+                           positions, len(self.nodes), how=how, empty=empty)
+        if target is not None:
+            set_values(self.nodes, target, result)
+        return result
+
+    def scatter(self, property_name, to='out', default=0.0, target=None):
+        """
+            Copy a property of each node onto its out-links (or in-links), in
+            one call.
+
+            args:
+                to string: 'out' (from the start node of each link) or 'in'
+                           (from the end node)
+                default: The value of nodes where the property is not set.
+                target string: If set, also set the result as this property
+                               of the links.
+
+            :returns A numpy array, in the order of self.links
+        """
+        from pynsim.arrays import get_values, set_values
+
+        if to not in ('out', 'in'):
+            raise Exception("Invalid value %s for 'to'. Use 'out' or 'in'." % to)
+        positions = self.incidence()['start' if to == 'out' else 'end']
+        result = get_values(self.nodes, property_name, default=default)[positions]
+        if target is not None:
+            set_values(self.links, target, result)
+        return result
+
+    def propagate(self, property_name, weight=None, how='sum', default=0.0,
+                  empty=0.0, target=None):
+        """
+            Pass a property of each node along its out-links to the nodes
+            downstream, optionally multiplied by a property of the links, and
+            combine what arrives at each node. For example:
+
+                arriving = network.propagate('outflow', weight='flowmult')
+
+            args:
+                weight string: A property of the links (1 where not set).
+                how, default, empty, target: As for gather.
+
+            :returns A numpy array, in the order of self.nodes
+        """
+        from pynsim.arrays import get_values, set_values, aggregate
+
+        arrays = self.incidence()
+        values = get_values(self.nodes, property_name, default=default)[arrays['start']]
+        if weight is not None:
+            values = values * get_values(self.links, weight, default=1.0)
+        result = aggregate(values, arrays['end'], len(self.nodes), how=how, empty=empty)
+        if target is not None:
+            set_values(self.nodes, target, result)
+        return result
+
+    def setup_components(self, timestamp, record_time=False, profiles=None):
         """
             Call the setup function of each of the nodes in the network
             in turn.
 
-            :returns The time it took to call the function (in seconds)
-        """
+            profiles is a dict of profilers (see pynsim.profiling) by
+            component type, to enable while the components of that type are
+            set up.
 
-        time_dict = {'nodes':0, 'links':0, 'institutions':0, 'unknown':0}
+            record_time is True to time each component, or 'types' to time
+            each run of components of the same type (see pynsim.timing).
 
-        for c in self.components:
+            :returns The time it took to call the function (in seconds)
+        """
+        components = self.components
+        if record_time or profiles:
+            self.timer.bind(self)
+            runs = self.timer.runs
+        else:
+            runs = ((None, 0, len(components)),)
+        #The clock is read after each component, or after each run
+        stamps = self.timer.stamps if record_time is True else None
+        run_stamps = [perf_counter_ns()]
+        if stamps is not None:
+            stamps[0] = run_stamps[0]
+
+        for component_type, first, last in runs:
+            profile = profiles.get(component_type) if profiles else None
+            if profile is not None:
+                profile.enable()
             try:
+                for i in range(first, last):
+                    c = components[i]
+                    try:
+                        result = c.setup(timestamp)
+                        if result is not None and inspect.isawaitable(result):
+                            result.close()
+                            raise RuntimeError("The setup of %s is asynchronous. Please use "
+                                               "Simulator.start_async." % c.name)
+                    except:
+                        logging.critical("An error occurred setting up node %s"
+                                         " (timestamp=%s)", c.name, timestamp)
+                        raise
+                    if stamps is not None:
+                        stamps[i + 1] = perf_counter_ns()
+            finally:
+                if profile is not None:
+                    profile.disable()
+            if record_time == 'types':
+                run_stamps.append(perf_counter_ns())
+
+        if record_time is True:
+            return self.timer.record_stamps()
+        if record_time == 'types':
+            return self.timer.record_runs(run_stamps)
+        return {'nodes':0, 'links':0, 'institutions':0, 'unknown':0}
+
+    async def setup_components_async(self, timestamp, record_time=False, profiles=None):
+        """
+            Call the setup function of each of the components in the network,
+            in the same order as setup_components. Setup functions which are
+            coroutines ('async def setup') are awaited concurrently with the
+            others of the same run of components of the same type, before the
+            next run is set up.
+
+            profiles and record_time are as for setup_components. The profiler
+            of a type is enabled until its run has been awaited.
+
+            :returns The time it took to call the functions (in seconds). The
+                     time of a coroutine is from when it was started until it
+                     finished.
+        """
+        timer = self.timer
+        timer.bind(self)
+        components = self.components
+        durations = timer.durations
+        stamps = timer.stamps
+        stamps[0] = perf_counter_ns()
+
+        for component_type, first, last in timer.runs:
+            profile = profiles.get(component_type) if profiles else None
+            if profile is not None:
+                profile.enable()
+            try:
+                pending = []
+                for i in range(first, last):
+                    c = components[i]
+                    try:
+                        t = perf_counter_ns()
+                        result = c.setup(timestamp)
+                    except:
+                        logging.critical("An error occurred setting up node %s"
+                                         " (timestamp=%s)", c.name, timestamp)
+                        raise
+
+                    if result is not None and inspect.isawaitable(result):
+                        pending.append(self._await_setup(i, c, timestamp, result, t))
+                    elif record_time is True:
+                        durations[i] = perf_counter_ns() - t
+
+                for i, setup_time in await asyncio.gather(*pending):
+                    if record_time is True:
+                        durations[i] = setup_time
+            finally:
+                if profile is not None:
+                    profile.disable()
+            #Only the stamps at the ends of the runs are read (see Tracer.component_spans)
+            stamps[last] = perf_counter_ns()
+
+        if record_time is True:
+            return timer.record()
+        if record_time == 'types':
+            return timer.record_runs([stamps[0]] + [stamps[last] for _, _, last in timer.runs])
+        return {'nodes':0, 'links':0, 'institutions':0, 'unknown':0}
+
+    async def _await_setup(self, i, c, timestamp, coroutine, start_time):
+        try:
+            await coroutine
+        except:
+            logging.critical("An error occurred setting up node %s"
+                             " (timestamp=%s)", c.name, timestamp)
+            raise
+        return i, perf_counter_ns() - start_time
 
-                if record_time is True:
-                    individual_time = time.time()
-
-                c.setup(timestamp)
-
-                if record_time is True:
-                    #Compile the timing dictionary
-                    setup_time = time.time()-individual_time
-                    if c.base_type == 'node':
-                        self.timing['nodes'][c.name] += setup_time
-                        time_dict['nodes'] += setup_time
-                    elif c.base_type == 'link':
-                        self.timing['links'][c.name] += setup_time
-                        time_dict['links'] += setup_time
-                    elif c.base_type == 'institution':
-                        self.timing['institutions'][c.name] += setup_time
-                        time_dict['institutions'] += setup_time
-                    elif c.base_type == 'component':
-                        self.timing['unknown'][c.name] += setup_time
-                        time_dict['unknown'] += setup_time
-            except:
-                logging.critical("An error occurred setting up node %s"
-                                 " (timestamp=%s)", c.name, timestamp)
-                raise
-
-        return time_dict
+    @property
+    def timing(self):
+        """
+            The total time of the setup function of each component, in
+            seconds: {'nodes': {name: time}, 'links': {...},
+            'institutions': {...}, 'unknown': {...}}. See pynsim.timing.
+        """
+        self.timer.bind(self)
+        return self.timer.as_dict()
 
     @property
     def connectivity(self):
@@ -730,6 +1162,9 @@ class Node(Component):
     component_type = 'node'
     network = None
     colour = 'red'
+    #Set to True on node classes which only pass flow on, so that chains of
+    #them can be collapsed by Network.coarsen.
+    pass_through = False
 
     def __init__(self, name, x, y, **kwargs):
         super(Node, self).__init__(name, **kwargs)
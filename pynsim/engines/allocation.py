@@ -0,0 +1,213 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+from .optimisation import OptimisationEngine
+
+
+class AllocationEngine(OptimisationEngine):
+    """
+        A priority based network allocation engine, solved as a linear
+        programme with the HiGHS solver in scipy.
+
+        The flow in each link is limited by its min_flow and max_flow and
+        costs 'cost' per unit (a negative cost is a benefit). A fraction
+        'flowmult' of the flow reaches the end node. Flow is conserved at
+        every node, which may also have an external 'inflow'. Nodes are
+        junctions unless their type is given as one of:
+
+            storage_types: Nodes which store water (S) between min_stor and
+                           max_stor, starting from their previous storage or
+                           init_stor. Storage costs carryover_penalty per unit.
+            demand_types: Nodes which consume up to 'demand', with a benefit
+                          of 'priority' per unit delivered ('delivery').
+            boundary_types: Nodes where water can enter or leave the network
+                            freely. The net outflow is set as 'Q'.
+
+        The names of the properties can be changed with property_names, for
+        example property_names={'flow': 'Q'}.
+
+        The node-link mass balance is assembled as a sparse matrix directly
+        from the link incidence of the network. Its structure is built once;
+        each timestep only the flow multipliers, bounds and costs are updated.
+    """
+    name = "Sparse LP priority based allocation engine"
+    cache_exclude = ('objective',)
+
+    property_names = {
+        'flow': 'flow',
+        'cost': 'cost',
+        'flowmult': 'flowmult',
+        'min_flow': 'min_flow',
+        'max_flow': 'max_flow',
+        'inflow': 'inflow',
+        'storage': 'S',
+        'init_stor': 'init_stor',
+        'min_stor': 'min_stor',
+        'max_stor': 'max_stor',
+        'carryover_penalty': 'carryover_penalty',
+        'demand': 'demand',
+        'delivery': 'delivery',
+        'priority': 'priority',
+        'boundary_flow': 'Q',
+    }
+
+    def __init__(self, target, storage_types=None, demand_types=None,
+                 boundary_types=None, property_names=None, **kwargs):
+        super(AllocationEngine, self).__init__(target, **kwargs)
+        self.storage_types = set(storage_types or [])
+        self.demand_types = set(demand_types or [])
+        self.boundary_types = set(boundary_types or [])
+        self.property_names = dict(AllocationEngine.property_names)
+        self.property_names.update(property_names or {})
+        #The value of the objective function at the last timestep
+        self.objective = None
+
+    def build_model(self):
+        try:
+            import numpy as np
+            import scipy.sparse
+        except ImportError:
+            logging.critical("The allocation engine requires numpy and scipy. "
+                             "Please ensure they are installed.")
+            raise
+
+        network = self.target
+        nodes = network.nodes
+        links = network.links
+
+        arrays = network.incidence()
+        start = arrays['start']
+        end = arrays['end']
+
+        storage = np.array([i for i, n in enumerate(nodes)
+                            if n.component_type in self.storage_types], dtype=np.int64)
+        demand = np.array([i for i, n in enumerate(nodes)
+                           if n.component_type in self.demand_types], dtype=np.int64)
+        boundary = np.array([i for i, n in enumerate(nodes)
+                             if n.component_type in self.boundary_types], dtype=np.int64)
+
+        n_links = len(links)
+        #Variables: link flows, storages, deliveries, boundary flows
+        offsets = np.cumsum([0, n_links, len(storage), len(demand), len(boundary)])
+        n_vars = offsets[-1]
+
+        #One row per node. Each link appears as an inflow to its end node
+        #(scaled by flowmult) and an outflow from its start node.
+        rows = np.concatenate([end, start, storage, demand, boundary])
+        cols = np.concatenate([np.arange(n_links), np.arange(n_links),
+                               offsets[1] + np.arange(len(storage)),
+                               offsets[2] + np.arange(len(demand)),
+                               offsets[3] + np.arange(len(boundary))])
+        data = np.concatenate([np.ones(n_links), -np.ones(n_links),
+                               -np.ones(len(storage)), -np.ones(len(demand)),
+                               -np.ones(len(boundary))])
+
+        order = np.lexsort((cols, rows))
+        position = np.empty_like(order)
+        position[order] = np.arange(len(order))
+        indptr = np.concatenate([[0], np.cumsum(np.bincount(rows, minlength=len(nodes)))])
+
+        A_eq = scipy.sparse.csr_matrix((data[order], cols[order], indptr),
+                                       shape=(len(nodes), n_vars))
+
+        return {
+            'nodes': nodes,
+            'links': links,
+            'storage_nodes': [nodes[i] for i in storage],
+            'demand_nodes': [nodes[i] for i in demand],
+            'boundary_nodes': [nodes[i] for i in boundary],
+            'storage': storage,
+            'offsets': offsets,
+            'A_eq': A_eq,
+            #Where the flow multipliers of the links are in A_eq.data
+            'flowmult_positions': position[:n_links],
+            'b_eq': np.zeros(len(nodes)),
+            'c': np.zeros(n_vars),
+            'bounds': np.zeros((n_vars, 2)),
+        }
+
+    def update_model(self, model):
+        import numpy as np
+        from pynsim.arrays import get_values
+
+        p = self.property_names
+        links = model['links']
+        offsets = model['offsets']
+        c = model['c']
+        bounds = model['bounds']
+
+        model['A_eq'].data[model['flowmult_positions']] = \
+            get_values(links, p['flowmult'], default=1.0)
+
+        #Links
+        c[:offsets[1]] = get_values(links, p['cost'])
+        bounds[:offsets[1], 0] = get_values(links, p['min_flow'])
+        bounds[:offsets[1], 1] = get_values(links, p['max_flow'], default=np.inf)
+
+        #Storage nodes
+        storage_nodes = model['storage_nodes']
+        previous = np.array([n._history[p['storage']][-1]
+                             if len(n._history.get(p['storage'], [])) > 0
+                             else getattr(n, p['init_stor'])
+                             for n in storage_nodes], dtype=float)
+        c[offsets[1]:offsets[2]] = get_values(storage_nodes, p['carryover_penalty'])
+        bounds[offsets[1]:offsets[2], 0] = get_values(storage_nodes, p['min_stor'])
+        bounds[offsets[1]:offsets[2], 1] = get_values(storage_nodes, p['max_stor'], default=np.inf)
+
+        #Demand nodes
+        demand_nodes = model['demand_nodes']
+        c[offsets[2]:offsets[3]] = -get_values(demand_nodes, p['priority'])
+        bounds[offsets[2]:offsets[3], 0] = 0
+        bounds[offsets[2]:offsets[3], 1] = get_values(demand_nodes, p['demand'])
+
+        #Boundary nodes
+        c[offsets[3]:] = 0
+        bounds[offsets[3]:, 0] = -np.inf
+        bounds[offsets[3]:, 1] = np.inf
+
+        #Mass balance: inflows - outflows - storage - delivery - boundary outflow
+        #              = -(external inflow) - (previous storage)
+        b_eq = model['b_eq']
+        b_eq[:] = -get_values(model['nodes'], p['inflow'])
+        b_eq[model['storage']] -= previous
+
+    def solve(self, model, warm_start=None):
+        #HiGHS, as exposed by scipy, has no warm start, so warm_start is unused.
+        from scipy.optimize import linprog
+
+        result = linprog(model['c'], A_eq=model['A_eq'], b_eq=model['b_eq'],
+                         bounds=model['bounds'], method='highs')
+
+        if result.status != 0:
+            raise Exception("Unable to solve the allocation problem at timestep %s: %s"
+                            % (self.timestep, result.message))
+
+        self.objective = result.fun
+        return result.x
+
+    def extract_results(self, model, solution):
+        from pynsim.arrays import set_values
+
+        p = self.property_names
+        offsets = model['offsets']
+
+        set_values(model['links'], p['flow'], solution[:offsets[1]])
+        set_values(model['storage_nodes'], p['storage'], solution[offsets[1]:offsets[2]])
+        set_values(model['demand_nodes'], p['delivery'], solution[offsets[2]:offsets[3]])
+        set_values(model['boundary_nodes'], p['boundary_flow'], solution[offsets[3]:])
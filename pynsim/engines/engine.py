@@ -15,9 +15,41 @@
 #    You should have received a copy of the GNU General Public License
 #    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
 
+import functools
+
+
+def memoize(method):
+    """
+        Decorate an engine method which derives a structure from the topology
+        of the engine's target (index maps, connectivity...), so that it is
+        only called again when nodes, links or institutions are added:
+
+            @memoize
+            def node_types(self):
+                ...
+
+        The method must only take hashable arguments, if any.
+    """
+    @functools.wraps(method)
+    def memoized_method(self, *args):
+        return self.memoized((method.__name__,) + args, lambda: method(self, *args))
+    return memoized_method
+
+
 class Engine(object):
     name   = "A generic pynsim engine"
     target = None
+    #A numpy Generator for this engine, set by the simulator when seeded.
+    rng    = None
+    #The number of times a memoized structure was reused or (re)built.
+    cache_hits   = 0
+    cache_misses = 0
+    #Attributes which the simulator sets, or the engine builds, during a
+    #run, and which pynsim.cache.ResultCache leaves out of its key. Every
+    #other attribute is configuration. A subclass lists its own, which are
+    #added to those of the classes it derives from.
+    cache_exclude = ('target', 'timestep', 'timestep_idx', 'iteration', 'rng',
+                     'cache_hits', 'cache_misses', '_memo')
 
     def __init__(self, target):
         self.target = target 
@@ -25,6 +57,33 @@ class Engine(object):
         #indicates numerically the current timestep
         self.timestep_idx = None
         self.iteration = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._memo = {}
+
+    def memoized(self, key, build):
+        """
+            Return the structure stored under key, calling build() to create
+            it if there is none, or if the topology of the target has changed
+            since it was built.
+        """
+        memo = self.__dict__.setdefault('_memo', {})
+        version = (id(self.target), getattr(self.target, 'topology_version', None))
+        entry = memo.get(key)
+        if entry is not None and entry[0] == version:
+            self.cache_hits += 1
+            return entry[1]
+
+        self.cache_misses += 1
+        value = build()
+        memo[key] = (version, value)
+        return value
+
+    def clear_memo(self):
+        """
+            Discard all memoized structures.
+        """
+        self._memo = {}
     
     def run(self):
         pass
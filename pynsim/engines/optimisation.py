@@ -0,0 +1,121 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import time
+
+from .engine import Engine
+
+
+class OptimisationEngine(Engine):
+    """
+        A base class for engines which solve an optimisation model at each
+        timestep, such as a priority based allocation model.
+
+        The structure of the model (sets, variables, constraints) is built
+        once, by build_model, when the engine is initialised. At each timestep
+        only the parameters which change (storages, demands, inflows...) are
+        updated by update_model before the model is solved, and the solution
+        of the previous timestep is passed to the solver as a warm start.
+
+        Subclasses implement:
+            build_model()                   -> model
+            update_model(model)
+            solve(model, warm_start)        -> solution
+            extract_results(model, solution)
+
+        The model is rebuilt automatically if nodes, links or institutions
+        are added to the network (see Container.topology_version). Call
+        rebuild() after any other change which affects its structure.
+    """
+    name = "A generic pynsim optimisation engine"
+    cache_exclude = ('model', 'solution', 'build_count', 'timing', '_model_version')
+
+    def __init__(self, target, warm_start=True):
+        super(OptimisationEngine, self).__init__(target)
+        self.warm_start = warm_start
+        self.model = None
+        #The solution of the previous timestep
+        self.solution = None
+        self.build_count = 0
+        #The topology version of the target when the model was built
+        self._model_version = None
+        #Cumulative time (in seconds) spent in each stage
+        self.timing = {'build': 0, 'update': 0, 'solve': 0, 'extract': 0}
+
+    def initialise(self):
+        self._build()
+
+    def _build(self):
+        logging.debug("Building model for engine %s", self.name)
+        t = time.perf_counter()
+        self._model_version = getattr(self.target, 'topology_version', None)
+        self.model = self.build_model()
+        self.timing['build'] += time.perf_counter() - t
+        self.build_count += 1
+        self.solution = None
+
+    def rebuild(self):
+        """
+            Discard the model, so it is rebuilt before the next timestep.
+        """
+        self.model = None
+
+    def run(self):
+        if self.model is None or \
+           self._model_version != getattr(self.target, 'topology_version', None):
+            self._build()
+
+        t = time.perf_counter()
+        self.update_model(self.model)
+        self.timing['update'] += time.perf_counter() - t
+
+        t = time.perf_counter()
+        warm_start = self.solution if self.warm_start is True else None
+        self.solution = self.solve(self.model, warm_start)
+        self.timing['solve'] += time.perf_counter() - t
+
+        t = time.perf_counter()
+        self.extract_results(self.model, self.solution)
+        self.timing['extract'] += time.perf_counter() - t
+
+    def build_model(self):
+        """
+            Build and return the model. This is called once, when the engine
+            is initialised.
+        """
+        raise NotImplementedError("Optimisation engines must implement build_model")
+
+    def update_model(self, model):
+        """
+            Update the parameters of the model for the current timestep.
+        """
+        raise NotImplementedError("Optimisation engines must implement update_model")
+
+    def solve(self, model, warm_start=None):
+        """
+            Solve the model and return the solution. warm_start is the
+            solution of the previous timestep (None on the first timestep,
+            or if warm starting is disabled).
+        """
+        raise NotImplementedError("Optimisation engines must implement solve")
+
+    def extract_results(self, model, solution):
+        """
+            Set the results of the solution on the components of the network.
+        """
+        pass
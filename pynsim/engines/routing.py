@@ -0,0 +1,299 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+
+from .engine import Engine, memoize
+
+
+class RoutingEngine(Engine):
+    """
+        Routes flow downstream through a network, from the head nodes to the
+        outlets, in one sweep per timestep.
+
+        Each node has a local 'inflow' (a rate) and passes everything it
+        receives on as its 'outflow', divided between its downstream links
+        in proportion to their 'split' (equal shares if not set). Nodes whose
+        type is in storage_types store water (S) instead:
+
+            S = previous S + (inflow - release) * timestep length
+
+        The release is the node's 'target_release' (or its inflow, if not
+        set), adjusted so that S stays between min_stor and max_stor. The
+        release is never negative, so S can fall below min_stor if there is
+        not enough water. The previous S is the last value in the node's
+        history, or init_stor on the first timestep. The timestep length is
+        the network's 'timestep' property (1 if not set).
+
+        Links pass on the flow entering them ('flow') immediately, unless
+        routing is:
+
+            'lag': Flow leaves the link ('outflow') 'lag' timesteps after it
+                   entered. The lag of each link is read when the engine is
+                   initialised.
+            'muskingum': The outflow is attenuated by the Muskingum method,
+                         with the link's 'muskingum_k' (in the units of the
+                         timestep length) and 'muskingum_x'.
+
+        Links start in a steady state, with the outflow equal to the flow
+        entering them on the first timestep.
+
+        The nodes are grouped into topological levels, so that every node is
+        computed after all the nodes upstream of it. The levels are only
+        computed again if the topology of the network changes. Each level is
+        computed with array operations, so the cost of a timestep is linear
+        in the size of the network. The properties of all the components are
+        read and written in bulk. The names of the properties can be changed
+        with property_names.
+    """
+    name = "Vectorised flow routing engine"
+    cache_exclude = ('_state',)
+
+    property_names = {
+        'inflow': 'inflow',
+        'outflow': 'outflow',
+        'storage': 'S',
+        'init_stor': 'init_stor',
+        'min_stor': 'min_stor',
+        'max_stor': 'max_stor',
+        'target_release': 'target_release',
+        'release': 'actual_release',
+        'split': 'split',
+        'flow': 'flow',
+        'link_outflow': 'outflow',
+        'lag': 'lag',
+        'muskingum_k': 'muskingum_k',
+        'muskingum_x': 'muskingum_x',
+        'timestep_length': 'timestep',
+    }
+
+    def __init__(self, target, storage_types=None, routing=None, property_names=None):
+        super(RoutingEngine, self).__init__(target)
+        if routing not in (None, 'lag', 'muskingum'):
+            raise Exception("Unknown routing %s. Use None, 'lag' or 'muskingum'." % routing)
+        self.storage_types = set(storage_types or [])
+        self.routing = routing
+        self.property_names = dict(RoutingEngine.property_names)
+        self.property_names.update(property_names or {})
+        self._state = None
+
+    def initialise(self):
+        self._state = None
+        self.structure()
+
+    @memoize
+    def structure(self):
+        """
+            The topological levels of the network, and the positions of the
+            nodes and links in each, as arrays.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            logging.critical("The routing engine requires numpy. "
+                             "Please ensure it is installed.")
+            raise
+        from pynsim.arrays import get_values
+        from pynsim.topology import topological_levels
+
+        logging.debug("Building routing structure for %s", self.target.name)
+
+        network = self.target
+        nodes = network.nodes
+        links = network.links
+        node_index = dict((id(n), i) for i, n in enumerate(nodes))
+
+        arrays = network.incidence()
+        start = arrays['start']
+        end = arrays['end']
+
+        node_level = np.empty(len(nodes), dtype=np.int64)
+        levels = topological_levels(network)
+        for i, level in enumerate(levels):
+            node_level[[node_index[id(n)] for n in level]] = i
+
+        storage = np.array([i for i, n in enumerate(nodes)
+                            if n.component_type in self.storage_types], dtype=np.int64)
+        #Position of each node in the storage arrays (-1 if not a storage)
+        storage_position = -np.ones(len(nodes), dtype=np.int64)
+        storage_position[storage] = np.arange(len(storage))
+
+        def group(positions, keys):
+            #Split positions into one array per level, by key
+            order = np.argsort(keys, kind='stable')
+            bounds = np.searchsorted(keys[order], np.arange(len(levels) + 1))
+            return [positions[order[bounds[i]:bounds[i + 1]]] for i in range(len(levels))]
+
+        node_positions = np.arange(len(nodes))
+        link_positions = np.arange(len(links))
+        storage_levels = group(storage, node_level[storage])
+
+        structure = {
+            'nodes': nodes,
+            'links': links,
+            'storage_nodes': [nodes[i] for i in storage],
+            'start': start,
+            'end': end,
+            'storage': storage,
+            'n_out': arrays['out_degree'],
+            'level_nodes': group(node_positions, node_level),
+            'level_storage': storage_levels,
+            'level_storage_positions': [storage_position[s] for s in storage_levels],
+            #Links into the nodes of each level and out of them
+            'level_in_links': group(link_positions, node_level[end]),
+            'level_out_links': group(link_positions, node_level[start]),
+        }
+
+        if self.routing == 'lag':
+            lag = get_values(links, self.property_names['lag'], dtype=np.int64)
+            if (lag < 0).any():
+                raise Exception("Link lags must not be negative.")
+            structure['lag'] = lag
+
+        return structure
+
+    def run(self):
+        import numpy as np
+        from pynsim.arrays import get_values, set_values
+
+        p = self.property_names
+        structure = self.structure()
+        nodes = structure['nodes']
+        links = structure['links']
+        storage_nodes = structure['storage_nodes']
+        start = structure['start']
+        end = structure['end']
+
+        dt = getattr(self.target, p['timestep_length'], None)
+        dt = 1.0 if dt is None else float(dt)
+
+        node_in = get_values(nodes, p['inflow'])
+        node_out = np.zeros(len(nodes))
+        link_in = np.zeros(len(links))
+        link_out = np.zeros(len(links))
+
+        split = get_values(links, p['split'], default=np.nan)
+        default_split = np.isnan(split)
+        split[default_split] = 1.0 / structure['n_out'][start[default_split]]
+
+        previous = np.array([n._history[p['storage']][-1]
+                             if len(n._history.get(p['storage'], [])) > 0
+                             else getattr(n, p['init_stor'])
+                             for n in storage_nodes], dtype=float)
+        target_release = get_values(storage_nodes, p['target_release'], default=np.nan)
+        min_stor = get_values(storage_nodes, p['min_stor'], default=-np.inf)
+        max_stor = get_values(storage_nodes, p['max_stor'], default=np.inf)
+        storage = np.zeros(len(storage_nodes))
+        release = np.zeros(len(storage_nodes))
+
+        state = self._step_state(structure)
+        if self.routing == 'muskingum':
+            k = get_values(links, p['muskingum_k'])
+            x = get_values(links, p['muskingum_x'])
+            denominator = 2 * k * (1 - x) + dt
+            state['coefficients'] = ((dt - 2 * k * x) / denominator,
+                                     (dt + 2 * k * x) / denominator,
+                                     (2 * k * (1 - x) - dt) / denominator)
+
+        for level_nodes, level_storage, storage_positions, in_links, out_links in zip(
+                structure['level_nodes'], structure['level_storage'],
+                structure['level_storage_positions'],
+                structure['level_in_links'], structure['level_out_links']):
+
+            np.add.at(node_in, end[in_links], link_out[in_links])
+            node_out[level_nodes] = node_in[level_nodes]
+
+            if len(level_storage) > 0:
+                s = storage_positions
+                inflow = node_in[level_storage]
+                wanted = np.where(np.isnan(target_release[s]), inflow, target_release[s])
+                stored = np.clip(previous[s] + (inflow - wanted) * dt, min_stor[s], max_stor[s])
+                released = np.maximum(inflow - (stored - previous[s]) / dt, 0)
+                storage[s] = previous[s] + (inflow - released) * dt
+                release[s] = released
+                node_out[level_storage] = released
+
+            if len(out_links) > 0:
+                link_in[out_links] = node_out[start[out_links]] * split[out_links]
+                link_out[out_links] = self._route(state, out_links, link_in[out_links])
+
+        self._state['pending'] = {'in': link_in, 'out': link_out,
+                                  'buffer': state.get('buffer'),
+                                  'position': state['position']}
+
+        set_values(nodes, p['outflow'], node_out)
+        set_values(storage_nodes, p['storage'], storage)
+        set_values(storage_nodes, p['release'], release)
+        set_values(links, p['flow'], link_in)
+        if self.routing is not None:
+            set_values(links, p['link_outflow'], link_out)
+
+    def _step_state(self, structure):
+        """
+            Return the state of the links at the end of the previous
+            timestep. If the engine is run several times in a timestep, each
+            run starts from the same state. The links start again from a
+            steady state if the topology of the network has changed.
+        """
+        if self._state is None or self._state['structure'] is not structure:
+            self._state = {'timestep_idx': self.timestep_idx, 'current': {},
+                           'pending': None, 'structure': structure}
+        elif self._state['timestep_idx'] != self.timestep_idx:
+            self._state = {'timestep_idx': self.timestep_idx,
+                           'current': self._state['pending'], 'pending': None,
+                           'structure': structure}
+
+        current = self._state['current'] or {}
+        state = {'first': len(current) == 0,
+                 'in': current.get('in'),
+                 'out': current.get('out'),
+                 #The number of timesteps since the start
+                 'position': current.get('position', -1) + 1}
+        if self.routing == 'lag':
+            #The buffer is copied, so a repeated run does not see its own writes.
+            buffer = current.get('buffer')
+            state['buffer'] = None if buffer is None else buffer.copy()
+        state['structure'] = structure
+        return state
+
+    def _route(self, state, links, inflow):
+        """
+            Return the outflow of some links given the flow entering them.
+        """
+        import numpy as np
+
+        if self.routing is None:
+            return inflow
+
+        if self.routing == 'lag':
+            structure = state['structure']
+            lag = structure['lag'][links]
+            buffer = state['buffer']
+            if buffer is None:
+                buffer = np.zeros((len(structure['links']), structure['lag'].max() + 1))
+                state['buffer'] = buffer
+            size = buffer.shape[1]
+            if state['first']:
+                buffer[links, :] = inflow[:, np.newaxis]
+            buffer[links, state['position'] % size] = inflow
+            return buffer[links, (state['position'] - lag) % size]
+
+        #Muskingum
+        if state['first']:
+            return inflow
+        c0, c1, c2 = state['coefficients']
+        return c0[links] * inflow + c1[links] * state['in'][links] + c2[links] * state['out'][links]
@@ -0,0 +1,267 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+import logging
+import multiprocessing
+import os
+import traceback
+
+from .engine import Engine, memoize
+
+
+class Upstream(object):
+    """
+        The nodes directly upstream of each node of a network, by position
+        in network.nodes, in compressed sparse row form: the upstream nodes
+        of node i are indices[indptr[i]:indptr[i + 1]].
+    """
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    def of(self, position):
+        """
+            The positions of the nodes upstream of a node.
+        """
+        return self.indices[self.indptr[position]:self.indptr[position + 1]]
+
+    def sum(self, values, positions):
+        """
+            For each of the given node positions, the sum of values over the
+            nodes upstream of it.
+        """
+        import numpy as np
+
+        starts = self.indptr[positions]
+        counts = self.indptr[positions + 1] - starts
+        #The positions in indices of the upstream nodes of every node, in turn
+        offsets = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+        return np.bincount(np.repeat(np.arange(len(positions)), counts),
+                           weights=values[self.indices[offsets]],
+                           minlength=len(positions))
+
+
+def _run_worker(engine, worker, conn):
+    """
+        Compute this worker's share of each level the parent asks for, until
+        it sends None.
+    """
+    try:
+        while True:
+            level = conn.recv()
+            if level is None:
+                break
+            try:
+                positions = engine._chunks[level][worker]
+                engine.kernel(positions, engine._arrays, engine._upstream)
+                conn.send(None)
+            except Exception:
+                conn.send(traceback.format_exc())
+    finally:
+        conn.close()
+
+
+class WavefrontEngine(Engine):
+    """
+        Runs a node kernel over a network level by level, from the head nodes
+        downstream. Nodes in the same topological level do not depend on each
+        other, so each level is split between a pool of worker processes,
+        which work on the node properties in shared memory. A level only
+        starts once every node upstream of it has been computed.
+
+        The kernel is a function which computes some of the nodes:
+
+            def kernel(positions, arrays, upstream):
+                inflow = arrays['inflow'][positions] + \\
+                    upstream.sum(arrays['outflow'], positions)
+                arrays['outflow'][positions] = inflow * 0.9
+
+        positions is an array of node positions (in network.nodes), arrays a
+        dict of arrays with one value per node for each of the input and
+        output properties, and upstream an Upstream. A kernel must only write
+        to the nodes it has been given.
+
+        At each timestep the inputs are read from the nodes, the levels are
+        computed and the outputs are set on the nodes.
+
+        args:
+            kernel function: The node kernel.
+            inputs list: The node properties which the kernel reads.
+            outputs list: The node properties which the kernel sets.
+            workers int: The number of worker processes. Defaults to the
+                         number of CPUs. With 0 or 1 the kernel runs in this
+                         process.
+            min_parallel int: Levels with fewer nodes than this are computed
+                              in this process, as it would not be worth
+                              splitting them.
+    """
+    name = "Wavefront parallel node engine"
+    cache_exclude = ('_shared_memory', '_arrays', '_upstream', '_chunks', '_processes',
+                     '_connections', '_version')
+
+    def __init__(self, target, kernel, inputs, outputs, workers=None, min_parallel=256):
+        super(WavefrontEngine, self).__init__(target)
+        self.kernel = kernel
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        if workers is None:
+            workers = os.cpu_count() or 1
+        self.workers = workers
+        self.min_parallel = min_parallel
+
+        self._shared_memory = None
+        self._arrays = None
+        self._upstream = None
+        self._chunks = None
+        self._processes = []
+        self._connections = []
+        self._version = None
+
+    def initialise(self):
+        self._start()
+
+    @memoize
+    def structure(self):
+        """
+            The topological levels of the network (as arrays of node
+            positions) and its upstream nodes.
+        """
+        try:
+            import numpy as np
+        except ImportError:
+            logging.critical("The wavefront engine requires numpy. "
+                             "Please ensure it is installed.")
+            raise
+        from pynsim.topology import topological_levels
+
+        network = self.target
+        node_index = dict((id(n), i) for i, n in enumerate(network.nodes))
+        levels = [np.array([node_index[id(n)] for n in level], dtype=np.int64)
+                  for level in topological_levels(network)]
+
+        arrays = network.incidence()
+        order = np.argsort(arrays['end'], kind='stable')
+        indptr = np.concatenate([[0], np.cumsum(arrays['in_degree'])])
+        upstream = Upstream(indptr, arrays['start'][order])
+
+        return {'levels': levels, 'upstream': upstream}
+
+    def _start(self):
+        """
+            Allocate the shared arrays and start the workers.
+        """
+        import numpy as np
+        from multiprocessing import shared_memory
+
+        self._stop()
+
+        structure = self.structure()
+        self._version = self.target.topology_version
+        self._upstream = structure['upstream']
+
+        names = []
+        for name in self.inputs + self.outputs:
+            if name not in names:
+                names.append(name)
+        n_nodes = len(self.target.nodes)
+
+        self._shared_memory = shared_memory.SharedMemory(create=True,
+                                                         size=max(len(names) * n_nodes * 8, 1))
+        block = np.ndarray((len(names), n_nodes), dtype=np.float64, buffer=self._shared_memory.buf)
+        block[:] = 0
+        self._arrays = dict((name, block[i]) for i, name in enumerate(names))
+
+        n_workers = self.workers if self.workers > 1 else 0
+        self._chunks = [np.array_split(level, n_workers) if n_workers and len(level) >= self.min_parallel
+                        else None for level in structure['levels']]
+
+        if n_workers == 0:
+            return
+
+        try:
+            context = multiprocessing.get_context('fork')
+        except ValueError:
+            logging.warning("Worker processes need to be able to fork. "
+                            "Running the wavefront engine in one process.")
+            self._chunks = [None] * len(structure['levels'])
+            return
+
+        #The workers are forked, so they share the arrays and the kernel.
+        for worker in range(n_workers):
+            parent_conn, child_conn = context.Pipe()
+            process = context.Process(target=_run_worker, args=(self, worker, child_conn))
+            process.daemon = True
+            process.start()
+            child_conn.close()
+            self._processes.append(process)
+            self._connections.append(parent_conn)
+
+    def _stop(self):
+        for conn in self._connections:
+            try:
+                conn.send(None)
+            except (OSError, EOFError):
+                pass
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        for conn in self._connections:
+            conn.close()
+        self._processes = []
+        self._connections = []
+
+        if self._shared_memory is not None:
+            self._arrays = None
+            self._shared_memory.close()
+            self._shared_memory.unlink()
+            self._shared_memory = None
+
+    def run(self):
+        from pynsim.arrays import get_values, set_values
+
+        if self._shared_memory is None or self._version != self.target.topology_version:
+            self._start()
+
+        nodes = self.target.nodes
+        for name in self.inputs:
+            self._arrays[name][:] = get_values(nodes, name)
+
+        for i, level in enumerate(self.structure()['levels']):
+            if self._chunks[i] is None:
+                self.kernel(level, self._arrays, self._upstream)
+                continue
+
+            for conn in self._connections:
+                conn.send(i)
+            errors = [e for e in [conn.recv() for conn in self._connections] if e is not None]
+            if errors:
+                raise Exception("Error computing level %s of %s:\n%s"
+                                % (i, self.target.name, errors[0]))
+
+        for name in self.outputs:
+            set_values(nodes, name, self._arrays[name])
+
+    def teardown(self):
+        self._stop()
+
+    def __del__(self):
+        try:
+            self._stop()
+        except Exception:
+            pass
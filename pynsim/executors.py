@@ -0,0 +1,408 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Executors for running the members of an ensemble, on this machine or
+    on other hosts.
+
+    An ensemble is defined by a function which builds a simulator for a
+    member, for example a set of parameters or a scenario name. Each member
+    is simulated by an executor and its output is the network history, as
+    collected by Network.collect_history, which is the same wherever it ran:
+
+        def build(member):
+            ...
+            return simulator
+
+        with WorkQueueExecutor('/shared/queue', workers=4) as executor:
+            for member, history in run_ensemble(build, members, executor):
+                ...
+
+    The WorkQueueExecutor uses a directory as a work queue. Workers on other
+    hosts which share the directory can be started with:
+
+        python -m pynsim.executors /shared/queue
+"""
+
+import argparse
+import functools
+import logging
+import multiprocessing
+import os
+import pickle
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import traceback
+import uuid
+
+
+class Executor(object):
+    """
+        Runs a function over a list of items. Subclasses decide where.
+    """
+
+    def map(self, function, items, chunksize=1):
+        """
+            Call function(item) for each item.
+
+            :returns A generator of (index, result) tuples, in the order
+                     in which the results become available.
+        """
+        raise NotImplementedError()
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
+
+
+class SerialExecutor(Executor):
+    """
+        Runs each item in turn, in this process.
+    """
+
+    def map(self, function, items, chunksize=1):
+        for index, item in enumerate(items):
+            yield index, function(item)
+
+
+class TaskError(Exception):
+    """
+        Raised when a task fails on a worker.
+    """
+    pass
+
+
+def _write_atomic(path, obj):
+    """
+        Pickle an object to a file so that readers never see it half written.
+    """
+    tmp_path = path + '.%s.tmp' % uuid.uuid4().hex
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+
+def _queue_dirs(queue_dir):
+    dirs = {}
+    for name in ('pending', 'claimed', 'results', 'workers'):
+        dirs[name] = os.path.join(queue_dir, name)
+        if not os.path.exists(dirs[name]):
+            os.makedirs(dirs[name])
+    return dirs
+
+
+def run_worker(queue_dir, worker_id=None, poll_interval=0.05,
+               heartbeat_interval=1.0, idle_timeout=None):
+    """
+        Take tasks from a work queue directory and run them, until a 'stop'
+        file appears in the directory (or there has been no work for
+        idle_timeout seconds).
+
+        A task is claimed by moving it into a directory belonging to this
+        worker, which is atomic on a shared file system. The result of each
+        item is written as soon as it is available. A heartbeat file is
+        touched regularly, so that the coordinator can tell if the worker
+        has died and hand its tasks to another worker.
+    """
+    if worker_id is None:
+        worker_id = "%s-%s-%s" % (socket.gethostname(), os.getpid(), uuid.uuid4().hex[:6])
+
+    dirs = _queue_dirs(queue_dir)
+    claimed_dir = os.path.join(dirs['claimed'], worker_id)
+    heartbeat = os.path.join(dirs['workers'], worker_id)
+    #The first heartbeat comes before any claim, so that the coordinator
+    #never sees a claim without one
+    with open(heartbeat, 'a'):
+        os.utime(heartbeat, None)
+    os.makedirs(claimed_dir)
+    stopping = threading.Event()
+
+    def beat():
+        while not stopping.is_set():
+            with open(heartbeat, 'a'):
+                os.utime(heartbeat, None)
+            stopping.wait(heartbeat_interval)
+
+    beat_thread = threading.Thread(target=beat)
+    beat_thread.daemon = True
+    beat_thread.start()
+
+    logging.debug("Worker %s started on %s", worker_id, queue_dir)
+    idle_since = time.time()
+    try:
+        while not os.path.exists(os.path.join(queue_dir, 'stop')):
+            task_path = None
+            for filename in sorted(os.listdir(dirs['pending'])):
+                if not filename.endswith('.task'):
+                    continue
+                try:
+                    task_path = os.path.join(claimed_dir, filename)
+                    os.rename(os.path.join(dirs['pending'], filename), task_path)
+                    break
+                except OSError:
+                    #Another worker got there first
+                    task_path = None
+
+            if task_path is None:
+                if idle_timeout is not None and time.time() - idle_since > idle_timeout:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            task = _read(task_path)
+            for index, item in task['items']:
+                try:
+                    result = ('ok', task['function'](item))
+                except Exception as e:
+                    result = ('error', "%s\n%s" % (e, traceback.format_exc()))
+                _write_atomic(os.path.join(dirs['results'], "%s_%s.result" % (task['job'], index)),
+                              result)
+            os.remove(task_path)
+            idle_since = time.time()
+    finally:
+        stopping.set()
+        shutil.rmtree(claimed_dir, ignore_errors=True)
+        if os.path.exists(heartbeat):
+            os.remove(heartbeat)
+
+
+class WorkQueueExecutor(Executor):
+    """
+        Runs items on worker processes which take their work from a queue
+        directory. Workers can be started on this machine (see start_workers)
+        or on any host which shares the directory.
+
+        args:
+            queue_dir string: The queue directory. A temporary directory is
+                              used (and removed on close) if not set.
+            workers int: The number of local workers to start.
+            max_retries int: The number of times a task is retried after the
+                             worker running it has died.
+            heartbeat_timeout float: Seconds after which a worker which has
+                                     not updated its heartbeat is assumed dead.
+    """
+
+    def __init__(self, queue_dir=None, workers=0, max_retries=2,
+                 heartbeat_timeout=30, poll_interval=0.05):
+        self._temporary = queue_dir is None
+        if queue_dir is None:
+            queue_dir = tempfile.mkdtemp(prefix='pynsim_queue_')
+        self.queue_dir = queue_dir
+        self.max_retries = max_retries
+        self.heartbeat_timeout = heartbeat_timeout
+        self.poll_interval = poll_interval
+        self._dirs = _queue_dirs(queue_dir)
+        self._processes = {}
+
+        stop_file = os.path.join(queue_dir, 'stop')
+        if os.path.exists(stop_file):
+            os.remove(stop_file)
+
+        if workers > 0:
+            self.start_workers(workers)
+
+    def __repr__(self):
+        return "WorkQueueExecutor(queue_dir=%s, workers=%s)" % (self.queue_dir, len(self._processes))
+
+    def start_workers(self, n):
+        """
+            Start n worker processes on this machine.
+        """
+        try:
+            context = multiprocessing.get_context('fork')
+        except ValueError:
+            context = multiprocessing.get_context('spawn')
+
+        for _ in range(n):
+            worker_id = "%s-local-%s" % (socket.gethostname(), uuid.uuid4().hex[:6])
+            process = context.Process(target=run_worker,
+                                      args=(self.queue_dir, worker_id, self.poll_interval))
+            process.daemon = True
+            process.start()
+            self._processes[worker_id] = process
+
+    def map(self, function, items, chunksize=1):
+        job = uuid.uuid4().hex
+        items = list(enumerate(items))
+        chunks = {}
+        attempts = {}
+        for start in range(0, len(items), chunksize):
+            name = "%s_%06d.task" % (job, start // chunksize)
+            chunks[name] = {'job': job, 'function': function,
+                            'items': items[start:start + chunksize]}
+            attempts[name] = 0
+            _write_atomic(os.path.join(self._dirs['pending'], name), chunks[name])
+
+        remaining = set(index for index, _ in items)
+        try:
+            while remaining:
+                found = False
+                for filename in os.listdir(self._dirs['results']):
+                    if not (filename.startswith(job) and filename.endswith('.result')):
+                        continue
+                    path = os.path.join(self._dirs['results'], filename)
+                    index = int(filename[len(job) + 1:-len('.result')])
+                    status, result = _read(path)
+                    os.remove(path)
+                    if index not in remaining:
+                        #A duplicate from a retried task
+                        continue
+                    if status == 'error':
+                        raise TaskError("Item %s failed: %s" % (index, result))
+                    remaining.discard(index)
+                    found = True
+                    yield index, result
+
+                if not found:
+                    self._requeue_dead(job, chunks, attempts)
+                    time.sleep(self.poll_interval)
+        finally:
+            self._remove_job(job)
+
+    def _dead_workers(self):
+        """
+            The workers with claimed tasks which have died: local workers
+            whose process has ended, and others whose last heartbeat is
+            older than heartbeat_timeout. A worker without a heartbeat is
+            given heartbeat_timeout from its last claim to write one.
+        """
+        dead = set()
+        now = time.time()
+        for worker_id in os.listdir(self._dirs['claimed']):
+            process = self._processes.get(worker_id)
+            if process is not None:
+                if not process.is_alive():
+                    dead.add(worker_id)
+                continue
+            try:
+                last_seen = os.path.getmtime(os.path.join(self._dirs['workers'], worker_id))
+            except OSError:
+                try:
+                    last_seen = os.path.getmtime(os.path.join(self._dirs['claimed'], worker_id))
+                except OSError:
+                    #The worker has finished
+                    continue
+            if now - last_seen > self.heartbeat_timeout:
+                dead.add(worker_id)
+        return dead
+
+    def _requeue_dead(self, job, chunks, attempts):
+        """
+            Return the tasks of dead workers to the queue, and replace any
+            local workers which have died.
+        """
+        for worker_id in self._dead_workers():
+            worker_dir = os.path.join(self._dirs['claimed'], worker_id)
+            for filename in os.listdir(worker_dir):
+                if filename in chunks:
+                    attempts[filename] += 1
+                    if attempts[filename] > self.max_retries:
+                        raise TaskError("Task %s failed %s times: its workers died."
+                                        % (filename, attempts[filename]))
+                    logging.warning("Worker %s died. Retrying task %s", worker_id, filename)
+                    os.rename(os.path.join(worker_dir, filename),
+                              os.path.join(self._dirs['pending'], filename))
+            if not os.listdir(worker_dir):
+                shutil.rmtree(worker_dir, ignore_errors=True)
+
+            if worker_id in self._processes:
+                self._processes.pop(worker_id).join()
+                self.start_workers(1)
+
+    def _remove_job(self, job):
+        for d in ('pending', 'results'):
+            for filename in os.listdir(self._dirs[d]):
+                if filename.startswith(job):
+                    try:
+                        os.remove(os.path.join(self._dirs[d], filename))
+                    except OSError:
+                        pass
+
+    def close(self):
+        """
+            Stop the local workers (and any other workers using the queue).
+        """
+        with open(os.path.join(self.queue_dir, 'stop'), 'w'):
+            pass
+        for process in self._processes.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._processes = {}
+        if self._temporary:
+            shutil.rmtree(self.queue_dir, ignore_errors=True)
+
+
+def simulate_member(build, member, complete=True):
+    """
+        Build and run the simulator for one ensemble member, returning the
+        network's history.
+    """
+    simulator = build(member)
+    simulator.start()
+    return simulator.network.collect_history(complete=complete)
+
+
+def run_ensemble(build, members, executor=None, chunksize=1, complete=True):
+    """
+        Simulate each member of an ensemble.
+
+        args:
+            build function: Takes a member and returns a Simulator ready to
+                            start. It must be importable by the workers.
+            members list: The members of the ensemble.
+            executor Executor: Where to run the members. Defaults to a
+                               SerialExecutor.
+            chunksize int: The number of members sent to a worker at once.
+            complete bool: See Network.collect_history
+
+        :returns A generator of (member, history) tuples, in the order in
+                 which they finish.
+    """
+    if executor is None:
+        executor = SerialExecutor()
+    members = list(members)
+    function = functools.partial(simulate_member, build, complete=complete)
+    for index, history in executor.map(function, members, chunksize=chunksize):
+        yield members[index], history
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a pynsim work queue worker.")
+    parser.add_argument('queue_dir', help="The work queue directory")
+    parser.add_argument('--idle-timeout', type=float, default=None,
+                        help="Exit after this many seconds without work")
+    args = parser.parse_args(argv)
+    run_worker(args.queue_dir, idle_timeout=args.idle_timeout)
+
+
+if __name__ == '__main__':
+    main()
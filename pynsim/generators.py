@@ -0,0 +1,371 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Synthetic networks, of any size, for benchmarks and stress tests:
+
+        network = river_network(100000, seed=1)
+        authorities = overlapping_institutions(network, 50, 0.1, seed=1)
+
+        s = Simulator(network)
+        s.set_timesteps(range(365))
+
+    The same seed always gives the same network. The inflows of headwaters
+    and the demands of demand nodes and fields come from synthetic time
+    series, which their setup functions read at each timestep. The series
+    are shared between components, so that they take little memory however
+    big the network.
+"""
+
+import gc
+import math
+import random
+from contextlib import contextmanager
+
+from pynsim.components.component import Network, Node, Link, Institution
+
+
+@contextmanager
+def _paused_gc():
+    """
+        Creating a million components would otherwise set off a garbage
+        collection every few hundred, each slower than the last.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _value(component, series):
+    idx = component.network.current_timestep_idx if component.network is not None else None
+    return series[(idx or 0) % len(series)]
+
+
+class Headwater(Node):
+    """
+        The top of a river, where the water comes in.
+    """
+    _properties = {'inflow': 0.0}
+    inflow_series = (0.0,)
+    scale = 1.0
+
+    def setup(self, timestamp):
+        self.inflow = self.scale * _value(self, self.inflow_series)
+
+
+class Junction(Node):
+    """
+        A point on a river, where tributaries join.
+    """
+    _properties = {'inflow': 0.0, 'outflow': 0.0}
+    pass_through = True
+
+
+class Reservoir(Node):
+    _properties = {'inflow': 0.0, 'storage': 0.0, 'capacity': 0.0, 'release': 0.0}
+
+
+class Demand(Node):
+    """
+        A user which takes water from the river.
+    """
+    _properties = {'demand': 0.0, 'delivered': 0.0}
+    demand_series = (0.0,)
+    scale = 1.0
+
+    def setup(self, timestamp):
+        self.demand = self.scale * _value(self, self.demand_series)
+
+
+class Outlet(Node):
+    _properties = {'inflow': 0.0}
+
+
+class Reach(Link):
+    _properties = {'flow': 0.0}
+
+
+class Diversion(Link):
+    _properties = {'flow': 0.0}
+
+
+class Intake(Headwater):
+    """
+        Where an irrigation scheme takes its water.
+    """
+
+
+class Field(Node):
+    _properties = {'area': 1.0, 'demand': 0.0, 'delivered': 0.0}
+    demand_series = (0.0,)
+
+    def setup(self, timestamp):
+        self.demand = self.area * _value(self, self.demand_series)
+
+
+class Canal(Link):
+    _properties = {'flow': 0.0}
+
+
+class IrrigationDistrict(Institution):
+    _properties = {'allocation': 0.0}
+
+
+class Authority(Institution):
+    _properties = {'budget': 0.0}
+
+
+def synthetic_series(length, mean=1.0, amplitude=0.5, persistence=0.7, noise=0.2,
+                     period=365, phase=0.0, rng=None):
+    """
+        A seasonal series with persistent noise, such as a river's inflow:
+
+            value(t) = mean * (1 + amplitude * sin(2 pi t / period + phase)) * (1 + e(t))
+            e(t) = persistence * e(t - 1) + noise * N(0, 1)
+
+        Values below zero are set to zero.
+
+        args:
+            rng random.Random: The random numbers to use. A new generator
+                               if not given.
+    """
+    if rng is None:
+        rng = random.Random()
+    series = []
+    e = 0.0
+    w = 2 * math.pi / period
+    for t in range(length):
+        e = persistence * e + noise * rng.gauss(0.0, 1.0)
+        value = mean * (1 + amplitude * math.sin(w * t + phase)) * (1 + e)
+        series.append(value if value > 0 else 0.0)
+    return series
+
+
+def _series_pool(count, length, rng, **kwargs):
+    return [synthetic_series(length, phase=rng.uniform(0, 2 * math.pi), rng=rng, **kwargs)
+            for i in range(count)]
+
+
+def _river_tree(n, branching, rng):
+    """
+        The node downstream of each node of a river of n nodes, where node 0
+        is the outlet. A river goes on upstream from its last node until,
+        with probability branching, a tributary starts from a node higher
+        up. No node has more than two nodes upstream.
+    """
+    downstream = [None] * n
+    upstream = [0] * n
+    #The nodes which can take another node upstream
+    open_nodes = [0]
+    last = 0
+    for i in range(1, n):
+        if upstream[last] < 2 and rng.random() >= branching:
+            j = last
+        else:
+            while True:
+                k = rng.randrange(len(open_nodes))
+                j = open_nodes[k]
+                if upstream[j] < 2:
+                    break
+                open_nodes[k] = open_nodes[-1]
+                open_nodes.pop()
+        downstream[i] = j
+        upstream[j] += 1
+        open_nodes.append(i)
+        last = i
+    return downstream, upstream
+
+
+def river_network(n_nodes, seed=None, branching=0.1, reservoir_fraction=0.02,
+                  demand_fraction=0.1, timesteps=365, series_count=32, name=None):
+    """
+        A dendritic river: an Outlet, with Junctions and Reservoirs on the
+        rivers upstream of it, which end at Headwaters. Reaches link each
+        node to the node downstream of it.
+
+        Some of the junctions and reservoirs have a Demand node, which
+        takes water from them through a Diversion link.
+
+        args:
+            n_nodes int: The number of nodes on the river, not counting the
+                         demand nodes.
+            seed: The seed of the random numbers. The same seed gives the
+                  same network.
+            branching float: The probability that the next node starts a
+                             tributary, rather than going on upstream.
+            reservoir_fraction float: The fraction of nodes which are reservoirs.
+            demand_fraction float: The fraction of junctions and reservoirs
+                                   which have a demand node.
+            timesteps int: The length of the inflow and demand series.
+            series_count int: The number of different inflow series, and of
+                              demand series, shared between the headwaters
+                              and between the demand nodes.
+    """
+    if n_nodes < 2:
+        raise Exception("A river needs at least 2 nodes.")
+
+    rng = random.Random(seed)
+    network = Network(name or "Synthetic river (%s nodes, seed %s)" % (n_nodes, seed))
+
+    with _paused_gc():
+        downstream, upstream = _river_tree(n_nodes, branching, rng)
+        inflows = _series_pool(series_count, timesteps, rng)
+        demands = _series_pool(series_count, timesteps, rng, amplitude=0.8, persistence=0.3,
+                               noise=0.1)
+
+        nodes = [Outlet(name="Outlet", x=0.0, y=0.0)]
+        reaches = []
+        demand_nodes = []
+        diversions = []
+        for i in range(1, n_nodes):
+            below = nodes[downstream[i]]
+            #The first river into a node carries on in line with it
+            x = below.x if len(below.in_links) == 0 else below.x + rng.uniform(-1.0, 1.0)
+            y = below.y + 1.0
+            if upstream[i] == 0:
+                node = Headwater(name="Headwater %s" % i, x=x, y=y)
+                node.inflow_series = inflows[rng.randrange(series_count)]
+                node.scale = rng.lognormvariate(0.0, 0.5)
+            elif rng.random() < reservoir_fraction:
+                capacity = rng.uniform(100.0, 1000.0)
+                node = Reservoir(name="Reservoir %s" % i, x=x, y=y,
+                                 capacity=capacity, storage=capacity / 2)
+            else:
+                node = Junction(name="Junction %s" % i, x=x, y=y)
+            nodes.append(node)
+            reaches.append(Reach(name="Reach %s" % i, start_node=node, end_node=below))
+
+            if upstream[i] > 0 and rng.random() < demand_fraction:
+                demand = Demand(name="Demand %s" % i, x=x + 0.5, y=y)
+                demand.demand_series = demands[rng.randrange(series_count)]
+                demand.scale = rng.uniform(0.1, 2.0)
+                demand_nodes.append(demand)
+                diversions.append(Diversion(name="Diversion %s" % i, start_node=node,
+                                            end_node=demand))
+
+        network.add_nodes(*nodes)
+        network.add_nodes(*demand_nodes)
+        network.add_links(*reaches)
+        network.add_links(*diversions)
+
+    return network
+
+
+def irrigation_districts(rows, columns, district_size=10, seed=None, timesteps=365,
+                         series_count=16, name=None):
+    """
+        A grid of rows x columns Fields, fed by an Intake. A main canal runs
+        along the first row, and a lateral canal down each column. The
+        fields are grouped into IrrigationDistricts of district_size x
+        district_size fields, which hold their fields and the canals
+        between them. The fields of a district share a demand series, which
+        they scale by their area.
+    """
+    rng = random.Random(seed)
+    network = Network(name or "Synthetic irrigation scheme (%sx%s, seed %s)" % (rows, columns, seed))
+
+    with _paused_gc():
+        demands = _series_pool(series_count, timesteps, rng, amplitude=0.9, persistence=0.5,
+                               noise=0.1)
+        intake = Intake(name="Intake", x=-1.0, y=0.0)
+        intake.inflow_series = synthetic_series(timesteps, mean=float(rows * columns), rng=rng)
+
+        district_rows = (rows + district_size - 1) // district_size
+        district_columns = (columns + district_size - 1) // district_size
+        districts = [IrrigationDistrict(name="District %s.%s" % (i, j))
+                     for i in range(district_rows) for j in range(district_columns)]
+        district_series = [demands[rng.randrange(series_count)] for d in districts]
+        district_nodes = [[] for d in districts]
+        district_links = [[] for d in districts]
+
+        fields = []
+        canals = []
+        previous_row = None
+        for r in range(rows):
+            row = []
+            for c in range(columns):
+                d = (r // district_size) * district_columns + c // district_size
+                field = Field(name="Field %s.%s" % (r, c), x=float(c), y=float(r),
+                              area=rng.uniform(1.0, 10.0))
+                field.demand_series = district_series[d]
+                district_nodes[d].append(field)
+                if r > 0:
+                    above = previous_row[c]
+                elif c > 0:
+                    above = row[c - 1]
+                else:
+                    above = intake
+                canal = Canal(name="Canal %s.%s" % (r, c), start_node=above, end_node=field)
+                canals.append(canal)
+                if above is not intake and \
+                   (r // district_size, c // district_size) == \
+                   (int(above.y) // district_size, int(above.x) // district_size):
+                    district_links[d].append(canal)
+                row.append(field)
+            fields.extend(row)
+            previous_row = row
+
+        network.add_nodes(intake, *fields)
+        network.add_links(*canals)
+        for district, district_fields, links in zip(districts, district_nodes, district_links):
+            district.add_nodes(*district_fields)
+            district.add_links(*links)
+        network.add_institutions(*districts)
+
+    return network
+
+
+def overlapping_institutions(network, count, size, seed=None, institution_class=Authority,
+                             prefix="Authority"):
+    """
+        Add count institutions to a network, each holding a random sample of
+        its nodes, and the links between them. The samples overlap, so most
+        nodes are in several institutions.
+
+        args:
+            size: The number of nodes in each institution, or if a float
+                  below 1, the fraction of the network's nodes.
+
+        :returns The institutions
+    """
+    rng = random.Random(seed)
+    nodes = network.nodes
+    if isinstance(size, float) and size < 1:
+        size = int(round(size * len(nodes)))
+    size = min(size, len(nodes))
+
+    #The position of each node, to keep the nodes of an institution in
+    #the network's order
+    position = dict((id(n), i) for i, n in enumerate(nodes))
+
+    institutions = []
+    with _paused_gc():
+        for i in range(count):
+            members = sorted(rng.sample(nodes, size), key=lambda n: position[id(n)])
+            member_ids = set(id(n) for n in members)
+            links = [l for n in members for l in n.out_links if id(l.end_node) in member_ids]
+            institution = institution_class(name="%s %s" % (prefix, i))
+            institution.add_nodes(*members)
+            institution.add_links(*links)
+            institutions.append(institution)
+        network.add_institutions(*institutions)
+
+    return institutions
@@ -7,12 +7,12 @@ def load(filename):
         python object
     """
 
-    f = open(filename, 'r')
-   
     if filename.find('.json') > 0:
-        obj = json.load(f)
+        with open(filename, 'r') as f:
+            obj = json.load(f)
     elif filename.find('.pickle') > 0:
-        obj = pickle.load(f)
+        with open(filename, 'rb') as f:
+            obj = pickle.load(f)
 
     return obj
 
@@ -38,11 +38,11 @@ class Map(dict):
         super(Map, self).__init__(*args, **kwargs)
         for arg in args:
             if isinstance(arg, dict):
-                for k, v in arg.iteritems():
+                for k, v in arg.items():
                     self[k] = v
 
         if kwargs:
-            for k, v in kwargs.iteritems():
+            for k, v in kwargs.items():
                 self[k] = v
 
     def __getstate__(self): return self
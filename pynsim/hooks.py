@@ -0,0 +1,137 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Callbacks at points in the simulation loop:
+
+        def check_balance(simulator, idx, timestep):
+            ...
+
+        simulator.add_hook('after_timestep', check_balance)
+
+    The hook points and the arguments their callbacks are called with are:
+
+        before_timestep     (simulator, idx, timestep)
+        before_setup        (simulator, idx, timestep)
+        after_setup         (simulator, idx, timestep)
+        before_engine       (simulator, engine)
+        after_engine        (simulator, engine)
+        after_post_process  (simulator, idx, timestep)
+        after_timestep      (simulator, idx, timestep)
+
+    The engine's iteration, timestep and timestep_idx are set before
+    before_engine is called. The callbacks are bound when the simulation
+    starts, so hooks added during a run apply to the next one. A hook point
+    without callbacks costs the loop one 'is None' check.
+
+    When debug logging is enabled, callbacks which log each step of the
+    loop are added when the hooks are bound.
+"""
+
+import logging
+
+HOOK_POINTS = ('before_timestep', 'before_setup', 'after_setup', 'before_engine',
+               'after_engine', 'after_post_process', 'after_timestep')
+
+
+class BoundHooks(object):
+    """
+        A function (or None) for each hook point, which calls its callbacks
+        in the order they were added.
+    """
+
+    def __init__(self, callbacks):
+        for point in HOOK_POINTS:
+            setattr(self, point, _combine(list(callbacks.get(point, []))))
+
+    def __repr__(self):
+        return "BoundHooks(%s)" % ", ".join(p for p in HOOK_POINTS if getattr(self, p) is not None)
+
+
+def _combine(callbacks):
+    if len(callbacks) == 0:
+        return None
+    if len(callbacks) == 1:
+        return callbacks[0]
+
+    def call_all(*args):
+        for callback in callbacks:
+            callback(*args)
+    return call_all
+
+
+class Hooks(object):
+    """
+        The callbacks registered at each hook point.
+    """
+
+    def __init__(self):
+        self.callbacks = dict((point, []) for point in HOOK_POINTS)
+
+    def __repr__(self):
+        return "Hooks(%s)" % dict((k, len(v)) for k, v in self.callbacks.items() if v)
+
+    def _check(self, point):
+        if point not in self.callbacks:
+            raise Exception("Unknown hook point %s. The hook points are: %s"
+                            % (point, ", ".join(HOOK_POINTS)))
+
+    def add(self, point, callback):
+        """
+            Call callback at a hook point. Returns the callback.
+        """
+        self._check(point)
+        self.callbacks[point].append(callback)
+        return callback
+
+    def remove(self, point, callback):
+        self._check(point)
+        self.callbacks[point].remove(callback)
+
+    def bind(self):
+        """
+            :returns A BoundHooks of the callbacks registered now, and the
+                     debug logging callbacks if debug logging is enabled.
+        """
+        callbacks = self.callbacks
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            callbacks = dict((k, LOGGING_CALLBACKS.get(k, []) + v) for k, v in callbacks.items())
+        return BoundHooks(callbacks)
+
+
+def _log_timestep(simulator, idx, timestep):
+    logging.debug("Timestep %s (%s)", idx, timestep)
+
+
+def _log_setup(simulator, idx, timestep):
+    logging.debug("Setting up network")
+
+
+def _log_engines(simulator, idx, timestep):
+    logging.debug("Starting engines")
+
+
+def _log_engine(simulator, engine):
+    logging.debug("Running engine %s", engine.name)
+
+
+LOGGING_CALLBACKS = {
+    'before_timestep': [_log_timestep],
+    'before_setup': [_log_setup],
+    'after_setup': [_log_engines],
+    'before_engine': [_log_engine],
+}
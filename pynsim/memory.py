@@ -0,0 +1,265 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Where the memory of a simulation goes:
+
+        report = network.memory_report()
+        print(format_report(report))
+
+    The report gives the bytes held by the instances of each component type,
+    by each of their properties and by the history of each property, and by
+    the indexes of the network. To follow it through a long run:
+
+        s = Simulator(network, memory=MemoryMonitor(interval=1000))
+        s.start()
+        s.memory.reports
+
+    Long lists, such as histories, are measured from a sample of their items
+    so that a report takes much the same time however long the run has been.
+"""
+
+import logging
+import sys
+import tracemalloc
+from collections import deque
+
+from pynsim.components.component import Component
+
+#Lists longer than this are measured from a sample of SAMPLE_SIZE items
+SAMPLE_THRESHOLD = 1000
+SAMPLE_SIZE = 100
+FLOAT_TYPE = set([float])
+FLOAT_SIZE = sys.getsizeof(1.0)
+
+#The attributes of a container which index its components
+INDEX_ATTRIBUTES = ['components', 'nodes', 'links', 'institutions',
+                    '_node_map', '_link_map', '_institution_map', '_component_map',
+                    '_node_type_map', '_link_type_map', '_institution_type_map']
+
+
+def deep_size(obj, seen=None):
+    """
+        The number of bytes used by an object and everything it refers to,
+        other than components, classes, modules and functions. Objects in
+        seen (a set of ids) are not counted, and the objects which are
+        counted are added to it.
+    """
+    if seen is None:
+        seen = set()
+    total = 0
+    stack = [(obj, 1.0)]
+    while stack:
+        o, weight = stack.pop()
+        if id(o) in seen:
+            continue
+        seen.add(id(o))
+        if isinstance(o, (Component, type)) or callable(o) or type(o).__name__ == 'module':
+            continue
+
+        total += sys.getsizeof(o) * weight
+
+        if isinstance(o, dict):
+            stack.extend((k, weight) for k in o.keys())
+            stack.extend((v, weight) for v in o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            items = o if isinstance(o, (list, tuple)) else list(o)
+            if len(items) > SAMPLE_THRESHOLD:
+                sample = items[::len(items) // SAMPLE_SIZE][:SAMPLE_SIZE]
+            else:
+                sample = items
+            if len(sample) > 0 and set(map(type, sample)) == FLOAT_TYPE:
+                #Most histories: a float takes the same space wherever it is
+                total += len(items) * FLOAT_SIZE * weight
+            elif sample is items:
+                stack.extend((v, weight) for v in items)
+            else:
+                sample_weight = weight * len(items) / SAMPLE_SIZE
+                stack.extend((v, sample_weight) for v in sample)
+        elif type(o).__sizeof__ is not object.__sizeof__:
+            #numpy arrays, pandas objects etc. count their own data
+            continue
+        elif hasattr(o, '__dict__'):
+            stack.append((vars(o), weight))
+
+    return int(total)
+
+
+def _add(d, k, size):
+    d[k] = d.get(k, 0) + size
+
+
+def memory_report(network, seen=None):
+    """
+        The bytes held by a network:
+
+            {'types': {component_type: {'count': number of instances,
+                                        'instances': bytes,
+                                        'properties': {name: bytes},
+                                        'history': {name: bytes}}},
+             'indexes': {container name: {attribute: bytes}},
+             'total': bytes}
+
+        The instances are the objects themselves and any attributes which
+        are not properties. Objects shared between components are counted
+        once, for the first component which refers to them. See deep_size
+        for seen.
+    """
+    if seen is None:
+        seen = set()
+    types = {}
+    indexes = {}
+
+    containers = [network] + [c for c in network.components if hasattr(c, '_node_map')]
+    for container in containers:
+        sizes = {}
+        for k in INDEX_ATTRIBUTES:
+            value = getattr(container, k, None)
+            if value is None:
+                continue
+            #Only the index itself, not the components in it
+            size = sys.getsizeof(value)
+            if isinstance(value, dict):
+                size += sum(sys.getsizeof(v) for v in value.values() if isinstance(v, list))
+            sizes[k] = size
+        for k in ('_incidence', 'timer'):
+            value = getattr(container, k, None)
+            if value is not None:
+                sizes[k] = deep_size(value, seen)
+        indexes[container.name] = sizes
+
+    for c in [network] + network.components:
+        entry = types.get(c.component_type)
+        if entry is None:
+            entry = types[c.component_type] = {'count': 0, 'instances': 0,
+                                               'properties': {}, 'history': {}}
+        entry['count'] += 1
+
+        #The current values first, so that a value which is also in the
+        #history counts as the property's
+        attributes = vars(c)
+        for k in c._properties:
+            if k in attributes:
+                _add(entry['properties'], k, deep_size(attributes[k], seen))
+        history = attributes.get('_history', {})
+        seen.add(id(history))
+        for k, values in history.items():
+            _add(entry['history'], k, deep_size(values, seen))
+
+        size = sys.getsizeof(c) + sys.getsizeof(attributes) + sys.getsizeof(history)
+        for k, v in attributes.items():
+            if k in c._properties or k == '_history' or k == 'timer' or \
+               k in INDEX_ATTRIBUTES or k == '_incidence':
+                continue
+            size += deep_size(v, seen)
+        entry['instances'] += size
+
+    total = 0
+    for entry in types.values():
+        total += entry['instances'] + sum(entry['properties'].values()) + \
+            sum(entry['history'].values())
+    for sizes in indexes.values():
+        total += sum(sizes.values())
+
+    return {'types': types, 'indexes': indexes, 'total': total}
+
+
+def format_report(report, top=None):
+    """
+        A table of a memory report, largest first.
+    """
+    rows = []
+    for component_type, entry in report['types'].items():
+        rows.append(("%s (%s instances)" % (component_type, entry['count']), entry['instances']))
+        for k, size in entry['properties'].items():
+            rows.append(("%s.%s" % (component_type, k), size))
+        for k, size in entry['history'].items():
+            rows.append(("%s.%s history" % (component_type, k), size))
+    for name, sizes in report['indexes'].items():
+        for k, size in sizes.items():
+            rows.append(("%s %s" % (name, k), size))
+    for name, size in report.get('engines', {}).items():
+        rows.append(("engine %s" % name, size))
+    rows.sort(key=lambda r: -r[1])
+    if top is not None:
+        rows = rows[:top]
+
+    width = max([len(r[0]) for r in rows] + [5])
+    lines = ["%s %12s" % ("Total".ljust(width), report['total'])]
+    lines.extend("%s %12s" % (name.ljust(width), size) for name, size in rows)
+    return "\n".join(lines)
+
+
+class MemoryMonitor(object):
+    """
+        Takes a memory report every interval timesteps of a simulation.
+
+        args:
+            interval int: The number of timesteps between reports.
+            use_tracemalloc bool: Also take a tracemalloc snapshot with each
+                                  report, and keep the lines of code which
+                                  have allocated the most memory. Tracing
+                                  allocations slows everything down, so it
+                                  is off by default.
+            top int: The number of lines of code to keep from each snapshot.
+            log bool: Log a summary of each report.
+
+        attributes:
+            reports list: (timestep index, report) tuples. With tracemalloc,
+                          each report has a 'tracemalloc' list of
+                          (file:line, bytes, count) tuples.
+    """
+
+    def __init__(self, interval=100, use_tracemalloc=False, top=10, log=True):
+        self.interval = interval
+        self.use_tracemalloc = use_tracemalloc
+        self.top = top
+        self.log = log
+        self.reports = []
+        self._started_tracemalloc = False
+
+    def __repr__(self):
+        return "MemoryMonitor(interval=%s, reports=%s)" % (self.interval, len(self.reports))
+
+    def start(self):
+        self.reports = []
+        if self.use_tracemalloc and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+
+    def stop(self):
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def due(self, idx):
+        return idx % self.interval == 0
+
+    def sample(self, simulator, idx):
+        """
+            Take a report of a simulator at the timestep with this index.
+        """
+        report = simulator.memory_report()
+        if self.use_tracemalloc and tracemalloc.is_tracing():
+            stats = tracemalloc.take_snapshot().statistics('lineno')[:self.top]
+            report['tracemalloc'] = [("%s:%s" % (s.traceback[0].filename, s.traceback[0].lineno),
+                                      s.size, s.count) for s in stats]
+        self.reports.append((idx, report))
+        if self.log:
+            logging.info("Memory at timestep %s: %s bytes\n%s", idx, report['total'],
+                         format_report(report, top=self.top))
+        return report
@@ -0,0 +1,242 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Live metrics of a running simulation, served in the Prometheus text
+    format:
+
+        s = Simulator(network, metrics=MetricsExporter(port=9090))
+        s.start()
+
+    While the simulation runs, http://127.0.0.1:9090/metrics gives the
+    number of timesteps done, the recent timesteps per second, the time of
+    the last timestep, the time spent in each engine, the iterations of the
+    last timestep, the resident memory of the process and the memory held by
+    the history.
+
+    The run loop only assigns numbers to attributes of the exporter, which
+    the server's thread reads when it is scraped, so the loop never waits
+    for a lock.
+"""
+
+import logging
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def resident_memory():
+    """
+        The resident set size of this process, in bytes. Where it cannot be
+        read, the peak resident set size.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    #Kilobytes on linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def history_bytes(network):
+    """
+        The bytes held by the history of the network and its components.
+    """
+    from pynsim.memory import deep_size
+
+    seen = set()
+    return sum(deep_size(c._history, seen) for c in [network] + network.components)
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.exporter.render().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.debug("Metrics request: " + format, *args)
+
+
+class MetricsExporter(object):
+    """
+        Serves the metrics of the simulator it is given to, on a local port,
+        from when the simulation starts until it is torn down.
+
+        args:
+            port int: The port to listen on. 0 picks a free port, which is
+                      then in the port attribute.
+            host string: The address to listen on.
+            history_interval int: The history's memory is measured every
+                                  this many timesteps, as it takes a while
+                                  on big networks.
+            window int: The number of timesteps over which the timesteps per
+                        second are measured.
+    """
+
+    def __init__(self, port=0, host='127.0.0.1', history_interval=100, window=20):
+        self.port = port
+        self.host = host
+        self.history_interval = history_interval
+        self.window = window
+        self._server = None
+        self._thread = None
+        self._reset(None)
+
+    def __repr__(self):
+        return "MetricsExporter(host=%s, port=%s)" % (self.host, self.port)
+
+    @property
+    def url(self):
+        return "http://%s:%s/metrics" % (self.host, self.port)
+
+    def _reset(self, simulator):
+        self.network = simulator.network.name if simulator is not None else ''
+        self.timesteps = 0
+        self.timestep = None
+        self.last_duration = 0.0
+        self.last_time = 0.0
+        self.iterations = 0
+        self.history = 0
+        self.engine_seconds = dict((e.name, 0.0) for e in simulator.engines) \
+            if simulator is not None else {}
+        self.engine_runs = dict((e.name, 0) for e in simulator.engines) \
+            if simulator is not None else {}
+        self._stamps = [0.0] * self.window
+        self._started = time.perf_counter()
+
+    def start(self, simulator):
+        """
+            Reset the metrics for a run of a simulator and start serving them.
+        """
+        self._reset(simulator)
+        if self._server is not None:
+            return
+        self._server = ThreadingHTTPServer((self.host, self.port), _Handler)
+        self._server.daemon_threads = True
+        self._server.exporter = self
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, name="pynsim metrics")
+        self._thread.daemon = True
+        self._thread.start()
+        logging.info("Serving metrics on %s", self.url)
+
+    def stop(self):
+        if self._server is None:
+            return
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+
+    def engine_done(self, name, ns):
+        """
+            Record the time of an engine run, in nanoseconds.
+        """
+        self.engine_seconds[name] = self.engine_seconds.get(name, 0.0) + ns / 1e9
+        self.engine_runs[name] = self.engine_runs.get(name, 0) + 1
+
+    def timestep_done(self, simulator, idx, iterations):
+        """
+            Record the end of a timestep.
+        """
+        now = time.perf_counter()
+        previous = self._stamps[(self.timesteps - 1) % self.window] if self.timesteps else self._started
+        self._stamps[self.timesteps % self.window] = now
+        self.last_duration = now - previous
+        self.last_time = time.time()
+        self.iterations = iterations
+        self.timestep = idx
+        if self.history_interval and idx % self.history_interval == 0:
+            self.history = history_bytes(simulator.network)
+        #Last, so that a scrape never sees a count ahead of its stamp
+        self.timesteps += 1
+
+    def rate(self):
+        """
+            The timesteps per second over the last window timesteps.
+        """
+        done = self.timesteps
+        if done == 0:
+            return 0.0
+        last = self._stamps[(done - 1) % self.window]
+        if done > self.window:
+            first, n = self._stamps[done % self.window], self.window - 1
+        else:
+            first, n = self._started, done
+        if n == 0 or last <= first:
+            return 0.0
+        return n / (last - first)
+
+    def render(self):
+        """
+            The metrics in the Prometheus text format.
+        """
+        labels = 'network="%s"' % _label(self.network)
+        lines = []
+
+        def metric(name, kind, help_text, values):
+            lines.append("# HELP %s %s" % (name, help_text))
+            lines.append("# TYPE %s %s" % (name, kind))
+            for extra, value in values:
+                label = labels + (',' + extra if extra else '')
+                lines.append("%s{%s} %s" % (name, label, repr(float(value))))
+
+        metric('pynsim_timesteps_total', 'counter', "Timesteps completed.",
+               [('', self.timesteps)])
+        metric('pynsim_timesteps_per_second', 'gauge',
+               "Timesteps per second over the last %s timesteps." % self.window,
+               [('', self.rate())])
+        metric('pynsim_timestep_duration_seconds', 'gauge', "Duration of the last timestep.",
+               [('', self.last_duration)])
+        metric('pynsim_last_timestep_timestamp_seconds', 'gauge',
+               "Unix time at which the last timestep finished.", [('', self.last_time)])
+        metric('pynsim_iterations', 'gauge', "Engine iterations in the last timestep.",
+               [('', self.iterations)])
+        engines = list(self.engine_seconds.items())
+        metric('pynsim_engine_seconds_total', 'counter', "Time spent running each engine.",
+               [('engine="%s"' % _label(k), v) for k, v in engines])
+        metric('pynsim_engine_runs_total', 'counter', "Runs of each engine.",
+               [('engine="%s"' % _label(k), v) for k, v in list(self.engine_runs.items())])
+        metric('pynsim_resident_memory_bytes', 'gauge', "Resident memory of the process.",
+               [('', resident_memory())])
+        metric('pynsim_history_bytes', 'gauge',
+               "Memory held by the history, measured every %s timesteps." % self.history_interval,
+               [('', self.history)])
+        return "\n".join(lines) + "\n"
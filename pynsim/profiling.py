@@ -0,0 +1,227 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Profile chosen phases of a simulation, leaving the rest to run at full
+    speed:
+
+        profile = PhaseProfiler('profiles', engines=['Allocation engine'],
+                                component_types=['Reservoir'],
+                                timesteps=range(1000, 1010))
+        s = Simulator(network, profile=profile)
+        s.start()
+
+    This writes profiles/engine-Allocation_engine.pstats and
+    profiles/setup-Reservoir.pstats, which can be read with pstats or
+    snakeviz. With profiler='sampling' a SamplingProfiler is used instead,
+    which writes collapsed stacks (.collapsed) for flamegraph.pl or
+    speedscope.
+"""
+
+import cProfile
+import logging
+import os
+import re
+import sys
+import threading
+import time
+
+
+class CProfile(object):
+    """
+        A cProfile.Profile which writes pstats files.
+    """
+    extension = 'pstats'
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def enable(self):
+        self.profile.enable()
+
+    def disable(self):
+        self.profile.disable()
+
+    def dump(self, path):
+        self.profile.dump_stats(path)
+
+    def close(self):
+        pass
+
+
+class SamplingProfiler(object):
+    """
+        Samples the stack of the thread which enabled it, every interval
+        seconds while it is enabled, from a background thread. Its overhead
+        does not depend on how many functions are called, so it suits code
+        which calls many small functions. It writes collapsed stacks: one
+        line per stack, 'outer;inner;innermost count'.
+    """
+    extension = 'collapsed'
+
+    def __init__(self, interval=0.001):
+        self.interval = interval
+        self.counts = {}
+        self._thread = None
+        self._thread_id = None
+        self._enabled = threading.Event()
+        self._stopped = False
+
+    def enable(self):
+        self._thread_id = threading.get_ident()
+        if self._thread is None:
+            self._stopped = False
+            self._thread = threading.Thread(target=self._sample, name="pynsim sampler")
+            self._thread.daemon = True
+            self._thread.start()
+        self._enabled.set()
+
+    def disable(self):
+        self._enabled.clear()
+
+    def _sample(self):
+        while True:
+            self._enabled.wait()
+            if self._stopped:
+                break
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is not None and self._enabled.is_set():
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append("%s (%s:%s)" % (code.co_name, os.path.basename(code.co_filename),
+                                                 code.co_firstlineno))
+                    frame = frame.f_back
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            time.sleep(self.interval)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.counts.items()):
+                f.write("%s %s\n" % (stack, count))
+
+    def close(self):
+        if self._thread is not None:
+            self._stopped = True
+            self._enabled.set()
+            self._thread.join()
+            self._thread = None
+            self._enabled.clear()
+
+
+PROFILERS = {'cprofile': CProfile, 'sampling': SamplingProfiler}
+
+
+class PhaseProfiler(object):
+    """
+        Which phases of a simulation to profile, and the profiles of each.
+
+        args:
+            output_dir string: Where to write a file for each phase.
+            engines list: The names of the engines to profile.
+            component_types list: The component types whose setup functions
+                                  are profiled.
+            post_process bool: Whether to profile the post processing,
+                               which records the history.
+            timesteps: The indices of the timesteps to profile, as a range
+                       or anything else which supports 'in'. Defaults to
+                       every timestep.
+            profiler: 'cprofile', 'sampling', or a function which returns
+                      an object with enable(), disable(), dump(path) and
+                      close() methods and an extension attribute.
+
+        Each phase has its own profiler, which is only enabled while that
+        phase runs. Under start_async only post processing and synchronous
+        engines are profiled.
+    """
+
+    def __init__(self, output_dir, engines=None, component_types=None, post_process=False,
+                 timesteps=None, profiler='cprofile'):
+        self.output_dir = output_dir
+        self.engines = list(engines or [])
+        self.component_types = list(component_types or [])
+        self.post_process = post_process
+        self.timesteps = timesteps
+        if not callable(profiler):
+            if profiler not in PROFILERS:
+                raise Exception("Unknown profiler %s. Use one of %s or a function."
+                                % (profiler, sorted(PROFILERS)))
+            profiler = PROFILERS[profiler]
+        self.profiler = profiler
+        #Phase name -> profiler, created when the phase first runs
+        self.profiles = {}
+
+    def __repr__(self):
+        return "PhaseProfiler(output_dir=%s, phases=%s)" % (self.output_dir, self.phases())
+
+    def phases(self):
+        return ['engine-%s' % e for e in self.engines] + \
+               ['setup-%s' % t for t in self.component_types] + \
+               (['post_process'] if self.post_process else [])
+
+    def covers(self, idx):
+        """
+            Whether the timestep with this index is profiled.
+        """
+        return self.timesteps is None or idx in self.timesteps
+
+    def _get(self, phase):
+        profile = self.profiles.get(phase)
+        if profile is None:
+            profile = self.profiles[phase] = self.profiler()
+        return profile
+
+    def engine(self, engine):
+        """
+            The profiler for an engine, or None if it is not profiled.
+        """
+        if engine.name not in self.engines:
+            return None
+        return self._get('engine-%s' % engine.name)
+
+    def setup(self):
+        """
+            The profilers of the component types, by component type.
+        """
+        return dict((t, self._get('setup-%s' % t)) for t in self.component_types)
+
+    def post_processing(self):
+        """
+            The profiler for the post processing, or None.
+        """
+        if not self.post_process:
+            return None
+        return self._get('post_process')
+
+    def dump(self):
+        """
+            Write a file for each phase which has been profiled.
+
+            :returns The paths of the files.
+        """
+        if not os.path.exists(self.output_dir):
+            os.makedirs(self.output_dir)
+        paths = []
+        for phase, profile in sorted(self.profiles.items()):
+            profile.close()
+            path = os.path.join(self.output_dir, "%s.%s" % (re.sub(r'[^\w\-.]', '_', phase),
+                                                            profile.extension))
+            profile.dump(path)
+            logging.info("Profile of %s written to %s", phase, path)
+            paths.append(path)
+        return paths
@@ -0,0 +1,148 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Reproducible random number streams.
+
+    Every component, engine and scenario gets its own numpy Generator,
+    derived from a root seed and a stable key (such as the component's type
+    and name). As a stream depends only on the root seed and its key, the
+    values a component draws do not depend on the order in which components
+    are set up, or on which process they are simulated in.
+
+    Streams are created by the simulator when it is given a seed:
+
+        s = Simulator(network, seed=42)
+
+        class StochasticNode(Node):
+            def setup(self, timestamp):
+                self.demand = self.rng.normal(10, 2)
+"""
+
+import hashlib
+import struct
+
+import numpy as np
+
+
+def _key_words(*parts):
+    """
+        Convert a key into a tuple of 32 bit integers, independently of the
+        python hash seed.
+    """
+    data = "\x00".join(str(p) for p in parts).encode('utf-8')
+    digest = hashlib.sha256(data).digest()
+    return struct.unpack('<8I', digest)
+
+
+class RandomStreams(object):
+    """
+        A factory for independent random number streams, keyed on a root seed
+        and an optional scenario.
+    """
+
+    def __init__(self, seed=None, scenario=None):
+        if seed is None:
+            #Choose a root seed, and keep it so the run can be repeated.
+            seed = np.random.SeedSequence().entropy
+        self.seed = seed
+        self.scenario = scenario
+        self._streams = {}
+
+    def __repr__(self):
+        return "RandomStreams(seed=%s, scenario=%s)" % (self.seed, self.scenario)
+
+    def reset(self):
+        """
+            Discard all the streams, so that they restart from the beginning.
+        """
+        self._streams = {}
+
+    def seed_sequence(self, *key):
+        """
+            Return the numpy SeedSequence for a key.
+        """
+        return np.random.SeedSequence(self.seed,
+                                      spawn_key=_key_words(self.scenario, *key))
+
+    def stream(self, *key):
+        """
+            Return the Generator for a key, creating it if necessary.
+        """
+        generator = self._streams.get(key)
+        if generator is None:
+            generator = np.random.Generator(np.random.PCG64(self.seed_sequence(*key)))
+            self._streams[key] = generator
+        return generator
+
+    def component(self, component):
+        """
+            The stream of a node, link, institution or network.
+        """
+        return self.stream('component', component.base_type, component.name)
+
+    def engine(self, engine):
+        """
+            The stream of an engine. Engines are identified by class and name.
+        """
+        return self.stream('engine', engine.__class__.__name__, engine.name)
+
+    def for_scenario(self, scenario):
+        """
+            Return the streams for another scenario with the same root seed.
+        """
+        return RandomStreams(self.seed, scenario=scenario)
+
+    def draw(self, components, method='random', *args, shared=None, **kwargs):
+        """
+            Draw one value for each of a list of components in a single call,
+            for example:
+
+                inflows = streams.draw(network.get_nodes('Catchment'), 'gamma', 2.0)
+
+            Each component's value comes from a bulk stream of its own, keyed
+            like its component stream, so it does not depend on which other
+            components are in the list: a component draws the same values
+            whether its network is simulated whole or in partitions. That
+            means calling each component's stream in turn, which costs about
+            2us per component (see benchmarks/bench_rng.py): 0.2s per
+            timestep for 100,000 components.
+
+            Where the values may depend on the list, give the key of a stream
+            shared by the components, and all the values are drawn from it in
+            one call, at about 20ns per component:
+
+                inflows = streams.draw(catchments, 'gamma', 2.0, shared=('catchments',))
+
+            :returns A numpy array with one row per component.
+        """
+        if len(components) == 0:
+            return np.empty(0)
+
+        if shared is not None:
+            size = kwargs.pop('size', None)
+            if size is None:
+                size = ()
+            elif np.ndim(size) == 0:
+                size = (size,)
+            generator = self.stream('shared', *shared)
+            return getattr(generator, method)(*args, size=(len(components),) + tuple(size),
+                                              **kwargs)
+
+        stream = self.stream
+        return np.array([getattr(stream('bulk', c.base_type, c.name), method)(*args, **kwargs)
+                         for c in components])
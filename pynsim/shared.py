@@ -0,0 +1,198 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Collect the results of simulations run in other processes without
+    pickling them.
+
+    The parent process allocates a SharedHistory, which is a block of shared
+    memory (or a memory-mapped file) large enough to hold the history of a set
+    of properties for every member of an ensemble. Workers attach to the
+    block using its (small) descriptor and write their history directly into
+    it, so the only thing that needs to be sent back to the parent is a
+    notification that the member has finished:
+
+        fields = [('N12', 'Q'), ('River network', 'discharge')]
+        with SharedHistory(fields, members=12, timesteps=365) as results:
+            p = Process(target=run, args=(member, results.descriptor))
+            ...
+            results.get('N12', 'Q') #An array of shape (12, 365)
+
+        def run(member, descriptor):
+            ...
+            simulator.start()
+            with SharedHistory.attach(descriptor) as results:
+                results.write(member, simulator.network)
+"""
+
+import os
+
+import numpy as np
+from multiprocessing import shared_memory
+
+
+def _open_shared_memory(name):
+    """
+        Attach to an existing shared memory segment without registering it
+        with this process's resource tracker (the segment is owned by the
+        process that created it).
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        #Python < 3.13
+        return shared_memory.SharedMemory(name=name)
+
+
+class SharedHistory(object):
+    """
+        The history of a set of (component name, property name) fields for
+        each member of an ensemble, held in memory which is shared between
+        processes.
+
+        The values are available as a numpy array of shape
+        (members, len(fields), timesteps) + value_shape.
+    """
+
+    def __init__(self, fields, members, timesteps, value_shape=(),
+                 dtype='float64', filename=None, _descriptor=None):
+        if _descriptor is not None:
+            self._shm = None
+            self.fields = [tuple(f) for f in _descriptor['fields']]
+            self.shape = tuple(_descriptor['shape'])
+            self.dtype = np.dtype(_descriptor['dtype'])
+            self.filename = _descriptor['filename']
+            self.owner = False
+            if self.filename is not None:
+                self.values = np.memmap(self.filename, dtype=self.dtype,
+                                        mode='r+', shape=self.shape)
+            else:
+                self._shm = _open_shared_memory(_descriptor['name'])
+                self.values = np.ndarray(self.shape, dtype=self.dtype,
+                                         buffer=self._shm.buf)
+        else:
+            self._shm = None
+            self.fields = [tuple(f) for f in fields]
+            self.shape = (members, len(self.fields), timesteps) + tuple(value_shape)
+            self.dtype = np.dtype(dtype)
+            self.filename = filename
+            self.owner = True
+            if self.filename is not None:
+                self.values = np.memmap(self.filename, dtype=self.dtype,
+                                        mode='w+', shape=self.shape)
+            else:
+                size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+                self._shm = shared_memory.SharedMemory(create=True, size=size)
+                self.values = np.ndarray(self.shape, dtype=self.dtype,
+                                         buffer=self._shm.buf)
+            #Members which are never written are left as NaN, where possible.
+            if self.dtype.kind in 'fc':
+                self.values.fill(np.nan)
+            else:
+                self.values.fill(0)
+
+        self._field_index = dict((f, i) for i, f in enumerate(self.fields))
+
+    def __repr__(self):
+        return "SharedHistory(fields=%s, shape=%s)" % (len(self.fields), self.shape)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        if self.owner:
+            self.unlink()
+        return False
+
+    @property
+    def descriptor(self):
+        """
+            A small, picklable description of the block, which can be passed
+            to another process and used to attach to it.
+        """
+        return {
+            'name': self._shm.name if self._shm is not None else None,
+            'filename': self.filename,
+            'shape': self.shape,
+            'dtype': self.dtype.str,
+            'fields': self.fields,
+        }
+
+    @classmethod
+    def attach(cls, descriptor):
+        """
+            Attach to a block created by another process.
+        """
+        return cls(None, None, None, _descriptor=descriptor)
+
+    def write(self, member, network):
+        """
+            Copy the history of every field from the network's components
+            into the slot for the given ensemble member.
+        """
+        timesteps = self.shape[2]
+        for i, (component_name, property_name) in enumerate(self.fields):
+            component = network.get_component(component_name)
+            if component is None:
+                raise Exception("Unable to write history. No component "
+                                "called %s in network %s" % (component_name, network.name))
+            history = component._history[property_name][-timesteps:]
+            self.values[member, i, :len(history)] = history
+
+    def write_field(self, member, component_name, property_name, values):
+        """
+            Write an array of values for a single field.
+        """
+        i = self._field_index[(component_name, property_name)]
+        self.values[member, i, :len(values)] = values
+
+    def get(self, component_name, property_name):
+        """
+            Return the values of a field for every member, as an array of
+            shape (members, timesteps) + value_shape. This is a view on the
+            shared memory, so copy it if it is needed after the block is
+            closed.
+        """
+        return self.values[:, self._field_index[(component_name, property_name)]]
+
+    def flush(self):
+        """
+            Flush changes to disk, when the block is a memory-mapped file.
+        """
+        if isinstance(self.values, np.memmap):
+            self.values.flush()
+
+    def close(self):
+        """
+            Detach from the block. The values cannot be used after this.
+        """
+        self.flush()
+        self.values = None
+        if self._shm is not None:
+            self._shm.close()
+
+    def unlink(self):
+        """
+            Free the block. This should only be called by the process which
+            created it, once every process has closed it.
+        """
+        if self._shm is not None:
+            self._shm.unlink()
+            self._shm = None
+        elif self.filename is not None and os.path.exists(self.filename):
+            os.remove(self.filename)
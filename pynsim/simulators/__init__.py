@@ -16,3 +16,4 @@
 #    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
 
 from .simulator import Simulator
+from .decomposed import DecomposedSimulator
@@ -0,0 +1,360 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import logging
+import multiprocessing
+import traceback
+from copy import deepcopy
+
+from pynsim.simulators.simulator import Simulator
+from pynsim.timing import Histogram
+from pynsim.topology import connected_components, topological_waves
+
+
+class Partition(object):
+    """
+        A part of a network which is simulated in its own process.
+
+        A link between two partitions belongs to the partition of its start
+        node (its 'outbound' links). The partition of the end node sees the
+        link as an 'inbound' link, whose values are sent to it once the
+        owning partition has run its engines.
+    """
+    def __init__(self, name, nodes):
+        self.name = name
+        self.nodes = nodes
+        self.links = []
+        self.institutions = []
+        self.components = []
+        self.inbound = []
+        self.outbound = []
+        self.network = None
+        #The engines which run in this partition
+        self.engines = []
+
+    def __repr__(self):
+        return "Partition(name=%s, nodes=%s, inbound=%s, outbound=%s)" % \
+            (self.name, len(self.nodes), len(self.inbound), len(self.outbound))
+
+
+def partition_network(network, partition='component', boundary_link_types=None):
+    """
+        Split a network into partitions.
+
+        args:
+            partition: One of:
+                'component': one partition per weakly connected component of
+                             the network.
+                'institution': one partition per institution. A node which is
+                               in several institutions goes in the first one.
+                               Nodes which are in no institution are grouped by
+                               connected component.
+                a dict: mapping node names to partition labels.
+                a function: taking a node and returning its partition label.
+            boundary_link_types list: When partitioning by component, links of
+                these types (such as inter-basin transfers) do not join
+                components together.
+
+        :returns A list of Partition objects.
+    """
+    labels = {}
+    if partition == 'component':
+        for i, nodes in enumerate(connected_components(network, boundary_link_types)):
+            for n in nodes:
+                labels[n] = i
+    elif partition == 'institution':
+        for inst in network.institutions:
+            for n in inst.nodes:
+                labels.setdefault(n, inst.name)
+        unassigned = network.subnetwork([n for n in network.nodes if n not in labels])
+        for i, nodes in enumerate(connected_components(unassigned, boundary_link_types)):
+            for n in nodes:
+                labels[n] = ('unassigned', i)
+    elif isinstance(partition, dict):
+        for n in network.nodes:
+            if n.name not in partition:
+                raise Exception("Node %s is not assigned to a partition." % n.name)
+            labels[n] = partition[n.name]
+    elif callable(partition):
+        for n in network.nodes:
+            labels[n] = partition(n)
+    else:
+        raise Exception("Unknown partition %s. Please use 'component', "
+                        "'institution', a dict or a function." % (partition,))
+
+    partitions = []
+    partition_map = {}
+    for n in network.nodes:
+        label = labels[n]
+        if label not in partition_map:
+            partition_map[label] = Partition(label, [])
+            partitions.append(partition_map[label])
+        partition_map[label].nodes.append(n)
+
+    for link in network.links:
+        start = partition_map[labels[link.start_node]]
+        end = partition_map[labels[link.end_node]]
+        start.links.append(link)
+        if start is not end:
+            start.outbound.append(link)
+            end.inbound.append(link)
+
+    for inst in network.institutions:
+        members = set(id(partition_map[labels[n]]) for n in inst.nodes)
+        members.update(id(partition_map[labels[l.start_node]]) for l in inst.links)
+        if len(members) > 1:
+            raise Exception("Institution %s spans several partitions. An "
+                            "institution must be simulated in one partition." % inst.name)
+        owner = partition_map[labels[inst.nodes[0]]] if inst.nodes else \
+            partition_map[labels[inst.links[0].start_node]] if inst.links else partitions[0]
+        owner.institutions.append(inst)
+
+    #Generic components are simulated in the first partition
+    for c in network._component_map.values():
+        partitions[0].components.append(c)
+
+    return partitions
+
+
+def _history_marks(components):
+    return dict((id(c), dict((k, len(v)) for k, v in c._history.items()))
+                for c in components)
+
+
+def _run_partition(simulator, partition, conn):
+    """
+        The main loop of a partition's process. This runs in a forked copy of
+        the parent process, so the network and engines are the parent's as
+        they were when the process was started.
+    """
+    try:
+        network = partition.network
+        #The process is a copy, so the components need not be unbound
+        network.bind_components()
+        worker = Simulator(network, record_time=simulator.record_time,
+                           max_iterations=simulator.max_iterations,
+                           record_history=simulator.record_history)
+        worker.timesteps = simulator.timesteps
+        worker.random_streams = simulator.random_streams
+        for engine in partition.engines:
+            if engine.target is simulator.network:
+                engine.target = network
+            worker.engines.append(engine)
+            worker.timing['engines'][engine.name] = 0
+
+        owned = [network] + network.components
+        marks = _history_marks(owned)
+
+        while True:
+            message = conn.recv()
+            if message[0] == 'step':
+                _, idx, timestep, inbound = message
+                worker._setup_timestep(idx, timestep)
+                for link in partition.inbound:
+                    for k, v in inbound[link.name].items():
+                        setattr(link, k, v)
+                worker._run_engines(idx, timestep)
+                worker._post_process()
+                conn.send(('done', dict((link.name, link.get_properties())
+                                        for link in partition.outbound)))
+            elif message[0] == 'finish':
+                worker._teardown()
+                history = {}
+                for c in owned[1:]:
+                    #Without record_history, only this run's last values are left
+                    mark = marks[id(c)] if worker.record_history is not False else {}
+                    history[(c.base_type, c.name)] = \
+                        dict((k, v[mark.get(k, 0):]) for k, v in c._history.items())
+                conn.send(('history', history, worker.timing, worker.latency))
+                break
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+    finally:
+        conn.close()
+
+
+class DecomposedSimulator(Simulator):
+    """
+        A simulator which splits the network into partitions, such as
+        independent river basins, and simulates each partition in its own
+        process.
+
+        At each timestep every partition sets up its components in turn and
+        runs the engines on its own part of the network. Partitions which are
+        downstream of others (connected by a link from another partition) wait
+        for the values of those links, so the results are the same as running
+        the whole network in one process, as long as the engines only use
+        values from upstream of each node.
+
+        Engines which target the network are run on each partition's
+        subnetwork. Engines which target a node, link or institution are run
+        only in the partition which contains it. The history of the nodes,
+        links and institutions is
+        copied back into this process at the end of the simulation. The
+        network's own properties and the state of the engines are not, so
+        engines should record their results on the nodes and links.
+
+        The partitions run their engines synchronously, so start_async only
+        frees the event loop while the partitions run; asynchronous engines
+        and setup functions are not supported. Nor is steps().
+    """
+
+    def __init__(self, network=None, partition='component',
+                 boundary_link_types=None, **kwargs):
+        super(DecomposedSimulator, self).__init__(network, **kwargs)
+        self.partition = partition
+        self.boundary_link_types = boundary_link_types
+
+    def __repr__(self):
+        my_engines = ",".join([m.name for m in self.engines])
+        return "DecomposedSimulator(engines=[%s], partition=%s)" % (my_engines, self.partition)
+
+    def partitions(self):
+        """
+            Partition the network, create a subnetwork for each partition and
+            assign the engines to the partitions they run in.
+        """
+        partitions = partition_network(self.network, self.partition,
+                                       self.boundary_link_types)
+        owners = {}
+        for p in partitions:
+            p.network = self.network.subnetwork(p.nodes, p.links, p.institutions,
+                                                name="%s (%s)" % (self.network.name, p.name))
+            p.network.add_components(*p.components)
+            for c in p.network.components:
+                owners[id(c)] = p
+
+        for engine in self.engines:
+            if engine.target is self.network:
+                for p in partitions:
+                    p.engines.append(engine)
+            elif id(engine.target) in owners:
+                owners[id(engine.target)].engines.append(engine)
+            else:
+                raise Exception("The target of engine %s is neither the network nor "
+                                "one of its components, so it cannot be assigned "
+                                "to a partition." % engine.name)
+        return partitions
+
+    #Not generators, so that they fail when called, before _prepare starts
+    #anything which would need to be closed
+    def steps(self, initialise=True):
+        raise NotImplementedError("Decomposed simulations cannot be run one step "
+                                  "at a time. Please use start().")
+
+    def steps_async(self, initialise=True):
+        raise NotImplementedError("Decomposed simulations cannot be run one step "
+                                  "at a time. Please use start_async().")
+
+    async def _simulate_async(self):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._simulate)
+
+    def _simulate(self):
+        try:
+            context = multiprocessing.get_context('fork')
+        except ValueError:
+            raise RuntimeError("Decomposed simulations need to be able to fork "
+                               "processes, which is not possible on this platform.")
+
+        connections = []
+        processes = []
+        try:
+            partitions = self.partitions()
+            logging.info("Simulating %s partitions", len(partitions))
+
+            #Partitions which receive links from other partitions wait for them
+            owners = dict((l.name, i) for i, p in enumerate(partitions) for l in p.outbound)
+            dependencies = dict((i, set(owners[l.name] for l in p.inbound))
+                                for i, p in enumerate(partitions))
+            waves = topological_waves(dependencies)
+
+            for p in partitions:
+                parent_conn, child_conn = context.Pipe()
+                process = context.Process(target=_run_partition,
+                                          args=(self, p, child_conn))
+                process.daemon = True
+                process.start()
+                child_conn.close()
+                connections.append(parent_conn)
+                processes.append(process)
+
+            #Only the timestep hooks are called: the rest of the loop runs in
+            #the partitions' processes, whose history arrives at the end.
+            hooks = self._hooks
+            for idx, timestep in self._progress(enumerate(self.timesteps)):
+                if hooks.before_timestep is not None:
+                    hooks.before_timestep(self, idx, timestep)
+                self.current_timestep = timestep
+                self.network.set_timestep(timestep, idx)
+
+                link_values = {}
+                for wave in waves:
+                    for i in wave:
+                        inbound = dict((l.name, link_values[l.name])
+                                       for l in partitions[i].inbound)
+                        connections[i].send(('step', idx, timestep, inbound))
+                    for i in wave:
+                        link_values.update(self._receive(connections[i], 'done')[1])
+
+                if hooks.after_timestep is not None:
+                    hooks.after_timestep(self, idx, timestep)
+
+            for conn in connections:
+                conn.send(('finish',))
+            for p, conn in zip(partitions, connections):
+                _, history, timing, latency = self._receive(conn, 'history')
+                self._merge(p, history, timing, latency)
+            if self.record_history is False:
+                self.network.trim_history()
+        finally:
+            for process in processes:
+                process.join(timeout=5)
+                if process.is_alive():
+                    process.terminate()
+            #The engines are torn down in the partitions' processes
+            self._close_resources()
+
+    def _receive(self, conn, expected):
+        try:
+            message = conn.recv()
+        except EOFError:
+            raise RuntimeError("A partition process exited unexpectedly.")
+        if message[0] == 'error':
+            raise RuntimeError("An error occurred in a partition process:\n%s" % message[1])
+        if message[0] != expected:
+            raise RuntimeError("Unexpected message from a partition process: %s" % (message[0],))
+        return message
+
+    def _merge(self, partition, history, timing, latency):
+        """
+            Copy the history recorded by a partition's process into the
+            components in this process.
+        """
+        for c in partition.network.components:
+            for k, values in history.get((c.base_type, c.name), {}).items():
+                c._history.setdefault(k, []).extend(values)
+                if len(values) > 0:
+                    setattr(c, k, deepcopy(values[-1]))
+
+        for k in ('network', 'nodes', 'links', 'institutions'):
+            self.timing[k] += timing[k]
+        for name, t in timing['engines'].items():
+            self.timing['engines'][name] = self.timing['engines'].get(name, 0) + t
+        for name, histogram in latency.items():
+            self.latency.setdefault(name, Histogram()).merge(histogram)
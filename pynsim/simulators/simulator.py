@@ -15,8 +15,15 @@
 #    You should have received a copy of the GNU General Public License
 #    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
 
+import asyncio
+import copy
+import inspect
 import logging
-import time
+from time import perf_counter_ns
+from types import MappingProxyType
+
+from pynsim.hooks import Hooks
+from pynsim.timing import Histogram
 
 
 class EngineIterator:
@@ -49,6 +56,8 @@ class EngineIterator:
         return self
 
     def __next__(self):
+        if len(self.simulator.engines) == 0:
+            raise StopIteration
         current_engine = self.simulator.engines[self._current_engine_index]
         current_iteration = self._current_iteration
         if current_iteration > self.max_iterations:
@@ -65,14 +74,80 @@ class EngineIterator:
         return self.__next__()
 
 
+class StepView(object):
+    """
+        A read-only view of the values of a network's components at the end
+        of a timestep, as yielded by Simulator.steps:
+
+            for step in simulator.steps():
+                print(step.timestep, step['R1']['S'])
+
+        Values are read from the components when they are asked for, so a
+        view is only valid until the simulation moves on to the next
+        timestep. Use to_dict() to keep a copy.
+    """
+    __slots__ = ('network', 'index', 'timestep')
+
+    def __init__(self, network, index, timestep):
+        self.network = network
+        self.index = index
+        self.timestep = timestep
+
+    def __repr__(self):
+        return "StepView(index=%s, timestep=%s)" % (self.index, self.timestep)
+
+    def __getitem__(self, component_name):
+        """
+            The values of the properties of a component, by name.
+        """
+        component = self.network.get_component(component_name)
+        if component is None:
+            raise KeyError(component_name)
+        return MappingProxyType(component.get_properties())
+
+    def get(self, component_name, property_name, default=None):
+        component = self.network.get_component(component_name)
+        if component is None:
+            return default
+        return getattr(component, property_name, default)
+
+    def values(self, property_name, component_type=None):
+        """
+            The value of a property on every component which has it (or
+            only the components of a type).
+
+            :returns A dict of values keyed on component name.
+        """
+        return dict((c.name, getattr(c, property_name))
+                    for c in [self.network] + self.network.components
+                    if property_name in c._properties and
+                    (component_type is None or c.component_type == component_type))
+
+    def to_dict(self):
+        """
+            A copy of the values of every component, keyed on component name
+            then property name.
+        """
+        return dict((c.name, c.get_properties())
+                    for c in [self.network] + self.network.components)
+
+
 class Simulator(object):
 
     network = None
 
-    def __init__(self, network=None, record_time=False, progress=False, max_iterations=1):
+    def __init__(self, network=None, record_time=False, progress=False, max_iterations=1,
+                 cache=None, seed=None, record_history=True, trace=None, profile=None,
+                 memory=None, metrics=None):
         self.engines = []
+        # The engines which each engine depends on, as given to add_engine.
+        # Only used by start_async, which runs independent engines concurrently.
+        self.engine_dependencies = {}
         #User defined timeseps
         self.timesteps = []
+        # True to time the setup of each component and the run of each
+        # engine, or 'types' to time each type of component as a whole,
+        # which costs much less. See pynsim.timing.
         self.record_time = record_time
         self.network = network
         self.max_iterations = max_iterations
@@ -83,9 +158,45 @@ class Simulator(object):
         # in the network.timing property.
         self.timing = {'network': 0, 'nodes': 0, 'links': 0, 'institutions': 0,
                        'engines': {}}
+        # A pynsim.timing.Histogram of the run times of each engine, when
+        # record_time is True. See timing_summary().
+        self.latency = {}
 
         self.progress = progress
         self.current_timestep = None
+        # An optional pynsim.cache.ResultCache. If set, the results of a
+        # simulation are restored from the cache instead of being re-run
+        # when the same simulation has been run before.
+        self.cache = cache
+        # A root seed (or a pynsim.rng.RandomStreams) for the random number
+        # streams of each component and engine. See pynsim.rng.
+        self.seed = seed
+        self.random_streams = None
+        # If False, the history of the components only keeps the values of
+        # the last timestep, which engines read as the previous values. Use
+        # steps() to see them as they happen.
+        self.record_history = record_history
+        # A file name (or a pynsim.tracing.Tracer) to write a timeline of
+        # each run to. See pynsim.tracing.
+        self.trace = trace
+        self.tracer = None
+        # A pynsim.profiling.PhaseProfiler, to profile some of the engines,
+        # component types or the post processing.
+        self.profile = profile
+        # The PhaseProfiler, during the timesteps it covers.
+        self._profiling = None
+        # A pynsim.memory.MemoryMonitor, to report on the memory used by the
+        # simulation every so many timesteps.
+        self.memory = memory
+        # A pynsim.metrics.MetricsExporter, to serve live metrics of the run.
+        self.metrics = metrics
+        # Callbacks at points in the loop (see pynsim.hooks), and the
+        # functions bound from them for the current run.
+        self.hooks = Hooks()
+        self._hooks = self.hooks.bind()
+        # Makes the components of a subnetwork refer to their own network
+        # again after a run. See Network.bind_components.
+        self._unbind = None
 
     def __repr__(self):
         my_engines = ",".join([m.name for m in self.engines])
@@ -97,77 +208,556 @@ class Simulator(object):
         if self.network is None:
             raise RuntimeError("No network to simulate!")
 
-        if len(self.timesteps) == 0:
+        # The timesteps may be an endless iterator, when stepping through them
+        if hasattr(self.timesteps, '__len__') and len(self.timesteps) == 0:
             raise RuntimeError("No timesteps specified!")
 
+        if self.seed is not None:
+            from pynsim.rng import RandomStreams
+            if isinstance(self.seed, RandomStreams):
+                self.random_streams = self.seed
+                self.random_streams.reset()
+            else:
+                self.random_streams = RandomStreams(self.seed)
+            # Components refer to the network they were added to, which may
+            # be the parent of the network being simulated.
+            network = self.network
+            while network is not None:
+                network.random_streams = self.random_streams
+                network = network.parent
+            for engine in self.engines:
+                engine.rng = self.random_streams.engine(engine)
+
         for engine in self.engines:
             logging.debug("Setting up engine %s", engine.name)
             engine.initialise()
 
     def start(self, initialise=True):
-        # Provide dummy function to simplify code below
-        def tqdm(iterable, **kwargs):
-            return iterable
+        cache_key, cache_marks = self._prepare(initialise)
+        if cache_key is not None and cache_marks is None:
+            return
+
+        self._simulate()
+
+        self._finish(cache_key, cache_marks)
+
+    async def start_async(self, initialise=True):
+        """
+            Run the simulation in an asyncio event loop, for engines with an
+            'async def run()' and components with an 'async def setup()':
+
+                asyncio.run(simulator.start_async())
+
+            The components are set up in the same order as in start(), the
+            setup coroutines of each run of components of the same type being
+            awaited concurrently.
+            In each iteration, the engines run in waves: an engine added with
+            depends_on runs as soon as those engines have finished, concurrently
+            with any others which are ready. Engines added without depends_on
+            wait for all the engines added before them, as they would in start().
+            Synchronous engines and setup functions are called as usual, so
+            they run unchanged (but block the loop while they run).
+        """
+        cache_key, cache_marks = self._prepare(initialise)
+        if cache_key is not None and cache_marks is None:
+            return
+
+        await self._simulate_async()
+
+        self._finish(cache_key, cache_marks)
+
+    def steps(self, initialise=True):
+        """
+            Run the simulation one timestep at a time, yielding a StepView of
+            the network after each timestep:
+
+                for step in simulator.steps():
+                    dashboard.update(step.values('S'))
+
+            The simulation only moves on when the next step is requested. With
+            record_history=False only the last timestep is kept in memory, so
+            the timesteps can be an endless iterator. The result cache is
+            not used.
+        """
+        self._prepare(initialise, use_cache=False)
+        #Closing this generator closes _steps, which tears down the run
+        yield from self._steps()
+        logging.debug("Finished")
+
+    async def steps_async(self, initialise=True):
+        """
+            The asynchronous version of steps(), running as start_async does:
+
+                async for step in simulator.steps_async():
+                    ...
+        """
+        self._prepare(initialise, use_cache=False)
+        steps = self._steps_async()
+        try:
+            async for step in steps:
+                yield step
+        finally:
+            await steps.aclose()
+        logging.debug("Finished")
+
+    def _prepare(self, initialise, use_cache=True):
+        """
+            Get ready to run: restore the results from the cache if possible,
+            otherwise initialise the simulation.
+
+            :returns (cache key, cache marks). The marks are None if the
+                     results were restored from the cache.
+        """
+        for engine in self.engines:
+            self.timing['engines'][engine.name] = 0
+            self.latency[engine.name] = Histogram()
+
+        cache_key = cache_marks = None
+        if self.cache is not None and use_cache is True:
+            if self.record_history is False:
+                logging.warning("The result cache is not used when record_history is False.")
+            else:
+                cache_key = self.cache.key(self)
+                if self.cache.load(cache_key, self.network):
+                    logging.info("Simulation results restored from cache (%s)", cache_key)
+                    return cache_key, None
+                cache_marks = self.cache.mark(self.network)
+
+        logging.info("Starting simulation")
+
+        self._hooks = self.hooks.bind()
+        if self.network.parent is not None:
+            self._unbind = self.network.bind_components()
+        if self.trace is not None:
+            self._open_tracer()
+        if self.memory is not None:
+            self.memory.start()
+        if self.metrics is not None:
+            self.metrics.start(self)
+
+        if initialise is True:
+            try:
+                self.initialise()
+            except:
+                self._close_resources()
+                raise
+
+        return cache_key, cache_marks
+
+    def _open_tracer(self):
+        from pynsim.tracing import Tracer
+        if isinstance(self.trace, Tracer):
+            self.tracer = self.trace
+        else:
+            self.tracer = Tracer(self.trace, name=self.network.name)
+        self.tracer.open()
+
+    def _finish(self, cache_key, cache_marks):
+        if cache_key is not None:
+            self.cache.save(cache_key, self.network, cache_marks)
+
+        logging.debug("Finished")
+
+    def _progress(self, iterable):
+        """
+            Wrap an iterable in a tqdm progress bar, if progress is enabled.
+        """
         if self.progress:
             # If tqdm is installed, use tqdm for printing a progressbar
             try:
                 from tqdm import tqdm
+                total = len(self.timesteps) if hasattr(self.timesteps, '__len__') else None
+                return tqdm(iterable, total=total)
             except ImportError:
                 logging.warn("Please install 'tqdm' to display progress bar.")
+        return iterable
 
-        for engine in self.engines:
-            self.timing['engines'][engine.name] = 0
+    def _simulate(self):
+        """
+            Run every timestep of the simulation, then tear down the engines.
+        """
+        for _ in self._steps():
+            pass
 
-        logging.info("Starting simulation")
+    async def _simulate_async(self):
+        """
+            Run every timestep of the simulation in the event loop, then tear
+            down the engines.
+        """
+        async for _ in self._steps_async():
+            pass
 
-        if initialise is True:
-            self.initialise()
+    def _steps(self):
+        """
+            Run the timesteps, yielding a StepView after each one, then tear
+            down the engines, also if the loop stops early or fails.
+        """
+        try:
+            tracer = self.tracer
+            hooks = self._hooks
+            for idx, timestep in self._progress(enumerate(self.timesteps)):
+                if tracer is not None:
+                    tracer.begin('timestep', 'timestep', {'index': idx, 'timestep': timestep})
+                if hooks.before_timestep is not None:
+                    hooks.before_timestep(self, idx, timestep)
+                if self.profile is not None:
+                    self._profiling = self.profile if self.profile.covers(idx) else None
+                if hooks.before_setup is not None:
+                    hooks.before_setup(self, idx, timestep)
+                self._setup_timestep(idx, timestep)
+                if hooks.after_setup is not None:
+                    hooks.after_setup(self, idx, timestep)
+                iterations = self._run_engines(idx, timestep)
+                self._post_process()
+                if hooks.after_post_process is not None:
+                    hooks.after_post_process(self, idx, timestep)
+                if self.memory is not None and self.memory.due(idx):
+                    self.memory.sample(self, idx)
+                if self.metrics is not None:
+                    self.metrics.timestep_done(self, idx, iterations)
+                if hooks.after_timestep is not None:
+                    hooks.after_timestep(self, idx, timestep)
+                if tracer is not None:
+                    tracer.end('timestep', 'timestep')
+                yield StepView(self.network, idx, timestep)
+        finally:
+            self._teardown()
+
+    async def _steps_async(self):
+        try:
+            waves = self._engine_waves()
+            tracer = self.tracer
+            hooks = self._hooks
+            for idx, timestep in self._progress(enumerate(self.timesteps)):
+                if tracer is not None:
+                    tracer.begin('timestep', 'timestep', {'index': idx, 'timestep': timestep})
+                if hooks.before_timestep is not None:
+                    hooks.before_timestep(self, idx, timestep)
+                if self.profile is not None:
+                    self._profiling = self.profile if self.profile.covers(idx) else None
+                if hooks.before_setup is not None:
+                    hooks.before_setup(self, idx, timestep)
+                await self._setup_timestep_async(idx, timestep)
+                if hooks.after_setup is not None:
+                    hooks.after_setup(self, idx, timestep)
+                iterations = await self._run_engines_async(idx, timestep, waves)
+                self._post_process()
+                if hooks.after_post_process is not None:
+                    hooks.after_post_process(self, idx, timestep)
+                if self.memory is not None and self.memory.due(idx):
+                    self.memory.sample(self, idx)
+                if self.metrics is not None:
+                    self.metrics.timestep_done(self, idx, iterations)
+                if hooks.after_timestep is not None:
+                    hooks.after_timestep(self, idx, timestep)
+                if tracer is not None:
+                    tracer.end('timestep', 'timestep')
+                yield StepView(self.network, idx, timestep)
+        finally:
+            self._teardown()
+
+    def _post_process(self):
+        """
+            Record the history of the network, or with record_history=False,
+            only the values of this timestep.
+        """
+        profile = None
+        if self._profiling is not None:
+            profile = self._profiling.post_processing()
+        if self.tracer is None and profile is None:
+            self.network.post_process()
+            if self.record_history is False:
+                self.network.trim_history()
+            return
 
-        for idx, timestep in tqdm(enumerate(self.timesteps),
-                                  total=len(self.timesteps)):
+        t = perf_counter_ns()
+        if profile is not None:
+            profile.enable()
+        try:
+            self.network.post_process()
+            if self.record_history is False:
+                self.network.trim_history()
+        finally:
+            if profile is not None:
+                profile.disable()
+        if self.tracer is not None:
+            self.tracer.complete('post_process', 'history', t, perf_counter_ns())
+
+    def _setup_timestep(self, idx, timestep):
+        """
+            Set the current timestep and call the setup function of the
+            network and each of its components.
+        """
+        self.current_timestep = timestep
+
+        self.network.set_timestep(timestep, idx)
+
+        t = perf_counter_ns()
+        self.network.setup(timestep)
+        t_end = perf_counter_ns()
+        self.timing['network'] += (t_end - t) / 1e9
+
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.complete('network setup', 'setup', t, t_end)
+
+        profiles = None
+        if self._profiling is not None:
+            profiles = self._profiling.setup()
+        # Tracing needs the time of each component's setup
+        setup_timing = self.network.setup_components(timestep,
+                                                     True if tracer is not None else self.record_time,
+                                                     profiles=profiles)
+        if tracer is not None:
+            tracer.component_spans(self.network.timer)
+
+        if self.record_time:
+            self.timing['institutions'] += setup_timing['institutions']
+            self.timing['links']        += setup_timing['links']
+            self.timing['nodes']        += setup_timing['nodes']
+
+    async def _setup_timestep_async(self, idx, timestep):
+        """
+            As _setup_timestep, awaiting any setup coroutines.
+        """
+        self.current_timestep = timestep
+
+        self.network.set_timestep(timestep, idx)
+
+        t = perf_counter_ns()
+        result = self.network.setup(timestep)
+        if inspect.isawaitable(result):
+            await result
+        t_end = perf_counter_ns()
+        self.timing['network'] += (t_end - t) / 1e9
+
+        tracer = self.tracer
+        if tracer is not None:
+            tracer.complete('network setup', 'setup', t, t_end)
+
+        profiles = None
+        if self._profiling is not None:
+            profiles = self._profiling.setup()
+        setup_timing = await self.network.setup_components_async(timestep, self.record_time,
+                                                                 profiles=profiles)
+        if tracer is not None:
+            tracer.component_spans(self.network.timer)
+
+        if self.record_time:
+            self.timing['institutions'] += setup_timing['institutions']
+            self.timing['links']        += setup_timing['links']
+            self.timing['nodes']        += setup_timing['nodes']
+
+    def _run_engines(self, idx, timestep):
+        """
+            Cycle through the engines up to the maximum number of iterations.
 
-            self.current_timestep = timestep
+            :returns The number of iterations run.
+        """
+        # The context manager catches any `StopIteration` exceptions from the engines
+        # and terminates the context.
+        tracer = self.tracer
+        metrics = self.metrics
+        timed = self.record_time or tracer is not None or metrics is not None
+        profiling = self._profiling
+        before_engine = self._hooks.before_engine
+        after_engine = self._hooks.after_engine
+        iterations = 0
+        with EngineIterator(self, max_iterations=self.max_iterations) as manager:
+            for iteration, engine in manager:
+                iterations = iteration
+                engine.iteration = iteration
+                engine.timestep = timestep
+                engine.timestep_idx = idx
+                if before_engine is not None:
+                    before_engine(self, engine)
+
+                if timed:
+                    t = perf_counter_ns()
+                profile = profiling.engine(engine) if profiling is not None else None
+                if profile is None:
+                    result = engine.run()
+                else:
+                    profile.enable()
+                    try:
+                        result = engine.run()
+                    finally:
+                        profile.disable()
+                if inspect.isawaitable(result):
+                    result.close()
+                    raise RuntimeError("Engine %s is asynchronous. Please use "
+                                       "Simulator.start_async." % engine.name)
+
+                if timed:
+                    t_end = perf_counter_ns()
+                    if self.record_time:
+                        self._record_engine_time(engine, t_end - t)
+                    if tracer is not None:
+                        tracer.complete(engine.name, 'engine', t, t_end, {'iteration': iteration})
+                    if metrics is not None:
+                        metrics.engine_done(engine.name, t_end - t)
 
-            self.network.set_timestep(timestep, idx)
+                if after_engine is not None:
+                    after_engine(self, engine)
 
-            logging.debug("Setting up network")
-            t = time.time()
-            self.network.setup(timestep)
-            self.timing['network'] += time.time() - t
+        return iterations
 
-            logging.debug("Setting up components")
-            setup_timing = self.network.setup_components(timestep, self.record_time)
+    def _engine_waves(self):
+        """
+            Group the engines into waves which can run concurrently, using
+            the dependencies given to add_engine.
+        """
+        from pynsim.topology import topological_waves
 
-            if self.record_time:
-                self.timing['institutions'] += setup_timing['institutions']
-                self.timing['links']        += setup_timing['links']
-                self.timing['nodes']        += setup_timing['nodes']
-
-            logging.debug("Starting engines")
-            # Cycle through the engines up to the maximum number of iterations
-            # The context manager catches any `StopIteration` exceptions from the engines
-            # and terminates the context.
-            with EngineIterator(self, max_iterations=self.max_iterations) as manager:
-                for iteration, engine in manager:
-                    logging.debug("Running engine %s", engine.name)
-                    if self.record_time:
-                        t = time.time()
+        dependencies = {}
+        for i, engine in enumerate(self.engines):
+            depends_on = self.engine_dependencies.get(id(engine))
+            if depends_on is None:
+                dependencies[i] = set(range(i))
+            else:
+                dependencies[i] = set(j for j, e in enumerate(self.engines)
+                                      if any(e is d for d in depends_on))
+        waves = topological_waves(dependencies)
+        return [[self.engines[i] for i in sorted(wave)] for wave in waves]
 
-                    engine.iteration = iteration
-                    engine.timestep = timestep
-                    engine.timestep_idx = idx
-                    engine.run()
+    async def _run_engines_async(self, idx, timestep, waves):
+        """
+            Run each wave of engines concurrently, up to the maximum number of
+            iterations. As in _run_engines, an engine raising StopIteration
+            stops the iterations for this timestep, once its wave has finished.
 
-                    if self.record_time:
-                        self.timing['engines'][engine.name] += time.time() - t
+            :returns The number of iterations run.
+        """
+        tracer = self.tracer
+        for iteration in range(1, self.max_iterations + 1):
+            for wave in waves:
+                if tracer is not None:
+                    tracer.begin('engines', 'engine', {'iteration': iteration,
+                                                       'engines': [e.name for e in wave]})
+                stopped = await asyncio.gather(*[self._run_engine_async(engine, idx, timestep, iteration)
+                                                 for engine in wave])
+                if tracer is not None:
+                    tracer.end('engines', 'engine')
+                if any(stopped):
+                    return iteration
+        return self.max_iterations if waves else 0
+
+    async def _run_engine_async(self, engine, idx, timestep, iteration):
+        """
+            Run one engine, awaiting it if it is asynchronous.
 
-            self.network.post_process()
+            :returns True if the engine stopped the iterations.
+        """
+        engine.iteration = iteration
+        engine.timestep = timestep
+        engine.timestep_idx = idx
+        if self._hooks.before_engine is not None:
+            self._hooks.before_engine(self, engine)
+
+        t = perf_counter_ns()
+        profile = self._profiling.engine(engine) if self._profiling is not None else None
+        try:
+            if profile is None:
+                result = engine.run()
+            else:
+                profile.enable()
+                try:
+                    result = engine.run()
+                finally:
+                    profile.disable()
+            if inspect.isawaitable(result):
+                await result
+        except StopIteration:
+            return True
+        except RuntimeError as e:
+            # A StopIteration raised inside a coroutine becomes a RuntimeError
+            if isinstance(e.__cause__, StopIteration):
+                return True
+            raise
+        finally:
+            t_end = perf_counter_ns()
+            if self.record_time:
+                self._record_engine_time(engine, t_end - t)
+            if self.metrics is not None:
+                self.metrics.engine_done(engine.name, t_end - t)
+            if self.tracer is not None:
+                # Engines in a wave overlap, so each has its own row. See
+                # pynsim.tracing.Tracer.
+                self.tracer.complete(engine.name, 'engine', t, t_end, {'iteration': iteration},
+                                     tid=1 + self.engines.index(engine))
+
+        # As in _run_engines, not called for an engine which stopped the iterations
+        if self._hooks.after_engine is not None:
+            self._hooks.after_engine(self, engine)
+        return False
 
+    def _record_engine_time(self, engine, ns):
+        self.timing['engines'][engine.name] = self.timing['engines'].get(engine.name, 0) + ns / 1e9
+        histogram = self.latency.get(engine.name)
+        if histogram is None:
+            histogram = self.latency[engine.name] = Histogram()
+        histogram.add(ns)
+
+    def memory_report(self):
+        """
+            The network's memory report (see Network.memory_report), with
+            the bytes held by each engine in 'engines'.
+        """
+        from pynsim.memory import memory_report, deep_size
+
+        seen = set()
+        report = memory_report(self.network, seen)
+        report['engines'] = {}
         for engine in self.engines:
-            logging.debug("Teearing Down engine %s", engine.name)
-            engine.teardown()
-        
-        logging.debug("Finished")
+            size = deep_size(dict((k, v) for k, v in vars(engine).items() if k != 'target'), seen)
+            report['engines'][engine.name] = report['engines'].get(engine.name, 0) + size
+            report['total'] += size
+        return report
+
+    def timing_summary(self):
+        """
+            The latency of each engine run and of the setup function of each
+            type of component, when record_time is True: their count, total,
+            mean, and 50th, 95th and 99th percentiles, in seconds. With
+            record_time='types', only the total time of each type is known.
+
+            :returns {'engines': {engine name: summary},
+                      'components': {component_type: summary},
+                      'types': {component_type: total seconds}}
+        """
+        timer = self.network.timer
+        types = dict((k, h.total / 1e9) for k, h in timer.histograms.items() if h.count)
+        types.update((k, ns / 1e9) for k, ns in timer.type_totals.items())
+        return {'engines': dict((k, h.summary()) for k, h in self.latency.items()),
+                'components': dict((k, h.summary()) for k, h in timer.histograms.items()),
+                'types': types}
+
+    def _teardown(self):
+        try:
+            for engine in self.engines:
+                logging.debug("Teearing Down engine %s", engine.name)
+                engine.teardown()
+        finally:
+            self._close_resources()
+
+    def _close_resources(self):
+        """
+            Close the tracer, profiler, memory monitor and metrics exporter
+            which _prepare started, and unbind the components of a
+            subnetwork.
+        """
+        if self._unbind is not None:
+            self._unbind()
+            self._unbind = None
+        if self.tracer is not None:
+            self.tracer.close()
+        if self.profile is not None:
+            self._profiling = None
+            self.profile.dump()
+        if self.memory is not None:
+            self.memory.stop()
+        if self.metrics is not None:
+            self.metrics.stop()
 
     def plot_timing(self):
         """
@@ -254,18 +844,79 @@ class Simulator(object):
     def stop(self):
         pass
 
-    def add_engine(self, engine, depends_on=[]):
+    def add_hook(self, point, callback):
+        """
+            Call callback at a point in the simulation loop, such as
+            'after_timestep'. See pynsim.hooks for the hook points.
+        """
+        return self.hooks.add(point, callback)
+
+    def add_engine(self, engine, depends_on=None):
+        """
+            Add an engine, to run after the engines already added. depends_on
+            is the engine, or list of engines, which this engine needs to run
+            after. It only matters to start_async, which runs an engine with
+            depends_on as soon as they are done (an empty list means it can
+            run straight away), rather than after every engine added before it.
+        """
+        if depends_on is not None:
+            if type(depends_on) != list:
+                depends_on = [depends_on]
 
-        if type(depends_on) != list:
-            depends_on = [depends_on]
+            for dependant in depends_on:
+                if not any(dependant is e for e in self.engines):
+                    raise Exception("Engine %s depends on %s but it is not in the"
+                                    " list of engines." % (engine.name, dependant.name))
 
-        for dependant in depends_on:
-            if dependant not in self.engines:
-                raise Exception("Engine %s depends on %s but it is not in the"
-                                " list of engines.")
+            self.engine_dependencies[id(engine)] = depends_on
 
         self.engines.append(engine)
 
+    def pruned(self, targets):
+        """
+            Create a simulator which only simulates the parts of the network
+            which can affect some nodes or links: their upstream closure, as
+            found by Network.upstream_closure. The values at the targets are
+            the same as when the whole network is simulated, as long as the
+            engines only use values from upstream of each node.
+
+            The subnetwork shares its components with the whole network.
+            Engines which target the whole network are copied (shallowly) to
+            target the subnetwork; engines targeting components outside the
+            subnetwork are left out.
+        """
+        subnetwork = self.network.upstream_closure(targets)
+        members = set(id(c) for c in [subnetwork] + subnetwork.components)
+
+        simulator = copy.copy(self)
+        simulator.network = subnetwork
+        simulator.engines = []
+        simulator.engine_dependencies = {}
+        simulator.timing = {'network': 0, 'nodes': 0, 'links': 0, 'institutions': 0,
+                            'engines': {}}
+        simulator.latency = {}
+
+        copies = {}
+        for engine in self.engines:
+            if engine.target is self.network:
+                engine_copy = copy.copy(engine)
+                engine_copy.target = subnetwork
+                engine_copy.clear_memo()
+            elif engine.target is None or id(engine.target) in members:
+                engine_copy = engine
+            else:
+                logging.debug("Leaving out engine %s: its target is not upstream "
+                              "of the targets.", engine.name)
+                continue
+            copies[id(engine)] = engine_copy
+
+            depends_on = self.engine_dependencies.get(id(engine))
+            if depends_on is not None:
+                depends_on = [copies[id(d)] for d in depends_on if id(d) in copies]
+            simulator.add_engine(engine_copy, depends_on=depends_on)
+
+        return simulator
+
     def add_network(self, network):
         self.network = network
 
@@ -279,7 +930,7 @@ class Simulator(object):
         if timesteps is not None:
             # Check if iterable
             try:
-                _ = [t for t in timesteps]
+                iter(timesteps)
                 self.timesteps = timesteps
             except TypeError:
                 logging.critical("Cannot set timesteps. Timesteps must be "
@@ -0,0 +1,207 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    Graph algorithms on the nodes and links of a network.
+"""
+
+
+def connected_components(network, ignore_link_types=None):
+    """
+        Split the nodes of a network into weakly connected components, i.e.
+        groups of nodes which are connected by links in either direction.
+
+        args:
+            ignore_link_types list: Links of these component types are treated
+                                    as if they were not there.
+
+        :returns A list of lists of nodes, in the order of network.nodes.
+    """
+    ignore_link_types = set(ignore_link_types or [])
+
+    #Union-find over node positions
+    index = dict((id(n), i) for i, n in enumerate(network.nodes))
+    parents = list(range(len(network.nodes)))
+
+    def find(i):
+        while parents[i] != i:
+            parents[i] = parents[parents[i]]
+            i = parents[i]
+        return i
+
+    for link in network.links:
+        if link.component_type in ignore_link_types:
+            continue
+        a = find(index[id(link.start_node)])
+        b = find(index[id(link.end_node)])
+        if a != b:
+            parents[max(a, b)] = min(a, b)
+
+    components = {}
+    order = []
+    for i, node in enumerate(network.nodes):
+        root = find(i)
+        if root not in components:
+            components[root] = []
+            order.append(root)
+        components[root].append(node)
+
+    return [components[root] for root in order]
+
+
+def topological_waves(dependencies):
+    """
+        Group the keys of a dependency graph into waves, where every key in
+        a wave depends only on keys in earlier waves.
+
+        args:
+            dependencies dict: Maps each key to the set of keys it depends on.
+
+        :returns A list of lists of keys.
+    """
+    remaining = dict((k, set(v)) for k, v in dependencies.items())
+    waves = []
+    done = set()
+    while remaining:
+        wave = [k for k, deps in remaining.items() if deps <= done]
+        if len(wave) == 0:
+            raise RuntimeError("Cannot order %s: there is a cycle in the "
+                               "dependencies." % sorted(remaining.keys(), key=str))
+        for k in wave:
+            del remaining[k]
+        done.update(wave)
+        waves.append(wave)
+    return waves
+
+
+def topological_levels(network, ignore_link_types=None):
+    """
+        Group the nodes of a network into levels, so that every link goes
+        from a node in an earlier level to a node in a later one. Head nodes
+        (with no upstream links) are in the first level. Each node is placed
+        in the earliest level possible.
+
+        args:
+            ignore_link_types list: Links of these component types are treated
+                                    as if they were not there.
+
+        :returns A list of lists of nodes, in the order of network.nodes
+                 within each level.
+    """
+    ignore_link_types = set(ignore_link_types or [])
+
+    nodes = network.nodes
+    index = dict((id(n), i) for i, n in enumerate(nodes))
+    in_degree = [0] * len(nodes)
+    downstream = [[] for _ in nodes]
+    for link in network.links:
+        if link.component_type in ignore_link_types:
+            continue
+        end = index[id(link.end_node)]
+        downstream[index[id(link.start_node)]].append(end)
+        in_degree[end] += 1
+
+    #Kahn's algorithm, one level at a time
+    level = [i for i, d in enumerate(in_degree) if d == 0]
+    levels = []
+    placed = 0
+    while level:
+        levels.append([nodes[i] for i in level])
+        placed += len(level)
+        next_level = []
+        for i in level:
+            for j in downstream[i]:
+                in_degree[j] -= 1
+                if in_degree[j] == 0:
+                    next_level.append(j)
+        level = sorted(next_level)
+
+    if placed < len(nodes):
+        cycle = [nodes[i].name for i, d in enumerate(in_degree) if d > 0]
+        raise RuntimeError("Cannot order the nodes of %s: there is a cycle "
+                           "through %s." % (network.name, cycle))
+
+    return levels
+
+
+def upstream_closure(network, targets):
+    """
+        Find everything in a network which can affect the given nodes and
+        links: the targets, every node and link upstream of them, and the
+        institutions which any of those belong to. An institution can act
+        on all its members together (a total demand, a shared allocation),
+        so all its members are included too, with everything upstream of
+        them and the institutions they belong to, until nothing more is
+        added. The end node of a target (or member) link is included, so
+        the link is still connected, but not the other nodes upstream of it.
+
+        args:
+            targets list: Nodes or links, or their names.
+
+        :returns A tuple of (nodes, links, institutions), in network order.
+    """
+    nodes = set()
+    links = set()
+    to_visit = []
+    for target in targets:
+        if isinstance(target, str):
+            name = target
+            target = network.get_node(name) or network.get_link(name)
+            if target is None:
+                raise Exception("No node or link called %s in network %s" % (name, network.name))
+        if target.base_type == 'link':
+            links.add(id(target))
+            nodes.add(id(target.end_node))
+            to_visit.append(target.start_node)
+        else:
+            to_visit.append(target)
+
+    #Only follow links which are in this network
+    in_network = set(id(l) for l in network.links)
+    expanded = set()
+    included = set()
+    while True:
+        while to_visit:
+            node = to_visit.pop()
+            nodes.add(id(node))
+            if id(node) in expanded:
+                continue
+            expanded.add(id(node))
+            for link in node.in_links:
+                if id(link) in in_network:
+                    links.add(id(link))
+                    to_visit.append(link.start_node)
+
+        members = nodes | links
+        new = [i for i in network.institutions if id(i) not in included
+               and any(id(c) in members for c in i.nodes + i.links)]
+        if not new:
+            break
+        for institution in new:
+            included.add(id(institution))
+            to_visit.extend(institution.nodes)
+            for link in institution.links:
+                if id(link) in in_network:
+                    links.add(id(link))
+                    nodes.add(id(link.end_node))
+                    to_visit.append(link.start_node)
+
+    institutions = [i for i in network.institutions if id(i) in included]
+
+    return ([n for n in network.nodes if id(n) in nodes],
+            [l for l in network.links if id(l) in links],
+            institutions)
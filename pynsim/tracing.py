@@ -0,0 +1,241 @@
+#    (c) Copyright 2014, University of Manchester
+#
+#    This file is part of PyNSim.
+#
+#    PyNSim is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU General Public License as published by
+#    the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    PyNSim is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU General Public License for more details.
+#
+#    You should have received a copy of the GNU General Public License
+#    along with PyNSim.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+    A timeline of a simulation, which can be opened in chrome://tracing,
+    https://ui.perfetto.dev or https://www.speedscope.app:
+
+        s = Simulator(network, trace='run.trace.json')
+        s.start()
+
+    The timeline has a span for each timestep, containing the network's
+    setup, the setup of each run of components of the same type, each
+    engine run (with its iteration) and the post processing which records
+    the history.
+
+    Events are kept in a fixed size buffer, which is written to the file
+    whenever it fills up, so long runs can be traced without running out of
+    memory. A chrome trace is a JSON array of events, which chrome can still
+    open if the run was killed before the trace was closed.
+"""
+
+import json
+from contextlib import contextmanager
+from time import perf_counter_ns
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+class Tracer(object):
+    """
+        Writes spans to a Chrome Trace Event or speedscope file.
+
+        args:
+            path string: The file to write.
+            format string: 'chrome' or 'speedscope'. Defaults to speedscope
+                           if the path ends in '.speedscope.json', otherwise
+                           chrome.
+            buffer_size int: The number of events to keep in memory before
+                             writing them to the file.
+            name string: The name of the timeline.
+
+        Spans on other threads than 0 (tid) are only written to chrome
+        traces, as a speedscope timeline must be properly nested.
+    """
+
+    def __init__(self, path, format=None, buffer_size=10000, name="pynsim"):
+        if format is None:
+            format = 'speedscope' if path.endswith('.speedscope.json') else 'chrome'
+        if format not in ('chrome', 'speedscope'):
+            raise Exception("Unknown trace format %s. Use 'chrome' or 'speedscope'." % format)
+        self.path = path
+        self.format = format
+        self.buffer_size = buffer_size
+        self.name = name
+
+        self._file = None
+        self._buffer = [None] * buffer_size
+        self._n = 0
+        self._written = 0
+        self._origin = None
+        self._last = 0
+        self._frames = {}
+        self._stack = []
+
+    def __repr__(self):
+        return "Tracer(path=%s, format=%s)" % (self.path, self.format)
+
+    @property
+    def is_open(self):
+        return self._file is not None
+
+    def open(self):
+        """
+            Start a new timeline, replacing the file if it exists.
+        """
+        self.close()
+        self._file = open(self.path, 'w')
+        self._origin = perf_counter_ns()
+        self._last = 0
+        self._written = 0
+        self._frames = {}
+        self._stack = []
+
+        if self.format == 'chrome':
+            self._file.write('[\n')
+            self._add(('M', 'process_name', '', None, 0, {'name': self.name}))
+        else:
+            self._file.write('{"$schema": %s, "exporter": "pynsim", "name": %s, '
+                             '"activeProfileIndex": 0, "profiles": [{"type": "evented", '
+                             '"name": %s, "unit": "nanoseconds", "startValue": 0, "events": [\n'
+                             % (json.dumps(SPEEDSCOPE_SCHEMA), json.dumps(self.name),
+                                json.dumps(self.name)))
+
+    def close(self):
+        """
+            Write the remaining events and finish the file.
+        """
+        if self._file is None:
+            return
+        if self.format == 'speedscope':
+            #Spans which were never ended end now, so the timeline nests
+            for name in reversed(self._stack):
+                self._add(('E', name, '', self._last + self._origin, 0, None))
+        self.flush()
+
+        if self.format == 'chrome':
+            self._file.write('\n]\n')
+        else:
+            frames = sorted(self._frames.items(), key=lambda f: f[1])
+            self._file.write('\n], "endValue": %s}], "shared": {"frames": %s}}\n'
+                             % (self._last, json.dumps([{'name': name} for name, _ in frames])))
+        self._file.close()
+        self._file = None
+
+    def flush(self):
+        """
+            Write the buffered events to the file.
+        """
+        if self._file is None or self._n == 0:
+            return
+        lines = []
+        for event in self._buffer[:self._n]:
+            line = self._format(event)
+            if line is not None:
+                lines.append(line)
+        if lines:
+            if self._written > 0:
+                self._file.write(',\n')
+            self._file.write(',\n'.join(lines))
+            self._written += len(lines)
+        self._file.flush()
+        self._buffer[:self._n] = [None] * self._n
+        self._n = 0
+
+    def _add(self, event):
+        self._buffer[self._n] = event
+        self._n += 1
+        if self._n == self.buffer_size:
+            self.flush()
+
+    def _format(self, event):
+        phase, name, category, ts, tid, args = event
+        if self.format == 'chrome':
+            data = {'ph': phase, 'name': name, 'pid': 0, 'tid': tid}
+            if category:
+                data['cat'] = category
+            if phase == 'X':
+                data['ts'] = (ts - self._origin) / 1000.0
+                data['dur'] = args.pop('_dur') / 1000.0
+            elif phase != 'M':
+                data['ts'] = (ts - self._origin) / 1000.0
+            if args:
+                data['args'] = args
+            return json.dumps(data, default=str)
+
+        if tid != 0 or phase == 'M':
+            return None
+        at = ts - self._origin
+        self._last = max(self._last, at)
+        frame = self._frames.setdefault(name, len(self._frames))
+        if phase == 'X':
+            end = at + args['_dur']
+            self._last = max(self._last, end)
+            return '{"type": "O", "frame": %s, "at": %s},\n{"type": "C", "frame": %s, "at": %s}' \
+                % (frame, at, frame, end)
+        return '{"type": "%s", "frame": %s, "at": %s}' % ('O' if phase == 'B' else 'C', frame, at)
+
+    def begin(self, name, category='', args=None, ts=None):
+        """
+            Start a span. Spans on a thread must be ended in the reverse of
+            the order they were started.
+        """
+        if ts is None:
+            ts = perf_counter_ns()
+        self._stack.append(name)
+        self._add(('B', name, category, ts, 0, args))
+
+    def end(self, name, category='', ts=None):
+        """
+            End the span started last.
+        """
+        if ts is None:
+            ts = perf_counter_ns()
+        if self._stack:
+            self._stack.pop()
+        self._last = max(self._last, ts - self._origin)
+        self._add(('E', name, category, ts, 0, None))
+
+    def complete(self, name, category, start, end, args=None, tid=0):
+        """
+            Add a span which has already finished, from its start and end
+            (perf_counter_ns) times. It must not contain any other span
+            which has not been added yet.
+        """
+        args = dict(args) if args else {}
+        args['_dur'] = end - start
+        self._add(('X', name, category, start, tid, args))
+
+    @contextmanager
+    def span(self, name, category='', args=None):
+        """
+            A span around a block of code:
+
+                with tracer.span('load inputs'):
+                    ...
+        """
+        self.begin(name, category, args)
+        try:
+            yield
+        finally:
+            self.end(name, category)
+
+    def component_spans(self, timer):
+        """
+            Add a span for each run of components of the same type, from the
+            times recorded by a pynsim.timing.ComponentTimer.
+        """
+        stamps = timer.stamps
+        for component_type, first, last in timer.runs:
+            self.complete(component_type, 'setup', stamps[first], stamps[last],
+                          {'components': last - first})
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
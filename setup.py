@@ -18,7 +18,15 @@ setup(
         license = "GPLv3",
         keywords = "pynsim water hydraplatform",
         url = "http://packages.python.org/pynsim",
-        packages=find_packages(),
+        packages=find_packages(exclude=["benchmarks", "benchmarks.*"]),
+        install_requires=['numpy'],
+        extras_require={
+            #The allocation engine solves its linear programme with scipy
+            'allocation': ['scipy'],
+        },
+        entry_points={
+            'console_scripts': ['pynsim-bench = pynsim.bench.cli:main'],
+        },
         classifiers=[
             'Programming Language :: Python',
             'Programming Language :: Python :: Implementation :: PyPy',
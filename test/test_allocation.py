@@ -0,0 +1,133 @@
+from pynsim import Simulator, Network, Node, Link
+from pynsim.engines import AllocationEngine
+import unittest
+
+
+class Catchment(Node):
+    _properties = {'inflow': 0.0}
+
+    def setup(self, timestamp):
+        self.inflow = self._inflow[timestamp]
+
+
+class Reservoir(Node):
+    _properties = {'S': None, 'init_stor': 0.0, 'min_stor': 0.0,
+                   'max_stor': 30.0, 'carryover_penalty': -1.0}
+
+
+class Junction(Node):
+    _properties = {}
+
+
+class Demand(Node):
+    _properties = {'demand': 0.0, 'priority': 0.0, 'delivery': None}
+
+
+class Outlet(Node):
+    _properties = {'Q': None}
+
+
+class Channel(Link):
+    _properties = {'flow': None, 'cost': 0.0, 'max_flow': None}
+
+
+def build_network(inflows):
+    """
+        C -> R -> J -> D1
+                  | -> D2
+                  | -> Out
+    """
+    network = Network("Allocation test network")
+    catchment = Catchment(x=0, y=0, name="C")
+    catchment._inflow = inflows
+    reservoir = Reservoir(x=1, y=0, name="R")
+    junction = Junction(x=2, y=0, name="J")
+    d1 = Demand(x=3, y=1, name="D1", demand=80.0, priority=10.0)
+    d2 = Demand(x=3, y=0, name="D2", demand=50.0, priority=5.0)
+    out = Outlet(x=3, y=-1, name="Out")
+    network.add_nodes(catchment, reservoir, junction, d1, d2, out)
+    network.add_links(Channel(start_node=catchment, end_node=reservoir, name="C-R"),
+                      Channel(start_node=reservoir, end_node=junction, name="R-J"),
+                      Channel(start_node=junction, end_node=d1, name="J-D1"),
+                      Channel(start_node=junction, end_node=d2, name="J-D2"),
+                      Channel(start_node=junction, end_node=out, name="J-Out"))
+    return network
+
+
+def build_engine(network):
+    return AllocationEngine(network, storage_types=['Reservoir'],
+                            demand_types=['Demand'], boundary_types=['Outlet'])
+
+
+class AllocationEngineTest(unittest.TestCase):
+
+    def test_priorities(self):
+        """
+            Test that water goes to the highest priority demand first, then
+            to storage, then leaves the network.
+        """
+        network = build_network({0: 200.0, 1: 0.0, 2: 60.0})
+        engine = build_engine(network)
+        s = Simulator(network)
+        s.add_engine(engine)
+        s.set_timesteps(range(3))
+        s.start()
+
+        d1, d2 = network.get_node('D1'), network.get_node('D2')
+        assert d1._history['delivery'] == [80.0, 30.0, 60.0]
+        assert d2._history['delivery'] == [50.0, 0.0, 0.0]
+        assert network.get_node('R')._history['S'] == [30.0, 0.0, 0.0]
+        assert network.get_node('Out')._history['Q'] == [40.0, 0.0, 0.0]
+        assert engine.build_count == 1
+
+    def test_flowmult(self):
+        """
+            Test that losses along a link are applied at the end node.
+        """
+        network = build_network({0: 100.0})
+        network.get_link('J-D1').flowmult = 0.8
+        s = Simulator(network)
+        s.add_engine(build_engine(network))
+        s.set_timesteps([0])
+        s.start()
+
+        assert network.get_node('D1').delivery == 80.0
+        assert network.get_link('J-D1').flow == 100.0
+
+    def test_large_network(self):
+        """
+            Test that each timestep of a 10k node network is solved in well
+            under a second.
+        """
+        network = Network("Large allocation network")
+        previous = None
+        for i in range(5000):
+            catchment = Catchment(x=i, y=0, name="C%s" % i)
+            catchment._inflow = {0: 1.0, 1: 2.0}
+            demand = Demand(x=i, y=1, name="D%s" % i, demand=0.5, priority=1.0)
+            network.add_nodes(catchment, demand)
+            network.add_link(Channel(start_node=catchment, end_node=demand, name="CD%s" % i))
+            if previous is not None:
+                network.add_link(Channel(start_node=previous, end_node=catchment, name="CC%s" % i))
+            previous = catchment
+        out = Outlet(x=0, y=0, name="Out")
+        network.add_node(out)
+        network.add_link(Channel(start_node=previous, end_node=out, name="Out"))
+        assert len(network.nodes) == 10001
+
+        engine = AllocationEngine(network, demand_types=['Demand'], boundary_types=['Outlet'])
+        s = Simulator(network)
+        s.add_engine(engine)
+        s.set_timesteps(range(2))
+        s.start()
+
+        #The time of each timestep, not counting the model's build
+        timing = engine.timing
+        assert (timing['update'] + timing['solve'] + timing['extract']) / 2 < 0.5, timing
+        assert engine.build_count == 1
+        assert network.get_node('D4999').delivery == 0.5
+        assert abs(out.Q - 7500.0) < 1e-6
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,247 @@
+from pynsim import Simulator, Network, Node, Engine
+from pynsim.profiling import PhaseProfiler
+import asyncio
+import os
+import pstats
+import shutil
+import tempfile
+import time
+import unittest
+
+
+class ServiceNode(Node):
+    """
+        A node which gets its inflow from a (slow) model service.
+    """
+    _properties = {'inflow': None, 'result': None}
+
+    async def setup(self, timestamp):
+        await asyncio.sleep(0.05)
+        self.inflow = 10.0 * timestamp
+
+
+class PlainNode(Node):
+    _properties = {'inflow': None}
+
+    def setup(self, timestamp):
+        self.inflow = 1.0
+
+
+class LoggedServiceNode(Node):
+    _properties = {'inflow': None}
+
+    async def setup(self, timestamp):
+        self.network.log.append(('start', self.name))
+        await asyncio.sleep(0.01)
+        self.network.log.append(('end', self.name))
+        self.inflow = 1.0
+
+
+class LoggedNode(Node):
+    _properties = {'inflow': None}
+
+    def setup(self, timestamp):
+        self.network.log.append(('sync', self.name))
+        self.inflow = self.network.get_node('A1').inflow
+
+
+def read_service(timestamp):
+    return 10.0 * timestamp
+
+
+class ProfiledServiceNode(ServiceNode):
+    async def setup(self, timestamp):
+        await asyncio.sleep(0.01)
+        self.inflow = read_service(timestamp)
+
+
+class SolverEngine(Engine):
+    """
+        Waits for an external 'solver', then records the order it ran in.
+    """
+    def __init__(self, target, name, log, delay=0.05):
+        super(SolverEngine, self).__init__(target)
+        self.name = name
+        self.log = log
+        self.delay = delay
+
+    async def run(self):
+        self.log.append(('start', self.name, self.timestep))
+        await asyncio.sleep(self.delay)
+        self.log.append(('end', self.name, self.timestep))
+
+
+class SyncEngine(Engine):
+    def __init__(self, target, name, log):
+        super(SyncEngine, self).__init__(target)
+        self.name = name
+        self.log = log
+
+    def run(self):
+        self.log.append(('sync', self.name, self.timestep))
+        for n in self.target.nodes:
+            n.result = n.inflow
+
+
+class AsyncStopper(Engine):
+    def __init__(self, target):
+        super(AsyncStopper, self).__init__(target)
+        self.runs = 0
+
+    async def run(self):
+        self.runs += 1
+        await asyncio.sleep(0)
+        if self.iteration >= 2:
+            raise StopIteration()
+
+
+def build_network(n=4):
+    network = Network("Async test network")
+    for i in range(n):
+        network.add_node(ServiceNode(x=i, y=0, name="S%s" % i))
+    network.add_node(PlainNode(x=0, y=1, name="P"))
+    return network
+
+
+class AsyncSimulatorTest(unittest.TestCase):
+
+    def test_concurrent_setup(self):
+        """
+            The setup coroutines of the components overlap.
+        """
+        network = build_network(n=8)
+        s = Simulator(network)
+        s.set_timesteps(range(2))
+
+        t = time.time()
+        asyncio.run(s.start_async())
+        elapsed = time.time() - t
+
+        #8 nodes * 2 timesteps * 0.05s = 0.8s if they ran one after another.
+        assert elapsed < 0.5
+        assert network.get_node('S3')._history['inflow'] == [0.0, 10.0]
+        assert network.get_node('P')._history['inflow'] == [1.0, 1.0]
+
+    def test_setup_order(self):
+        """
+            The components are set up in the order of the network, only
+            runs of components of the same type overlapping.
+        """
+        network = Network("Order test network")
+        network.log = []
+        network.add_nodes(LoggedServiceNode(x=0, y=0, name="A1"),
+                          LoggedServiceNode(x=1, y=0, name="A2"),
+                          LoggedNode(x=2, y=0, name="P"),
+                          LoggedServiceNode(x=3, y=0, name="A3"))
+        s = Simulator(network)
+        s.set_timesteps([0])
+        asyncio.run(s.start_async())
+
+        assert network.log == [('start', 'A1'), ('start', 'A2'), ('end', 'A1'), ('end', 'A2'),
+                               ('sync', 'P'), ('start', 'A3'), ('end', 'A3')]
+        #P was set up after A1
+        assert network.get_node('P').inflow == 1.0
+
+    def test_setup_timing(self):
+        for record_time in (True, 'types'):
+            network = build_network(n=4)
+            s = Simulator(network, record_time=record_time)
+            s.set_timesteps(range(2))
+            asyncio.run(s.start_async())
+
+            summary = s.timing_summary()
+            assert summary['types']['PlainNode'] < 0.05
+            if record_time is True:
+                #Each coroutine is timed from its start to its end
+                assert network.timing['nodes']['S0'] >= 0.1
+                assert summary['types']['ServiceNode'] >= 0.4
+            else:
+                #The time of the run, in which the coroutines overlap
+                assert 0.1 <= summary['types']['ServiceNode'] < 0.3
+                assert s.timing['nodes'] >= 0.1
+
+    def test_setup_profiling(self):
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            network = Network("Profiling test network")
+            network.add_nodes(ProfiledServiceNode(x=0, y=0, name="S0"),
+                              ProfiledServiceNode(x=1, y=0, name="S1"),
+                              PlainNode(x=2, y=0, name="P"))
+            profile = PhaseProfiler(tmp_dir, component_types=['ProfiledServiceNode'])
+            s = Simulator(network, profile=profile)
+            s.set_timesteps(range(3))
+            asyncio.run(s.start_async())
+
+            stats = pstats.Stats(os.path.join(tmp_dir, 'setup-ProfiledServiceNode.pstats'))
+            assert sum(v[1] for k, v in stats.stats.items() if k[2] == 'read_service') == 6
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_engine_dependencies(self):
+        """
+            Engines with depends_on run as soon as their dependencies have
+            finished. Engines without it run after every earlier engine.
+        """
+        network = build_network(n=1)
+        log = []
+        a = SolverEngine(network, 'a', log)
+        b = SolverEngine(network, 'b', log)
+        c = SyncEngine(network, 'c', log)
+        d = SolverEngine(network, 'd', log)
+
+        s = Simulator(network)
+        s.add_engine(a)
+        s.add_engine(b, depends_on=[])
+        s.add_engine(c, depends_on=[a, b])
+        s.add_engine(d)
+        s.set_timesteps([0])
+        asyncio.run(s.start_async())
+
+        #a and b overlap, c waits for both, d waits for c.
+        assert log[:2] == [('start', 'a', 0), ('start', 'b', 0)]
+        assert log[4] == ('sync', 'c', 0)
+        assert log[5:] == [('start', 'd', 0), ('end', 'd', 0)]
+        assert network.get_node('S0').result == 0.0
+
+    def test_sync_engines_unchanged(self):
+        """
+            Synchronous engines give the same results in the async loop.
+        """
+        results = []
+        for use_async in (False, True):
+            network = Network("Sync test network")
+            network.add_node(PlainNode(x=0, y=0, name="P"))
+            log = []
+            s = Simulator(network, max_iterations=2)
+            s.add_engine(SyncEngine(network, 'x', log))
+            s.add_engine(SyncEngine(network, 'y', log))
+            s.set_timesteps(range(2))
+            if use_async:
+                asyncio.run(s.start_async())
+            else:
+                s.start()
+            results.append(log)
+
+        assert results[0] == results[1]
+
+    def test_stop_iteration(self):
+        network = build_network(n=1)
+        stopper = AsyncStopper(network)
+        s = Simulator(network, max_iterations=5)
+        s.add_engine(stopper)
+        s.set_timesteps(range(3))
+        asyncio.run(s.start_async())
+
+        assert stopper.runs == 6
+
+    def test_async_engine_needs_start_async(self):
+        network = Network("Async test network")
+        network.add_node(PlainNode(x=0, y=0, name="P"))
+        s = Simulator(network)
+        s.add_engine(SolverEngine(network, 'a', []))
+        s.set_timesteps([0])
+        self.assertRaises(RuntimeError, s.start)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+from pynsim.bench import Scenario, compare, format_table, load_results, save_results
+from pynsim.bench.cli import main
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+def run(argv):
+    out = io.StringIO()
+    with contextlib.redirect_stdout(out), contextlib.redirect_stderr(io.StringIO()):
+        code = main(argv)
+    return code, out.getvalue()
+
+
+def baseline(**values):
+    return {'mode': 'quick', 'benchmarks': dict(
+        (k, {'value': v, 'unit': 'seconds'}) for k, v in values.items())}
+
+
+class BenchTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_scenario(self):
+        calls = []
+
+        def prepare(n):
+            return (lambda: calls.append(n)), (lambda: calls.append('cleanup'))
+
+        scenario = Scenario('counting', prepare, dict(n=1), dict(n=2), tolerance=0.3)
+        result = scenario.run('full', 3)
+        #A warm up run, then 3
+        assert calls == [2, 'cleanup'] * 4
+        assert result['unit'] == 'seconds'
+        assert result['repeat'] == 3 and result['params'] == dict(n=2)
+        assert result['value'] <= result['median'] <= result['max']
+        assert result['tolerance'] == 0.3
+
+        memory = Scenario('memory', lambda: (lambda: [0.0] * 100000, None), {}, {},
+                          measure='peak').run('quick', 1)
+        assert memory['unit'] == 'bytes' and memory['value'] >= 800000
+
+        self.assertRaises(Exception, Scenario, 'x', prepare, {}, {}, measure='cpu')
+        self.assertRaises(Exception, scenario.run, 'medium', 1)
+
+    def test_compare(self):
+        base = baseline(simulation=1.0, construction=1.0, export=1.0, removed=1.0)
+        base['benchmarks']['export']['tolerance'] = 0.5
+        results = baseline(simulation=1.1, construction=1.3, export=1.3, added=1.0)['benchmarks']
+
+        rows = dict((r['name'], r) for r in compare(results, base))
+        assert rows['simulation']['status'] == 'ok'
+        assert rows['construction']['status'] == 'regression'
+        assert abs(rows['construction']['ratio'] - 1.3) < 1e-9
+        #Its own tolerance
+        assert rows['export']['status'] == 'ok'
+        assert rows['added']['status'] == 'new'
+        assert rows['removed']['status'] == 'missing'
+
+        rows = dict((r['name'], r) for r in compare(results, base, tolerance=0.05))
+        assert rows['simulation']['status'] == 'regression'
+        assert rows['export']['status'] == 'ok'
+
+        results['simulation']['value'] = 0.5
+        rows = dict((r['name'], r) for r in compare(results, base))
+        assert rows['simulation']['status'] == 'improvement'
+
+        table = format_table(compare(results, base)).splitlines()
+        assert table[0].split() == ['Benchmark', 'Baseline', 'Current', 'Ratio', 'Tolerance', 'Status']
+        assert table[2].split() == ['simulation', '1s', '500ms', '0.50', '20%', 'improvement']
+
+    def test_cli(self):
+        path = os.path.join(self.tmp_dir, 'baseline.json')
+        code, out = run(['--quick', '-k', '^(load|membership_memory)$', '-r', '1',
+                         '--save-baseline', path])
+        assert code == 0
+        document = load_results(path)
+        assert sorted(document['benchmarks']) == ['load', 'membership_memory']
+        assert document['benchmarks']['load']['tolerance'] == 0.5
+        assert 'membership_memory' in out
+
+        code, out = run(['-k', 'membership_memory', '-r', '1', '-b', path])
+        assert code == 0
+        assert 'load' not in out
+
+        #A baseline far faster than this run
+        document['benchmarks']['membership_memory']['value'] /= 2
+        save_results(path, document)
+        code, out = run(['-k', 'membership_memory', '-r', '1', '-b', path])
+        assert code == 1
+        assert '1 regressed: membership_memory' in out
+
+        #The sizes of the full mode are not comparable
+        assert run(['--full', '-k', 'load', '-b', path])[0] == 2
+
+        with open(path, 'w') as f:
+            json.dump({'mode': 'quick'}, f)
+        assert run(['-k', 'load', '-b', path])[0] == 2
+
+    def test_list(self):
+        code, out = run(['--list'])
+        assert code == 0
+        assert out.splitlines()[0].split()[0] == 'simulation'
+
+
+if __name__ == '__main__':
+    unittest.main()
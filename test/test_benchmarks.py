@@ -0,0 +1,92 @@
+import inspect
+import itertools
+import unittest
+
+from benchmarks import (bench_construction, bench_generators, bench_history, bench_memory,
+                        bench_rng, bench_routing, bench_simulation)
+from benchmarks.common import build_network, traced
+
+
+def smallest_params(cls):
+    params = getattr(cls, 'params', [])
+    if not params:
+        return ()
+    if not isinstance(params, tuple):
+        params = (params,)
+    return tuple(p[0] for p in params)
+
+
+def run_benchmarks(module):
+    """
+        Run every benchmark of a module once, with the smallest parameters.
+    """
+    ran = []
+    for name, cls in inspect.getmembers(module, inspect.isclass):
+        if cls.__module__ != module.__name__:
+            continue
+        args = smallest_params(cls)
+        for method in dir(cls):
+            if not method.split('_')[0] in ('time', 'track', 'peakmem'):
+                continue
+            benchmark = cls()
+            if hasattr(benchmark, 'setup'):
+                benchmark.setup(*args)
+            try:
+                getattr(benchmark, method)(*args)
+            finally:
+                if hasattr(benchmark, 'teardown'):
+                    benchmark.teardown(*args)
+            ran.append("%s.%s" % (name, method))
+    return ran
+
+
+class BenchmarksTest(unittest.TestCase):
+
+    def test_simulation(self):
+        ran = run_benchmarks(bench_simulation)
+        assert 'SimulationOverhead.time_start' in ran
+
+    def test_construction(self):
+        ran = run_benchmarks(bench_construction)
+        assert 'Construction.time_add_institution' in ran
+
+    def test_history(self):
+        ran = run_benchmarks(bench_history)
+        assert 'ExportLoad.track_export_bytes' in ran
+
+    def test_memory(self):
+        ran = run_benchmarks(bench_memory)
+        assert 'RepeatedRuns.track_retained_bytes' in ran
+        assert 'InstitutionMemory.peakmem_build_membership' in ran
+
+    def test_generators(self):
+        ran = run_benchmarks(bench_generators)
+        assert 'RiverSimulation.time_start' in ran
+
+    def test_routing(self):
+        ran = run_benchmarks(bench_routing)
+        assert 'Routing.track_run_ns_per_node' in ran
+        assert 'RoutingStructure.time_structure' in ran
+
+    def test_rng(self):
+        ran = run_benchmarks(bench_rng)
+        assert 'RandomDraw.track_draw_ns_per_component' in ran
+
+    def test_traced(self):
+        network, peak, retained = traced(build_network, 1000)
+        assert len(network.components) == 1000
+        assert peak >= retained > 0
+
+    def test_params(self):
+        #Every parameter has a name
+        for module in (bench_construction, bench_generators, bench_history, bench_memory,
+                       bench_rng, bench_routing, bench_simulation):
+            for name, cls in inspect.getmembers(module, inspect.isclass):
+                if hasattr(cls, 'params'):
+                    params = cls.params if isinstance(cls.params, tuple) else (cls.params,)
+                    assert len(params) == len(cls.param_names), name
+                    assert len(list(itertools.product(*params))) > 0
+
+
+if __name__ == '__main__':
+    unittest.main()
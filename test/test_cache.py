@@ -0,0 +1,169 @@
+from pynsim import Simulator, Network, Node, Link, Engine
+from pynsim.cache import ResultCache
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class CacheTestNode(Node):
+    _properties = {
+        'inflow': 0,
+        'storage': 0,
+    }
+
+    def setup(self, timestamp):
+        self.inflow = self._inflow[timestamp]
+
+
+class StorageEngine(Engine):
+    run_count = 0
+
+    def run(self):
+        StorageEngine.run_count += 1
+        for n in self.target.nodes:
+            n.storage = n.storage + n.inflow
+
+
+class ScaledEngine(Engine):
+    """
+        An engine whose configuration is private, and which keeps a model,
+        which for this engine is configuration rather than run-time state.
+    """
+    def __init__(self, target, factor, model='a'):
+        super(ScaledEngine, self).__init__(target)
+        self._factor = factor
+        self.model = model
+
+    def run(self):
+        for n in self.target.nodes:
+            n.storage = n.inflow * self._factor
+
+
+def build_simulator(cache, inflow=1.0):
+    network = Network("Cache test network")
+    n1 = CacheTestNode(x=0, y=0, name="N1")
+    n2 = CacheTestNode(x=1, y=0, name="N2")
+    for n in (n1, n2):
+        n._inflow = {0: inflow, 1: inflow * 2, 2: inflow * 3}
+    network.add_nodes(n1, n2)
+    network.add_link(Link(start_node=n1, end_node=n2, name="L1"))
+
+    s = Simulator(network, cache=cache)
+    s.add_engine(StorageEngine(network))
+    s.set_timesteps([0, 1, 2])
+    return s
+
+
+class CacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        StorageEngine.run_count = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_cache_hit(self):
+        """
+            Test that a second, identical simulation is restored from the
+            cache without running any engines.
+        """
+        cache = ResultCache(self.cache_dir)
+
+        s1 = build_simulator(cache)
+        s1.start()
+        assert StorageEngine.run_count == 3
+
+        s2 = build_simulator(cache)
+        s2.start()
+        assert StorageEngine.run_count == 3
+        assert cache.hits == 1
+
+        for n1, n2 in zip(s1.network.nodes, s2.network.nodes):
+            assert n1._history == n2._history
+            assert n2.storage == 6.0
+
+    def test_rerun(self):
+        """
+            Test that running a simulator again from the same state is
+            restored from the cache, whatever history it has recorded.
+        """
+        cache = ResultCache(self.cache_dir)
+        s = build_simulator(cache)
+        key = cache.key(s)
+        s.start()
+        assert StorageEngine.run_count == 3
+
+        for n in s.network.nodes:
+            n.inflow = 0
+            n.storage = 0
+        assert cache.key(s) == key
+        s.start()
+        assert StorageEngine.run_count == 3
+        assert cache.hits == 1
+        assert s.network.get_node('N1')._history['storage'] == [1.0, 3.0, 6.0] * 2
+
+    def test_engine_configuration(self):
+        """
+            Test that every attribute of an engine, private or not, is part
+            of the key, apart from those its class declares as run-time state.
+        """
+        cache = ResultCache(self.cache_dir)
+
+        def key(*args):
+            s = build_simulator(cache)
+            s.engines = []
+            s.add_engine(ScaledEngine(s.network, *args))
+            return cache.key(s)
+
+        assert key(1) == key(1)
+        assert key(1) != key(100)
+        assert key(1, 'a') != key(1, 'b')
+
+        s = build_simulator(cache)
+        before = cache.key(s)
+        engine = s.engines[0]
+        engine.cache_hits = 5
+        engine.timestep = 2
+        engine._memo = {'index': (1, [1, 2])}
+        assert cache.key(s) == before
+
+    def test_cache_miss_on_changed_input(self):
+        """
+            Test that changing a time-series input changes the cache key.
+        """
+        cache = ResultCache(self.cache_dir)
+
+        s1 = build_simulator(cache, inflow=1.0)
+        s2 = build_simulator(cache, inflow=2.0)
+
+        assert cache.key(s1) != cache.key(s2)
+        assert cache.key(s1) == cache.key(build_simulator(cache, inflow=1.0))
+
+        s1.start()
+        s2.start()
+        assert StorageEngine.run_count == 6
+        assert s2.network.nodes[0]._history['storage'] == [2.0, 6.0, 12.0]
+
+    def test_eviction(self):
+        """
+            Test that the least recently used entries are removed once the
+            cache is full.
+        """
+        cache = ResultCache(self.cache_dir, max_size=0)
+        build_simulator(cache).start()
+        assert len(os.listdir(self.cache_dir)) == 0
+
+        cache.max_size = 10 ** 6
+        for inflow in (1.0, 2.0, 3.0):
+            build_simulator(cache, inflow=inflow).start()
+        assert len(os.listdir(self.cache_dir)) == 3
+
+        cache.max_size = cache.size() - 1
+        cache.evict()
+        assert len(os.listdir(self.cache_dir)) == 2
+
+
+if __name__ == '__main__':
+    unittest.main()
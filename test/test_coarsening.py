@@ -0,0 +1,169 @@
+from pynsim import Simulator, Network, Node, Link, Engine, Institution
+from pynsim.coarsening import find_chains, CompositeNode, Coarsening
+import unittest
+
+
+class RiverNode(Node):
+    pass_through = True
+    _properties = {'Q': None, 'dQdx': 0.0, 'velocity': None}
+
+    def setup(self, timestamp):
+        self.dQdx = self._dQdx[timestamp]
+
+
+class Diversion(Node):
+    _properties = {'Q': None, 'dQdx': 0.0, 'demand': 2.0, 'abstraction': None}
+
+    def setup(self, timestamp):
+        self.dQdx = self._dQdx[timestamp]
+
+
+class RainyNetwork(Network):
+    _properties = {'rain': 0.0}
+
+    def setup(self, timestamp):
+        self.rain = timestamp + 0.5
+
+
+class RainyNode(RiverNode):
+    """
+        Reads the rain off its network, so it has to see the network which
+        is simulated.
+    """
+    def setup(self, timestamp):
+        self.dQdx = self._dQdx[timestamp] + self.network.rain
+
+
+class Abstractor(Institution):
+    """
+        Takes water from its nodes during setup.
+    """
+    def setup(self, timestamp):
+        for node in self.nodes:
+            node.dQdx -= 1.0
+
+
+class River(Link):
+    _properties = {}
+
+
+class Routing(Engine):
+    """
+        Sums the flow from upstream, in topological order.
+    """
+    def run(self):
+        from pynsim.topology import topological_levels
+        for level in topological_levels(self.target):
+            for node in level:
+                node.Q = node.dQdx + sum(n.Q for n in node.upstream_nodes)
+                if node.component_type == 'Diversion':
+                    node.abstraction = min(node.Q, node.demand)
+                    node.Q -= node.abstraction
+                node.velocity = node.Q / 10.0
+
+
+def build_network(network_type=Network, node_type=RiverNode):
+    """
+        N1 -> N2 -> N3 -> D -> N6 -> N7
+                   N4 -> N5 ----^
+    """
+    network = network_type("Coarsening test network")
+    names = ['N1', 'N2', 'N3', 'N4', 'N5', 'N6', 'N7']
+    nodes = dict((name, node_type(x=i, y=0, name=name)) for i, name in enumerate(names))
+    nodes['D'] = Diversion(x=3, y=1, name='D')
+    for i, node in enumerate(nodes.values()):
+        node._dQdx = {0: float(i + 1), 1: 2.0 * (i + 1)}
+    network.add_nodes(*nodes.values())
+    for start, end in [('N1', 'N2'), ('N2', 'N3'), ('N3', 'D'), ('D', 'N6'),
+                       ('N4', 'N5'), ('N5', 'N6'), ('N6', 'N7')]:
+        network.add_link(River(start_node=nodes[start], end_node=nodes[end],
+                               name="%s-%s" % (start, end)))
+    return network
+
+
+def simulate(network):
+    s = Simulator(network)
+    s.add_engine(Routing(network))
+    s.set_timesteps(range(2))
+    s.start()
+
+
+class CoarseningTest(unittest.TestCase):
+
+    def test_chains(self):
+        network = build_network()
+        chains = find_chains(network)
+        assert [[n.name for n in chain] for chain in chains] == \
+            [['N1', 'N2', 'N3'], ['N4', 'N5'], ['N6', 'N7']]
+        #N6 has two links in, so N5 cannot lead on to it.
+        assert [[n.name for n in chain] for chain in find_chains(network, min_length=3)] == \
+            [['N1', 'N2', 'N3']]
+        assert find_chains(network, pass_through_types=['Diversion']) == []
+
+    def test_same_results(self):
+        full = build_network()
+        simulate(full)
+
+        network = build_network()
+        with network.coarsen(additive=['dQdx'], accumulate={'Q': 'dQdx'},
+                             results=['velocity']) as coarse:
+            assert len(coarse.network.nodes) == 4
+            assert len(coarse.network.links) == 3
+            assert isinstance(coarse.network.get_node('N1..N3'), CompositeNode)
+            simulate(coarse.network)
+
+        for a, b in zip(full.nodes, network.nodes):
+            assert a._history['Q'] == b._history['Q'], a.name
+            assert a._history['dQdx'] == b._history['dQdx'], a.name
+        #Results which do not accumulate are copied along the chain
+        assert network.get_node('N1')._history['velocity'] == \
+            network.get_node('N3')._history['velocity']
+
+        #The links are connected to the original nodes again
+        assert network.get_link('N3-D').start_node is network.get_node('N3')
+        assert network.get_node('D').upstream_nodes == [network.get_node('N3')]
+
+    def test_members_see_coarse_network(self):
+        full = build_network(RainyNetwork, RainyNode)
+        simulate(full)
+
+        network = build_network(RainyNetwork, RainyNode)
+        with network.coarsen(additive=['dQdx'], accumulate={'Q': 'dQdx'},
+                             results=['velocity']) as coarse:
+            simulate(coarse.network)
+            #The coarse network was set up, not the original one
+            assert network.rain == 0.0
+
+        for a, b in zip(full.nodes, network.nodes):
+            assert a._history['dQdx'] == b._history['dQdx'], a.name
+            assert a._history['Q'] == b._history['Q'], a.name
+        #The nodes of the chains are back on the original network
+        assert all(n.network is network for n in network.nodes)
+
+    def test_institution_members(self):
+        def build():
+            network = build_network()
+            abstractor = Abstractor("Abstractor")
+            abstractor.add_node(network.get_node('N2'))
+            network.add_institution(abstractor)
+            return network
+
+        network = build()
+        assert [[n.name for n in chain] for chain in find_chains(network)] == \
+            [['N4', 'N5'], ['N6', 'N7']]
+        self.assertRaises(Exception, Coarsening, network,
+                          [[network.get_node(n) for n in ['N1', 'N2', 'N3']]])
+
+        full = build()
+        simulate(full)
+        network = build()
+        with network.coarsen(additive=['dQdx'], accumulate={'Q': 'dQdx'},
+                             results=['velocity']) as coarse:
+            simulate(coarse.network)
+        for a, b in zip(full.nodes, network.nodes):
+            assert a._history['dQdx'] == b._history['dQdx'], a.name
+            assert a._history['Q'] == b._history['Q'], a.name
+
+
+if __name__ == '__main__':
+    unittest.main()
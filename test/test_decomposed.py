@@ -0,0 +1,225 @@
+from pynsim import Simulator, DecomposedSimulator, Network, Node, Link, Institution, Engine
+from pynsim.metrics import MetricsExporter
+from pynsim.simulators.decomposed import partition_network
+import multiprocessing
+import unittest
+
+
+class Catchment(Node):
+    _properties = {
+        'inflow': 0.0,
+        'Q': 0.0,
+    }
+
+    def setup(self, timestamp):
+        self.inflow = self.rng.uniform(0, 10)
+
+
+class RainNetwork(Network):
+    _properties = {'rain': 0.0}
+
+    def setup(self, timestamp):
+        self.rain = 2.0 * (timestamp + 1)
+
+
+class RainCatchment(Catchment):
+    """
+        A catchment whose inflow is the rain which falls on the network.
+    """
+    def setup(self, timestamp):
+        self.inflow = self.network.rain
+
+
+class River(Link):
+    _properties = {
+        'flow': 0.0,
+    }
+
+
+class Transfer(Link):
+    _properties = {
+        'flow': 0.0,
+    }
+
+
+class FlowEngine(Engine):
+    """
+        Route flow downstream. Nodes are added to the network in upstream
+        to downstream order.
+    """
+    def run(self):
+        for node in self.target.nodes:
+            node.Q = node.inflow + sum(l.flow for l in node.in_links)
+            for l in node.out_links:
+                l.flow = node.Q / len(node.out_links)
+
+
+class CountingEngine(Engine):
+    """
+        Counts its runs in shared memory, which the partitions' processes
+        can add to.
+    """
+    def __init__(self, target):
+        super(CountingEngine, self).__init__(target)
+        self.runs = multiprocessing.Value('i', 0)
+
+    def run(self):
+        with self.runs.get_lock():
+            self.runs.value += 1
+        self.target.Q = 0.0
+
+
+def build_network(network_class=Network, catchment_class=Catchment):
+    """
+        Two basins, A and B, joined by a transfer from A2 to B2.
+
+        A1    B1
+        |     |
+        A2 -> B2
+        |     |
+        A3    B3
+    """
+    network = network_class("Decomposition test network")
+    nodes = {}
+    for basin in ('A', 'B'):
+        institution = Institution("Basin %s" % basin)
+        for i in range(1, 4):
+            name = "%s%s" % (basin, i)
+            nodes[name] = catchment_class(x=i, y=0, name=name)
+            network.add_node(nodes[name])
+            institution.add_node(nodes[name])
+        network.add_institution(institution)
+
+    for basin in ('A', 'B'):
+        network.add_link(River(start_node=nodes[basin + '1'], end_node=nodes[basin + '2'], name=basin + '12'))
+        network.add_link(River(start_node=nodes[basin + '2'], end_node=nodes[basin + '3'], name=basin + '23'))
+    network.add_link(Transfer(start_node=nodes['A2'], end_node=nodes['B2'], name='Transfer'))
+
+    return network
+
+
+def simulate(simulator_class, network_class=Network, catchment_class=Catchment, **kwargs):
+    network = build_network(network_class, catchment_class)
+    s = simulator_class(network, seed=7, **kwargs)
+    s.add_engine(FlowEngine(network))
+    s.set_timesteps(range(5))
+    s.start()
+    return dict((c.name, c._history) for c in network.components)
+
+
+class DecomposedTest(unittest.TestCase):
+
+    def test_partitions(self):
+        """
+            Test partitioning by component, with transfer links as boundaries.
+        """
+        network = build_network()
+        assert len(partition_network(network, 'component')) == 1
+
+        partitions = partition_network(network, 'component', boundary_link_types=['Transfer'])
+        assert len(partitions) == 2
+        assert [n.name for n in partitions[1].nodes] == ['B1', 'B2', 'B3']
+        assert [l.name for l in partitions[0].outbound] == ['Transfer']
+        assert [l.name for l in partitions[1].inbound] == ['Transfer']
+
+        partitions = partition_network(network, 'institution')
+        assert [p.name for p in partitions] == ['Basin A', 'Basin B']
+        assert partitions[0].institutions[0].name == 'Basin A'
+
+    def test_matches_sequential(self):
+        """
+            Test that a decomposed simulation gives the same results as a
+            sequential one.
+        """
+        sequential = simulate(Simulator)
+        by_institution = simulate(DecomposedSimulator, partition='institution')
+        by_component = simulate(DecomposedSimulator, boundary_link_types=['Transfer'])
+
+        assert sequential['B3']['Q'][0] > 0
+        assert sequential == by_institution
+        assert sequential == by_component
+
+    def test_network_setup(self):
+        """
+            Test that the components of each partition see the values which
+            the network's setup sets.
+        """
+        sequential = simulate(Simulator, RainNetwork, RainCatchment)
+        decomposed = simulate(DecomposedSimulator, RainNetwork, RainCatchment,
+                              partition='institution')
+
+        assert sequential['A1']['inflow'] == [2.0, 4.0, 6.0, 8.0, 10.0]
+        assert sequential == decomposed
+
+    def test_cycle(self):
+        """
+            Test that partitions which depend on each other are rejected.
+        """
+        network = build_network()
+        network.add_link(Transfer(start_node=network.get_node('B3'),
+                                  end_node=network.get_node('A3'), name='Return'))
+        s = DecomposedSimulator(network, partition='institution')
+        s.set_timesteps(range(2))
+        with self.assertRaises(RuntimeError):
+            s.start()
+
+    def test_no_steps(self):
+        """
+            Stepping is refused before anything is started.
+        """
+        metrics = MetricsExporter()
+        s = DecomposedSimulator(build_network(), metrics=metrics)
+        s.set_timesteps(range(2))
+        self.assertRaises(NotImplementedError, s.steps)
+        self.assertRaises(NotImplementedError, s.steps_async)
+        assert metrics._server is None
+
+    def test_resources_closed(self):
+        metrics = MetricsExporter()
+        network = build_network()
+        s = DecomposedSimulator(network, partition='institution', seed=1, metrics=metrics)
+        s.add_engine(FlowEngine(network))
+        s.set_timesteps(range(2))
+        s.start()
+        assert metrics._server is None
+
+    def test_record_history(self):
+        """
+            With record_history=False only the last timestep is kept, as in
+            a sequential simulation.
+        """
+        sequential = simulate(Simulator, record_history=False)
+        decomposed = simulate(DecomposedSimulator, partition='institution',
+                              record_history=False)
+
+        assert sequential['B3']['Q'] == [simulate(Simulator)['B3']['Q'][-1]]
+        assert sequential == decomposed
+
+    def test_component_engines(self):
+        """
+            An engine which targets a component only runs in its partition.
+        """
+        network = build_network()
+        counter = CountingEngine(network.get_node('A3'))
+        s = DecomposedSimulator(network, partition='institution', seed=7)
+        s.add_engine(FlowEngine(network))
+        s.add_engine(counter)
+        s.set_timesteps(range(5))
+        s.start()
+
+        assert counter.runs.value == 5
+        assert network.get_node('A3')._history['Q'] == [0.0] * 5
+        assert network.get_node('B3')._history['Q'][0] > 0
+
+        #An engine whose target is not in the network cannot be assigned
+        metrics = MetricsExporter()
+        other = build_network()
+        s = DecomposedSimulator(network, partition='institution', metrics=metrics)
+        s.add_engine(CountingEngine(other.get_node('A3')))
+        s.set_timesteps(range(2))
+        self.assertRaises(Exception, s.start)
+        assert metrics._server is None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+from pynsim import Simulator, Network, Node, Engine
+from pynsim.executors import SerialExecutor, WorkQueueExecutor, TaskError, run_ensemble
+import functools
+import os
+import tempfile
+import time
+import unittest
+
+
+class MemberNode(Node):
+    _properties = {
+        'Q': 0.0,
+    }
+
+
+class MemberEngine(Engine):
+    def __init__(self, target, scale):
+        super(MemberEngine, self).__init__(target)
+        self.scale = scale
+
+    def run(self):
+        for n in self.target.nodes:
+            n.Q = self.scale * self.timestep + n.rng.random()
+
+
+def build(member):
+    network = Network("Ensemble network")
+    network.add_nodes(MemberNode(x=0, y=0, name="N1"), MemberNode(x=1, y=0, name="N2"))
+    s = Simulator(network, seed=member)
+    s.add_engine(MemberEngine(network, member))
+    s.set_timesteps(range(3))
+    return s
+
+
+def square(x):
+    return x * x
+
+
+def fail(x):
+    raise ValueError("Member %s failed" % x)
+
+
+def die_once(marker_dir, x):
+    """
+        Kill the worker the first time each item is attempted.
+    """
+    marker = os.path.join(marker_dir, str(x))
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        os._exit(1)
+    return x + 1
+
+
+class ExecutorTest(unittest.TestCase):
+
+    def test_same_output(self):
+        """
+            Test that a member's output does not depend on where it ran.
+        """
+        members = [1, 2, 3, 4, 5]
+        serial = dict(run_ensemble(build, members))
+
+        with WorkQueueExecutor(workers=2) as executor:
+            queued = dict(run_ensemble(build, members, executor, chunksize=2))
+
+        assert sorted(queued.keys()) == members
+        assert serial == queued
+        assert serial[3]['nodes']['N1']['Q'][2] >= 6
+
+    def test_chunks(self):
+        """
+            Test that results are returned for every item, whatever the
+            chunk size.
+        """
+        with WorkQueueExecutor(workers=1) as executor:
+            for chunksize in (1, 3, 10):
+                results = dict(executor.map(square, range(7), chunksize=chunksize))
+                assert results == dict((i, i * i) for i in range(7))
+
+        assert dict(SerialExecutor().map(square, range(3))) == {0: 0, 1: 1, 2: 4}
+
+    def test_worker_death(self):
+        """
+            Test that the tasks of a worker which dies are retried.
+        """
+        marker_dir = tempfile.mkdtemp()
+        with WorkQueueExecutor(workers=1) as executor:
+            results = dict(executor.map(functools.partial(die_once, marker_dir), range(3)))
+        assert results == {0: 1, 1: 2, 2: 3}
+
+        with WorkQueueExecutor(workers=1, max_retries=0) as executor:
+            with self.assertRaises(TaskError):
+                dict(executor.map(functools.partial(die_once, tempfile.mkdtemp()), range(1)))
+
+    def test_heartbeat(self):
+        """
+            Test that a remote worker which has claimed a task but not yet
+            written its heartbeat is not taken for dead until the timeout
+            has passed since its claim.
+        """
+        with WorkQueueExecutor(heartbeat_timeout=30) as executor:
+            claimed = os.path.join(executor._dirs['claimed'], 'remote-worker')
+            os.makedirs(claimed)
+            open(os.path.join(claimed, 'job_000000.task'), 'w').close()
+            assert executor._dead_workers() == set()
+
+            old = time.time() - 60
+            os.utime(claimed, (old, old))
+            assert executor._dead_workers() == set(['remote-worker'])
+
+            heartbeat = os.path.join(executor._dirs['workers'], 'remote-worker')
+            open(heartbeat, 'w').close()
+            assert executor._dead_workers() == set()
+            os.utime(heartbeat, (old, old))
+            assert executor._dead_workers() == set(['remote-worker'])
+
+    def test_task_error(self):
+        """
+            Test that an exception in a task is raised by the coordinator.
+        """
+        with WorkQueueExecutor(workers=1) as executor:
+            with self.assertRaises(TaskError):
+                dict(executor.map(fail, range(2)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+from pynsim import Network, Node, Link
+import numpy as np
+import unittest
+
+
+class Junction(Node):
+    _properties = {'outflow': None, 'inflow': None, 'level': None}
+
+
+class River(Link):
+    _properties = {'flow': None, 'flowmult': None, 'head': None}
+
+
+def build_network():
+    """
+        A -> C -> D
+        B ---^
+    """
+    network = Network("Gather test network")
+    a = Junction(x=0, y=1, name="A", outflow=4.0, level=1.0)
+    b = Junction(x=0, y=0, name="B", outflow=6.0, level=3.0)
+    c = Junction(x=1, y=0, name="C", outflow=10.0, level=2.0)
+    d = Junction(x=2, y=0, name="D", level=0.5)
+    network.add_nodes(a, b, c, d)
+    network.add_links(River(start_node=a, end_node=c, name="A-C", flow=4.0, flowmult=0.5),
+                      River(start_node=b, end_node=c, name="B-C", flow=6.0),
+                      River(start_node=c, end_node=d, name="C-D", flow=10.0))
+    return network
+
+
+class GatherTest(unittest.TestCase):
+
+    def test_gather(self):
+        network = build_network()
+
+        inflow = network.gather('flow', target='inflow')
+        assert inflow.tolist() == [0.0, 0.0, 10.0, 10.0]
+        assert [n.inflow for n in network.nodes] == [0.0, 0.0, 10.0, 10.0]
+
+        assert network.gather('flow', how='max').tolist() == [0.0, 0.0, 6.0, 10.0]
+        assert network.gather('flow', how='min', empty=np.nan)[2:].tolist() == [4.0, 10.0]
+        assert network.gather('flow', how='mean').tolist() == [0.0, 0.0, 5.0, 10.0]
+        assert network.gather('flow', to='start').tolist() == [4.0, 6.0, 10.0, 0.0]
+
+        self.assertRaises(Exception, network.gather, 'flow', how='median')
+        self.assertRaises(Exception, network.gather, 'flow', to='middle')
+
+    def test_scatter(self):
+        network = build_network()
+        assert network.scatter('level', target='head').tolist() == [1.0, 3.0, 2.0]
+        assert network.get_link('C-D').head == 2.0
+        assert network.scatter('level', to='in').tolist() == [2.0, 2.0, 0.5]
+
+    def test_propagate(self):
+        network = build_network()
+        assert network.propagate('outflow').tolist() == [0.0, 0.0, 10.0, 10.0]
+        assert network.propagate('outflow', weight='flowmult').tolist() == [0.0, 0.0, 8.0, 10.0]
+
+    def test_incidence_cache(self):
+        network = build_network()
+        arrays = network.incidence()
+        assert arrays['start'].tolist() == [0, 1, 2]
+        assert arrays['end'].tolist() == [2, 2, 3]
+        assert network.incidence() is arrays
+
+        e = Junction(x=3, y=0, name="E")
+        network.add_node(e)
+        network.add_link(River(start_node=network.get_node('D'), end_node=e, name="D-E", flow=1.0))
+        assert network.incidence() is not arrays
+        assert network.gather('flow').tolist() == [0.0, 0.0, 10.0, 10.0, 1.0]
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+from pynsim import Simulator, Network, Node, Link, Engine
+from pynsim.generators import (river_network, irrigation_districts, overlapping_institutions,
+                               synthetic_series)
+import random
+import unittest
+
+
+class SumEngine(Engine):
+    name = "Sum engine"
+
+    def run(self):
+        self.inflow = sum(n.inflow for n in self.target.get_nodes('Headwater'))
+        self.demand = sum(n.demand for n in self.target.get_nodes('Demand'))
+
+
+class GeneratorsTest(unittest.TestCase):
+
+    def test_river(self):
+        network = river_network(2000, seed=3, timesteps=30)
+        river = [n for n in network.nodes if n.component_type != 'Demand']
+        assert len(river) == 2000
+
+        types = set(n.component_type for n in network.nodes)
+        assert types == set(['Outlet', 'Junction', 'Reservoir', 'Headwater', 'Demand'])
+
+        #A tree draining to the outlet
+        for n in river:
+            reaches = [l for l in n.out_links if l.component_type == 'Reach']
+            assert len(reaches) == (0 if n.component_type == 'Outlet' else 1)
+            assert len([l for l in n.in_links if l.component_type == 'Reach']) <= 2
+            assert (len(n.in_links) == 0) == (n.component_type == 'Headwater')
+        for n in network.get_nodes('Demand'):
+            assert [l.component_type for l in n.in_links] == ['Diversion']
+
+        #The same seed gives the same network
+        again = river_network(2000, seed=3, timesteps=30)
+        assert [(n.name, n.x, n.y) for n in again.nodes] == [(n.name, n.x, n.y) for n in network.nodes]
+        assert [l.name for l in again.links] == [l.name for l in network.links]
+        other = river_network(2000, seed=4, timesteps=30)
+        assert [n.name for n in other.nodes] != [n.name for n in network.nodes]
+
+        self.assertRaises(Exception, river_network, 1)
+
+    def test_river_simulation(self):
+        network = river_network(200, seed=1, timesteps=10)
+        s = Simulator(network)
+        engine = SumEngine(network)
+        s.add_engine(engine)
+        s.set_timesteps(range(10))
+        s.start()
+
+        headwater = network.get_nodes('Headwater')[0]
+        expected = [headwater.scale * v for v in headwater.inflow_series]
+        assert headwater.get_history('inflow') == expected
+        assert engine.inflow > 0
+        assert engine.demand > 0
+
+    def test_irrigation(self):
+        network = irrigation_districts(25, 12, district_size=10, seed=2, timesteps=20)
+        fields = network.get_nodes('Field')
+        assert len(fields) == 300
+        assert len(network.get_nodes('Intake')) == 1
+        #Every field is fed by one canal
+        assert len(network.links) == 300
+        assert all(len(f.in_links) == 1 for f in fields)
+
+        districts = network.institutions
+        assert len(districts) == 3 * 2
+        assert sum(len(d.nodes) for d in districts) == 300
+        assert len(districts[-1].nodes) == 5 * 2
+        for d in districts:
+            assert len(set(id(f.demand_series) for f in d.nodes)) == 1
+            members = set(id(n) for n in d.nodes)
+            assert all(id(l.start_node) in members and id(l.end_node) in members for l in d.links)
+        #Each district holds the canals within it
+        assert len(districts[0].links) == 100 - 1
+
+    def test_institutions(self):
+        network = river_network(1000, seed=5)
+        institutions = overlapping_institutions(network, 10, 0.2, seed=5)
+        assert network.institutions == institutions
+        n = len(network.nodes)
+        for institution in institutions:
+            assert len(institution.nodes) == int(round(0.2 * n))
+            members = set(id(node) for node in institution.nodes)
+            assert all(id(l.start_node) in members and id(l.end_node) in members
+                       for l in institution.links)
+        #They overlap
+        in_several = [node for node in network.nodes
+                      if sum(1 for i in institutions if i.get_node(node.name) is node) > 1]
+        assert len(in_several) > 0
+
+        assert len(overlapping_institutions(network, 1, 50, seed=5, prefix="Other")[0].nodes) == 50
+
+    def test_series(self):
+        series = synthetic_series(730, mean=10.0, rng=random.Random(1))
+        assert len(series) == 730
+        assert min(series) >= 0
+        assert 8 < sum(series) / len(series) < 12
+        assert series == synthetic_series(730, mean=10.0, rng=random.Random(1))
+
+    def test_bulk_add(self):
+        network = Network("Bulk")
+        a, b, c = [Node(name=name, x=0, y=0) for name in "abc"]
+        version = network.topology_version
+        network.add_nodes(a, b)
+        assert network.nodes == [a, b] and network.components == [a, b]
+        assert network.get_nodes('Node') == [a, b]
+        assert a.network is network
+        assert network.topology_version == version + 2
+
+        link = Link(start_node=a, end_node=b)
+        network.add_links(link)
+        assert link.name == "a . b"
+        assert network.get_link("a . b") is link
+
+        #As when adding them one at a time, c is added before b fails
+        self.assertRaises(Exception, network.add_nodes, c, Node(name="b", x=0, y=0))
+        assert network.get_node('c') is c
+        assert network.get_node('b') is b
+        self.assertRaises(Exception, network.add_links, Link(start_node=a, end_node=c, name="ac"),
+                          Link(start_node=b, end_node=c, name="ac"))
+        assert network.get_link('ac').start_node is a
+
+
+if __name__ == '__main__':
+    unittest.main()
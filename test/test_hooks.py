@@ -0,0 +1,116 @@
+from pynsim import Simulator, Network, Node, Engine
+from pynsim.hooks import Hooks
+import asyncio
+import logging
+import unittest
+
+
+class Tank(Node):
+    _properties = {'S': 0.0}
+
+
+class FillEngine(Engine):
+    name = "Fill engine"
+
+    def run(self):
+        for n in self.target.nodes:
+            n.S += 1.0
+
+
+class AsyncFillEngine(FillEngine):
+    name = "Async fill engine"
+
+    async def run(self):
+        await asyncio.sleep(0)
+        super(AsyncFillEngine, self).run()
+
+
+def build_simulator(engine_class=FillEngine, **kwargs):
+    network = Network("Hooks test network")
+    network.add_node(Tank(x=0, y=0, name="T1"))
+    s = Simulator(network, **kwargs)
+    s.add_engine(engine_class(network))
+    s.set_timesteps(range(2))
+    return s
+
+
+def recorder(log):
+    """
+        Callbacks for every hook point, which record their calls in log.
+    """
+    def timestep_callback(point):
+        def callback(simulator, idx, timestep):
+            log.append((point, idx, simulator.network.get_node('T1').S))
+        return callback
+
+    def engine_callback(point):
+        def callback(simulator, engine):
+            log.append((point, engine.timestep_idx, engine.iteration))
+        return callback
+
+    hooks = Hooks()
+    for point in ('before_timestep', 'before_setup', 'after_setup',
+                  'after_post_process', 'after_timestep'):
+        hooks.add(point, timestep_callback(point))
+    for point in ('before_engine', 'after_engine'):
+        hooks.add(point, engine_callback(point))
+    return hooks
+
+
+EXPECTED = [('before_timestep', 0, 0.0), ('before_setup', 0, 0.0), ('after_setup', 0, 0.0),
+            ('before_engine', 0, 1), ('after_engine', 0, 1),
+            ('before_engine', 0, 2), ('after_engine', 0, 2),
+            ('after_post_process', 0, 2.0), ('after_timestep', 0, 2.0)]
+
+
+class HooksTest(unittest.TestCase):
+
+    def test_order(self):
+        log = []
+        s = build_simulator(max_iterations=2)
+        s.hooks = recorder(log)
+        s.start()
+        assert log[:9] == EXPECTED
+        assert len(log) == 18
+
+    def test_async(self):
+        log = []
+        s = build_simulator(AsyncFillEngine, max_iterations=2)
+        s.hooks = recorder(log)
+        asyncio.run(s.start_async())
+        assert log[:9] == EXPECTED
+
+    def test_bound_at_start(self):
+        s = build_simulator()
+        calls = []
+        s.add_hook('after_timestep', lambda simulator, idx, timestep: calls.append(idx))
+        s.add_hook('after_timestep', lambda simulator, idx, timestep: calls.append(-idx))
+        assert s._hooks.after_timestep is None
+
+        s.start()
+        assert calls == [0, 0, 1, -1]
+        assert s._hooks.before_engine is None
+
+        self.assertRaises(Exception, s.add_hook, 'during_timestep', lambda *args: None)
+
+    def test_debug_logging(self):
+        """
+            The loop's debug logging is done by hooks, only when it is enabled.
+        """
+        s = build_simulator()
+        logger = logging.getLogger()
+        level = logger.level
+        try:
+            logger.setLevel(logging.DEBUG)
+            with self.assertLogs(level='DEBUG') as logs:
+                s.start()
+            assert any('Running engine Fill engine' in line for line in logs.output)
+        finally:
+            logger.setLevel(level)
+
+        s.start()
+        assert s._hooks.before_engine is None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+from pynsim import Simulator, Network, Node, Link, Institution, Engine
+from pynsim.engines import memoize, RoutingEngine
+import unittest
+
+
+class Junction(Node):
+    _properties = {'inflow': 1.0, 'outflow': None, 'n_upstream': None}
+
+
+class River(Link):
+    _properties = {'flow': None}
+
+
+class UpstreamCounter(Engine):
+    """
+        Counts the upstream nodes of each node, using a memoized index.
+    """
+    def __init__(self, target):
+        super(UpstreamCounter, self).__init__(target)
+        self.builds = 0
+
+    @memoize
+    def upstream(self):
+        self.builds += 1
+        upstream = dict((n.name, 0) for n in self.target.nodes)
+        for l in self.target.links:
+            upstream[l.end_node.name] += 1
+        return upstream
+
+    def run(self):
+        upstream = self.upstream()
+        for n in self.target.nodes:
+            n.n_upstream = upstream[n.name]
+
+
+def build_network():
+    network = Network("Memoize test network")
+    a = Junction(x=0, y=0, name="A")
+    b = Junction(x=1, y=0, name="B")
+    network.add_nodes(a, b)
+    network.add_link(River(start_node=a, end_node=b, name="A-B"))
+    return network
+
+
+class AddNodeEngine(Engine):
+    """
+        Adds a node (upstream of B) to the network at timestep 2.
+    """
+    def run(self):
+        if self.timestep == 2:
+            c = Junction(x=0, y=1, name="C")
+            self.target.add_node(c)
+            self.target.add_link(River(start_node=c, end_node=self.target.get_node('B'),
+                                       name="C-B"))
+
+
+class MemoizeTest(unittest.TestCase):
+
+    def test_topology_version(self):
+        network = build_network()
+        version = network.topology_version
+        assert version == 3
+
+        network.add_node(Junction(x=2, y=0, name="C"))
+        assert network.topology_version == version + 1
+
+        institution = Institution("I")
+        network.add_institution(institution)
+        assert network.topology_version == version + 2
+        #A change to an institution is a change to its network
+        institution.add_node(network.get_node('A'))
+        assert institution.topology_version == 1
+        assert network.topology_version == version + 3
+        institution.add_links(*network.links)
+        assert institution.topology_version == 2
+        assert network.topology_version == version + 4
+
+        #Changing a property is not a change in topology
+        network.get_node('A').inflow = 5.0
+        assert network.topology_version == version + 4
+
+    def test_hits_and_misses(self):
+        network = build_network()
+        engine = UpstreamCounter(network)
+        s = Simulator(network)
+        s.add_engine(engine)
+        s.set_timesteps(range(5))
+        s.start()
+
+        assert engine.builds == 1
+        assert engine.cache_misses == 1
+        assert engine.cache_hits == 4
+        assert network.get_node('B').n_upstream == 1
+
+        engine.clear_memo()
+        engine.run()
+        assert engine.builds == 2
+
+    def test_rebuild_on_change(self):
+        network = build_network()
+        counter = UpstreamCounter(network)
+        routing = RoutingEngine(network)
+        s = Simulator(network)
+        s.add_engine(AddNodeEngine(network))
+        s.add_engine(counter)
+        s.add_engine(routing)
+        s.set_timesteps(range(4))
+        s.start()
+
+        assert counter.builds == 2
+        assert network.get_node('B')._history['n_upstream'] == [1, 1, 2, 2]
+        assert network.get_node('B')._history['outflow'] == [2.0, 2.0, 3.0, 3.0]
+
+
+if __name__ == '__main__':
+    unittest.main()
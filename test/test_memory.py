@@ -0,0 +1,99 @@
+from pynsim import Simulator, Network, Node, Link, Engine
+from pynsim.memory import MemoryMonitor, deep_size, format_report
+import numpy as np
+import sys
+import unittest
+
+
+class Reservoir(Node):
+    _properties = {'S': 0.0, 'curve': None}
+    _result_properties = ['S']
+
+
+class Junction(Node):
+    _properties = {'Q': 0.0}
+
+
+class River(Link):
+    _properties = {'flow': 0.0}
+
+
+class FillEngine(Engine):
+    name = "Fill engine"
+
+    def __init__(self, target):
+        super(FillEngine, self).__init__(target)
+        self.buffer = np.zeros(10000)
+
+    def run(self):
+        for n in self.target.get_nodes('Reservoir'):
+            n.S += 1.0
+
+
+def build_simulator(**kwargs):
+    network = Network("Memory test network")
+    r1 = Reservoir(x=0, y=0, name="R1", curve=np.zeros(1000))
+    r2 = Reservoir(x=0, y=1, name="R2", curve=np.zeros(1000))
+    j = Junction(x=1, y=0, name="J")
+    network.add_nodes(r1, r2, j)
+    network.add_links(River(start_node=r1, end_node=j, name="R1-J"),
+                      River(start_node=r2, end_node=j, name="R2-J"))
+    s = Simulator(network, **kwargs)
+    s.add_engine(FillEngine(network))
+    return s
+
+
+class MemoryTest(unittest.TestCase):
+
+    def test_deep_size(self):
+        values = [float(i) for i in range(100)]
+        assert deep_size(values) == sys.getsizeof(values) + 100 * sys.getsizeof(1.0)
+        #Shared objects are counted once
+        assert deep_size([values, values]) == deep_size([values]) + 8
+
+        #Long lists are measured from a sample
+        values = [float(i) for i in range(100000)]
+        exact = sys.getsizeof(values) + 100000 * sys.getsizeof(1.0)
+        assert abs(deep_size(values) - exact) < exact * 0.01
+
+        array = np.zeros(1000)
+        assert deep_size(array) >= 8000
+
+    def test_report(self):
+        s = build_simulator()
+        s.set_timesteps(range(50))
+        s.start()
+
+        report = s.network.memory_report()
+        reservoirs = report['types']['Reservoir']
+        assert reservoirs['count'] == 2
+        assert reservoirs['properties']['curve'] >= 16000
+        assert reservoirs['history']['S'] >= 2 * 50 * sys.getsizeof(1.0)
+        #Every timestep's curve is the same array
+        assert reservoirs['history']['curve'] < 2 * 50 * 8 + 1000
+        assert report['types']['River']['count'] == 2
+        assert report['indexes']['Memory test network']['_node_map'] > 0
+
+        total = report['total']
+        assert total >= sum(reservoirs['properties'].values()) + sum(reservoirs['history'].values())
+
+        simulator_report = s.memory_report()
+        assert simulator_report['engines']['Fill engine'] >= 80000
+        assert simulator_report['total'] > total
+        assert 'engine Fill engine' in format_report(simulator_report, top=3)
+
+    def test_monitor(self):
+        monitor = MemoryMonitor(interval=10, use_tracemalloc=True, log=False)
+        s = build_simulator(memory=monitor)
+        s.set_timesteps(range(30))
+        s.start()
+
+        assert [idx for idx, report in monitor.reports] == [0, 10, 20]
+        #The history grows as the run goes on
+        first, last = monitor.reports[0][1], monitor.reports[-1][1]
+        assert last['types']['Reservoir']['history']['S'] > first['types']['Reservoir']['history']['S']
+        assert len(last['tracemalloc']) > 0
+
+
+if __name__ == '__main__':
+    unittest.main()
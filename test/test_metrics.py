@@ -0,0 +1,96 @@
+from pynsim import Simulator, Network, Node, Engine
+from pynsim.metrics import MetricsExporter
+from urllib.error import URLError
+from urllib.request import urlopen
+import unittest
+
+
+class Tank(Node):
+    _properties = {'S': 0.0}
+
+
+def scrape(url):
+    """
+        Read the samples of a Prometheus text page into a dict.
+    """
+    response = urlopen(url, timeout=5)
+    assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+    samples = {}
+    for line in response.read().decode('utf-8').splitlines():
+        if line.startswith('#'):
+            continue
+        name, value = line.rsplit(' ', 1)
+        samples[name] = float(value)
+    return samples
+
+
+class FillEngine(Engine):
+    name = "Fill engine"
+
+    def run(self):
+        for n in self.target.nodes:
+            n.S += 1.0
+        if self.iteration == 2:
+            raise StopIteration()
+
+
+class ScrapeEngine(Engine):
+    """
+        Scrapes the metrics during the run, as a monitoring server would.
+    """
+    name = "Scrape engine"
+
+    def __init__(self, target, exporter):
+        super(ScrapeEngine, self).__init__(target)
+        self.exporter = exporter
+        self.scrapes = {}
+
+    def run(self):
+        self.scrapes[self.timestep_idx] = scrape(self.exporter.url)
+
+
+class MetricsTest(unittest.TestCase):
+
+    def test_scrape(self):
+        network = Network("Metrics test network")
+        network.add_nodes(Tank(x=0, y=0, name="T1"), Tank(x=1, y=0, name="T2"))
+        exporter = MetricsExporter(port=0, history_interval=1)
+        scraper = ScrapeEngine(network, exporter)
+
+        s = Simulator(network, metrics=exporter, max_iterations=3)
+        s.add_engine(FillEngine(network))
+        s.add_engine(scraper)
+        s.set_timesteps(range(5))
+        s.start()
+
+        labels = '{network="Metrics test network"}'
+        engine_labels = '{network="Metrics test network",engine="Fill engine"}'
+        first, last = scraper.scrapes[0], scraper.scrapes[4]
+        assert first['pynsim_timesteps_total' + labels] == 0
+        assert last['pynsim_timesteps_total' + labels] == 4
+        assert last['pynsim_timesteps_per_second' + labels] > 0
+        #The fill engine stops the iterations in the second one
+        assert last['pynsim_iterations' + labels] == 2
+        #Runs which raise StopIteration are not timed, as with record_time
+        assert last['pynsim_engine_runs_total' + engine_labels] == 5
+        assert last['pynsim_engine_seconds_total' + engine_labels] > 0
+        assert last['pynsim_resident_memory_bytes' + labels] > 1e6
+        assert last['pynsim_history_bytes' + labels] > first['pynsim_history_bytes' + labels]
+
+        #The server stops with the simulation
+        self.assertRaises(URLError, urlopen, exporter.url, timeout=1)
+
+    def test_not_found(self):
+        network = Network("Metrics test network")
+        exporter = MetricsExporter()
+        s = Simulator(network)
+        exporter.start(s)
+        try:
+            self.assertRaises(URLError, urlopen, exporter.url.replace('metrics', 'other'), timeout=5)
+            assert scrape(exporter.url)['pynsim_timesteps_total{network="Metrics test network"}'] == 0
+        finally:
+            exporter.stop()
+
+
+if __name__ == '__main__':
+    unittest.main()
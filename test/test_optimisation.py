@@ -0,0 +1,101 @@
+from pynsim import Simulator, Network, Node
+from pynsim.engines import OptimisationEngine
+import unittest
+
+
+class DemandNode(Node):
+    _properties = {
+        'demand': 0.0,
+        'delivery': 0.0,
+    }
+
+    def setup(self, timestamp):
+        self.demand = 10.0 * (timestamp + 1)
+
+
+class CapacityEngine(OptimisationEngine):
+    """
+        Deliver as much of each demand as the capacity allows. The 'model' is
+        just a dict, to test the build/update/solve cycle.
+    """
+    def __init__(self, target, capacity, **kwargs):
+        super(CapacityEngine, self).__init__(target, **kwargs)
+        self.capacity = capacity
+        self.update_count = 0
+        self.warm_starts = []
+
+    def build_model(self):
+        return {'nodes': list(self.target.nodes), 'demand': {}}
+
+    def update_model(self, model):
+        self.update_count += 1
+        for n in model['nodes']:
+            model['demand'][n.name] = n.demand
+
+    def solve(self, model, warm_start=None):
+        self.warm_starts.append(warm_start)
+        return dict((name, min(d, self.capacity)) for name, d in model['demand'].items())
+
+    def extract_results(self, model, solution):
+        for n in model['nodes']:
+            n.delivery = solution[n.name]
+
+
+def simulate(**kwargs):
+    network = Network("Optimisation test network")
+    network.add_nodes(DemandNode(x=0, y=0, name="D1"), DemandNode(x=1, y=0, name="D2"))
+    engine = CapacityEngine(network, 25.0, **kwargs)
+    s = Simulator(network)
+    s.add_engine(engine)
+    s.set_timesteps(range(4))
+    s.start()
+    return network, engine
+
+
+class OptimisationEngineTest(unittest.TestCase):
+
+    def test_build_once(self):
+        """
+            Test that the model is built once and updated every timestep.
+        """
+        network, engine = simulate()
+        assert engine.build_count == 1
+        assert engine.update_count == 4
+        assert network.nodes[0]._history['delivery'] == [10.0, 20.0, 25.0, 25.0]
+
+    def test_warm_start(self):
+        """
+            Test that the previous timestep's solution is used as a warm start.
+        """
+        network, engine = simulate()
+        assert engine.warm_starts[0] is None
+        assert engine.warm_starts[2] == {'D1': 20.0, 'D2': 20.0}
+
+        network, engine = simulate(warm_start=False)
+        assert engine.warm_starts == [None] * 4
+
+    def test_rebuild(self):
+        """
+            Test that the model is rebuilt on request.
+        """
+        network, engine = simulate()
+        engine.rebuild()
+        engine.run()
+        assert engine.build_count == 2
+
+    def test_rebuild_on_topology_change(self):
+        """
+            Test that the model is rebuilt when a node is added.
+        """
+        network, engine = simulate()
+        engine.run()
+        assert engine.build_count == 1
+
+        network.add_node(DemandNode(x=2, y=0, name="D3", demand=5.0))
+        engine.run()
+        assert engine.build_count == 2
+        assert network.get_node('D3').delivery == 5.0
+
+
+if __name__ == '__main__':
+    unittest.main()
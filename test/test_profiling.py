@@ -0,0 +1,116 @@
+from pynsim import Simulator, Network, Node, Engine
+from pynsim.profiling import PhaseProfiler
+import os
+import pstats
+import shutil
+import tempfile
+import time
+import unittest
+
+
+def slow_inflow(timestamp):
+    total = 0
+    for i in range(2000):
+        total += i
+    return float(timestamp)
+
+
+def busy_wait(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class Reservoir(Node):
+    _properties = {'inflow': None, 'S': 0.0}
+
+    def setup(self, timestamp):
+        self.inflow = slow_inflow(timestamp)
+
+
+class Junction(Node):
+    _properties = {'inflow': None}
+
+    def setup(self, timestamp):
+        self.inflow = 0.0
+
+
+def storage_balance(nodes):
+    for n in nodes:
+        n.S += n.inflow
+
+
+class BalanceEngine(Engine):
+    name = "Balance engine"
+
+    def run(self):
+        storage_balance(self.target.get_nodes('Reservoir'))
+
+
+class OtherEngine(Engine):
+    name = "Other engine"
+
+    def run(self):
+        busy_wait(0.02)
+
+
+def build_simulator(profile, timesteps=5):
+    network = Network("Profiling test network")
+    network.add_nodes(Reservoir(x=0, y=0, name="R1"), Reservoir(x=0, y=1, name="R2"),
+                      Junction(x=1, y=0, name="J"))
+    s = Simulator(network, profile=profile)
+    s.add_engine(BalanceEngine(network))
+    s.add_engine(OtherEngine(network))
+    s.set_timesteps(range(timesteps))
+    return s
+
+
+def calls(path, function):
+    stats = pstats.Stats(path)
+    return sum(v[1] for k, v in stats.stats.items() if k[2] == function)
+
+
+class ProfilingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_phases(self):
+        profile = PhaseProfiler(self.tmp_dir, engines=['Balance engine'],
+                                component_types=['Reservoir'], post_process=True,
+                                timesteps=range(1, 3))
+        build_simulator(profile).start()
+
+        assert sorted(os.listdir(self.tmp_dir)) == \
+            ['engine-Balance_engine.pstats', 'post_process.pstats', 'setup-Reservoir.pstats']
+
+        #Only timesteps 1 and 2 are profiled
+        engine_path = os.path.join(self.tmp_dir, 'engine-Balance_engine.pstats')
+        assert calls(engine_path, 'storage_balance') == 2
+        assert calls(engine_path, 'busy_wait') == 0
+
+        setup_path = os.path.join(self.tmp_dir, 'setup-Reservoir.pstats')
+        assert calls(setup_path, 'slow_inflow') == 4
+        assert calls(os.path.join(self.tmp_dir, 'post_process.pstats'), 'post_process') >= 2
+
+    def test_sampling(self):
+        profile = PhaseProfiler(self.tmp_dir, engines=['Other engine'], profiler='sampling')
+        build_simulator(profile, timesteps=3).start()
+
+        with open(os.path.join(self.tmp_dir, 'engine-Other_engine.collapsed')) as f:
+            lines = f.read().splitlines()
+        assert len(lines) > 0
+        assert any('busy_wait' in line for line in lines)
+        assert not any('storage_balance' in line for line in lines)
+        stack, count = lines[0].rsplit(' ', 1)
+        assert int(count) > 0
+
+    def test_unknown_profiler(self):
+        self.assertRaises(Exception, PhaseProfiler, self.tmp_dir, profiler='perf')
+
+
+if __name__ == '__main__':
+    unittest.main()
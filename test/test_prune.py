@@ -0,0 +1,207 @@
+from pynsim import Simulator, Network, Node, Link, Institution, Engine
+from pynsim.engines import RoutingEngine
+import unittest
+
+
+class Catchment(Node):
+    _properties = {'inflow': 0.0, 'outflow': None}
+
+    def setup(self, timestamp):
+        self.inflow = self._inflow[timestamp]
+
+
+class Reservoir(Node):
+    _properties = {'inflow': 0.0, 'outflow': None, 'S': None, 'actual_release': None,
+                   'init_stor': 20.0, 'min_stor': 0.0, 'max_stor': 50.0,
+                   'target_release': 5.0}
+
+
+class RainNetwork(Network):
+    _properties = {'rain': 0.0}
+
+    def setup(self, timestamp):
+        self.rain = 2.0 * (timestamp + 1)
+
+
+class RainCatchment(Catchment):
+    """
+        A catchment whose inflow is the rain which falls on the network.
+    """
+    def setup(self, timestamp):
+        self.inflow = self._inflow[timestamp] + self.network.rain
+
+
+class River(Link):
+    _properties = {'flow': None}
+
+
+class Operator(Institution):
+    _properties = {'releases': None}
+
+
+class Authority(Institution):
+    _properties = {'total_inflow': None}
+
+
+class TotalInflowEngine(Engine):
+    """
+        Sets the total inflow of the authority's catchments, and releases
+        a share of it from its reservoir.
+    """
+    def run(self):
+        total = sum(n.inflow for n in self.target.nodes if n.component_type == 'Catchment')
+        self.target.total_inflow = total
+        for n in self.target.nodes:
+            if n.component_type == 'Reservoir':
+                n.target_release = total / 4
+
+
+class OperatorEngine(Engine):
+    """
+        Sets the target release of the operator's reservoirs.
+    """
+    def run(self):
+        for n in self.target.nodes:
+            n.target_release = 5.0 + self.timestep
+
+
+def build_network(network_class=Network, catchment_class=Catchment):
+    """
+        C1 -> R1 -> J -> Out1
+        C2 ---------^
+        C3 -> R2 -> Out2
+    """
+    network = network_class("Prune test network")
+    c1 = catchment_class(x=0, y=2, name="C1")
+    c1._inflow = {0: 10.0, 1: 2.0, 2: 8.0}
+    c2 = catchment_class(x=0, y=1, name="C2")
+    c2._inflow = {0: 1.0, 1: 1.0, 2: 1.0}
+    c3 = Catchment(x=0, y=0, name="C3")
+    c3._inflow = {0: 3.0, 1: 3.0, 2: 3.0}
+    r1 = Reservoir(x=1, y=2, name="R1")
+    r2 = Reservoir(x=1, y=0, name="R2")
+    j = Catchment(x=2, y=1, name="J")
+    j._inflow = {0: 0.0, 1: 0.0, 2: 0.0}
+    out1 = Catchment(x=3, y=1, name="Out1")
+    out1._inflow = j._inflow
+    out2 = Catchment(x=2, y=0, name="Out2")
+    out2._inflow = j._inflow
+    network.add_nodes(c1, c2, c3, r1, r2, j, out1, out2)
+    network.add_links(River(start_node=c1, end_node=r1, name="C1-R1"),
+                      River(start_node=r1, end_node=j, name="R1-J"),
+                      River(start_node=c2, end_node=j, name="C2-J"),
+                      River(start_node=j, end_node=out1, name="J-Out1"),
+                      River(start_node=c3, end_node=r2, name="C3-R2"),
+                      River(start_node=r2, end_node=out2, name="R2-Out2"))
+    operator1 = Operator("Operator1", nodes=[r1])
+    operator2 = Operator("Operator2", nodes=[r2])
+    network.add_institutions(operator1, operator2)
+    return network
+
+
+def build_simulator(network):
+    s = Simulator(network)
+    s.add_engine(OperatorEngine(network.get_institution('Operator1')))
+    s.add_engine(OperatorEngine(network.get_institution('Operator2')))
+    s.add_engine(RoutingEngine(network, storage_types=['Reservoir']))
+    s.set_timesteps(range(3))
+    return s
+
+
+class PruneTest(unittest.TestCase):
+
+    def test_closure(self):
+        network = build_network()
+        closure = network.upstream_closure(['Out1'])
+        assert [n.name for n in closure.nodes] == ['C1', 'C2', 'R1', 'J', 'Out1']
+        assert [l.name for l in closure.links] == ['C1-R1', 'R1-J', 'C2-J', 'J-Out1']
+        assert [i.name for i in closure.institutions] == ['Operator1']
+        #Components are shared, not copied
+        assert closure.get_node('R1') is network.get_node('R1')
+
+        closure = network.upstream_closure([network.get_link('R1-J')])
+        assert [n.name for n in closure.nodes] == ['C1', 'R1', 'J']
+        assert [l.name for l in closure.links] == ['C1-R1', 'R1-J']
+
+        self.assertRaises(Exception, network.upstream_closure, ['Nowhere'])
+
+    def test_institution_members(self):
+        """
+            An institution in the closure brings in all its members, and what
+            is upstream of them, so that it acts on the same values in a
+            pruned simulation as in the full one.
+        """
+        def build():
+            network = build_network()
+            authority = Authority("Authority",
+                                  nodes=[network.get_node('R1'), network.get_node('C3')])
+            network.add_institution(authority)
+            s = build_simulator(network)
+            s.engines = []
+            s.add_engine(TotalInflowEngine(authority))
+            s.add_engine(RoutingEngine(network, storage_types=['Reservoir']))
+            return network, s
+
+        full, s = build()
+        s.start()
+
+        network, s = build()
+        closure = network.upstream_closure(['Out1'])
+        assert [n.name for n in closure.nodes] == ['C1', 'C2', 'C3', 'R1', 'J', 'Out1']
+        assert [i.name for i in closure.institutions] == ['Operator1', 'Authority']
+
+        #Members are added until nothing more is: C3 brings in an
+        #institution with R2, which brings in R2 and Operator2
+        other, _ = build()
+        other.add_institution(Authority("Basin", nodes=[other.get_node('C3'),
+                                                        other.get_node('R2')]))
+        closure = other.upstream_closure(['Out1'])
+        assert [n.name for n in closure.nodes] == ['C1', 'C2', 'C3', 'R1', 'R2', 'J', 'Out1']
+        assert [i.name for i in closure.institutions] == \
+            ['Operator1', 'Operator2', 'Authority', 'Basin']
+
+        s.pruned(['Out1']).start()
+        assert network.get_institution('Authority')._history['total_inflow'] == \
+            full.get_institution('Authority')._history['total_inflow']
+        assert network.get_node('Out1')._history['outflow'] == \
+            full.get_node('Out1')._history['outflow']
+
+    def test_same_results(self):
+        full = build_network()
+        build_simulator(full).start()
+
+        network = build_network()
+        simulator = build_simulator(network)
+        pruned = simulator.pruned(['Out1'])
+        assert len(pruned.engines) == 2
+        assert pruned.engines[1].target is pruned.network
+        assert simulator.engines[2].target is network
+        pruned.start()
+
+        assert network.get_node('Out1')._history['outflow'] == \
+            full.get_node('Out1')._history['outflow']
+        assert network.get_node('R1')._history['S'] == full.get_node('R1')._history['S']
+        #Nothing outside the closure was simulated
+        assert network.get_node('Out2')._history['outflow'] == []
+
+    def test_network_setup(self):
+        """
+            The components of the pruned network see the values which its
+            setup sets, and refer to the whole network again afterwards.
+        """
+        full = build_network(RainNetwork, RainCatchment)
+        build_simulator(full).start()
+        assert full.get_node('C1')._history['inflow'] == [12.0, 6.0, 14.0]
+
+        network = build_network(RainNetwork, RainCatchment)
+        pruned = build_simulator(network).pruned(['Out1'])
+        pruned.start()
+
+        assert pruned.network._history['rain'] == [2.0, 4.0, 6.0]
+        for name in ('C1', 'C2', 'R1', 'Out1'):
+            assert network.get_node(name)._history == full.get_node(name)._history
+        assert network.get_node('C1').network is network
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+from pynsim import Simulator, DecomposedSimulator, Network, Node, Institution, Engine
+from pynsim.rng import RandomStreams
+import unittest
+
+
+class StochasticNode(Node):
+    _properties = {
+        'demand': None,
+        'bulk': None,
+    }
+
+    def setup(self, timestamp):
+        self.demand = self.rng.normal(10, 2)
+
+
+class BulkEngine(Engine):
+    def run(self):
+        nodes = self.target.get_nodes('StochasticNode')
+        for node, value in zip(nodes, self.target.draw_random('StochasticNode', 'uniform', 0, 1)):
+            node.bulk = value
+
+
+def run(seed, names=("A", "B", "C")):
+    network = Network("RNG test network")
+    for i, name in enumerate(names):
+        network.add_node(StochasticNode(x=i, y=0, name=name))
+
+    s = Simulator(network, seed=seed)
+    s.add_engine(BulkEngine(network))
+    s.set_timesteps(range(5))
+    s.start()
+
+    return dict((n.name, n._history) for n in network.nodes)
+
+
+def run_partitioned(simulator_class, **kwargs):
+    """
+        Two institutions of stochastic nodes, which a DecomposedSimulator
+        simulates in separate processes.
+    """
+    network = Network("RNG partition test network")
+    for basin in ("A", "B"):
+        institution = Institution("Basin %s" % basin)
+        for i in range(3):
+            node = StochasticNode(x=i, y=0, name="%s%s" % (basin, i))
+            network.add_node(node)
+            institution.add_node(node)
+        network.add_institution(institution)
+
+    s = simulator_class(network, seed=42, **kwargs)
+    s.add_engine(BulkEngine(network))
+    s.set_timesteps(range(5))
+    s.start()
+
+    return dict((n.name, n._history) for n in network.nodes)
+
+
+class RandomStreamsTest(unittest.TestCase):
+
+    def test_reproducible(self):
+        """
+            Test that runs with the same seed produce identical histories,
+            and runs with different seeds do not.
+        """
+        assert run(42) == run(42)
+        assert run(42)['A']['demand'] != run(43)['A']['demand']
+
+    def test_order_independent(self):
+        """
+            Test that a component's stream does not depend on the order in
+            which components are set up.
+        """
+        forward = run(42, names=("A", "B", "C"))
+        backward = run(42, names=("C", "B", "A"))
+        for name in ("A", "B", "C"):
+            assert forward[name]['demand'] == backward[name]['demand']
+
+    def test_partitioned(self):
+        """
+            Test that bulk draws give each component the same values whether
+            the network is simulated whole or in partitions.
+        """
+        serial = run_partitioned(Simulator)
+        partitioned = run_partitioned(DecomposedSimulator, partition='institution')
+        assert len(set(serial['A0']['bulk'])) == 5
+        assert serial == partitioned
+
+    def test_bulk_draws(self):
+        """
+            Test that a component's bulk draws do not depend on the other
+            components drawn with it.
+        """
+        nodes = [StochasticNode(x=i, y=0, name=name) for i, name in enumerate("ABC")]
+        together = RandomStreams(1).draw(nodes, 'normal', 0, 1)
+        alone = RandomStreams(1).draw(nodes[1:2], 'normal', 0, 1)
+        assert together.shape == (3,)
+        assert together[1] == alone[0]
+        assert RandomStreams(1).draw(nodes, 'uniform', 0, 1, size=2).shape == (3, 2)
+
+    def test_shared_draws(self):
+        """
+            Test that a shared stream draws the values of all the components
+            at once.
+        """
+        nodes = [StochasticNode(x=i, y=0, name=name) for i, name in enumerate("ABC")]
+        values = RandomStreams(1).draw(nodes, 'normal', 0, 1, shared=('nodes',))
+        assert values.shape == (3,)
+        assert list(values) == list(RandomStreams(1).stream('shared', 'nodes').normal(0, 1, 3))
+        assert len(set(values)) == 3
+        assert RandomStreams(1).draw(nodes, 'uniform', 0, 1, size=2, shared=('nodes',)).shape == (3, 2)
+        assert RandomStreams(1).draw(nodes, 'random', size=(2, 4), shared=('nodes',)).shape == (3, 2, 4)
+
+        network = Network("RNG test network")
+        network.add_nodes(*nodes)
+        network.random_streams = RandomStreams(1)
+        assert list(network.draw_random('StochasticNode', 'normal', 0, 1, shared=('nodes',))) == \
+            list(values)
+
+    def test_independent_streams(self):
+        """
+            Test that each component, engine and scenario has its own stream.
+        """
+        streams = RandomStreams(1)
+        a = streams.stream('component', 'node', 'A').random()
+        b = streams.stream('component', 'node', 'B').random()
+        assert a != b
+
+        other = streams.for_scenario('dry year')
+        assert other.stream('component', 'node', 'A').random() != a
+
+        streams.reset()
+        assert streams.stream('component', 'node', 'A').random() == a
+
+    def test_no_seed(self):
+        """
+            Test that asking for a stream without a seed raises an error.
+        """
+        network = Network("RNG test network")
+        network.add_node(StochasticNode(x=0, y=0, name="A"))
+        s = Simulator(network)
+        s.set_timesteps([0])
+        with self.assertRaises(RuntimeError):
+            s.start()
+
+
+if __name__ == '__main__':
+    unittest.main()
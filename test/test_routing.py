@@ -0,0 +1,191 @@
+from pynsim import Simulator, Network, Node, Link
+from pynsim.engines import RoutingEngine
+from pynsim.topology import topological_levels
+import unittest
+
+
+class Catchment(Node):
+    _properties = {'inflow': 0.0, 'outflow': None}
+
+    def setup(self, timestamp):
+        self.inflow = self._inflow[timestamp]
+
+
+class Junction(Node):
+    _properties = {'outflow': None}
+
+
+class Reservoir(Node):
+    _properties = {'S': None, 'actual_release': None, 'outflow': None,
+                   'init_stor': 50.0, 'min_stor': 10.0, 'max_stor': 100.0,
+                   'target_release': None, 'inflow': 0.0}
+
+
+class River(Link):
+    _properties = {'flow': None, 'outflow': None, 'split': None,
+                   'lag': 0, 'muskingum_k': 0.0, 'muskingum_x': 0.0}
+
+
+def build_network(inflows=None):
+    """
+        C1 -> J -> R -> Out
+        C2 ---^
+    """
+    network = Network("Routing test network")
+    c1 = Catchment(x=0, y=1, name="C1")
+    c1._inflow = inflows or {0: 10.0, 1: 20.0, 2: 0.0, 3: 0.0}
+    c2 = Catchment(x=0, y=0, name="C2")
+    c2._inflow = dict((t, 5.0) for t in c1._inflow)
+    j = Junction(x=1, y=0, name="J")
+    r = Reservoir(x=2, y=0, name="R")
+    out = Junction(x=3, y=0, name="Out")
+    network.add_nodes(c1, c2, j, r, out)
+    network.add_links(River(start_node=c1, end_node=j, name="C1-J"),
+                      River(start_node=c2, end_node=j, name="C2-J"),
+                      River(start_node=j, end_node=r, name="J-R"),
+                      River(start_node=r, end_node=out, name="R-Out"))
+    return network
+
+
+def run(network, engine, timesteps):
+    s = Simulator(network)
+    s.add_engine(engine)
+    s.set_timesteps(range(timesteps))
+    s.start()
+
+
+class RoutingEngineTest(unittest.TestCase):
+
+    def test_levels(self):
+        network = build_network()
+        levels = topological_levels(network)
+        assert [[n.name for n in level] for level in levels] == \
+            [['C1', 'C2'], ['J'], ['R'], ['Out']]
+
+        network.add_link(River(start_node=network.get_node('Out'),
+                               end_node=network.get_node('J'), name="Out-J"))
+        self.assertRaises(RuntimeError, topological_levels, network)
+
+    def test_pass_through(self):
+        network = build_network()
+        run(network, RoutingEngine(network), 4)
+
+        assert network.get_node('J')._history['outflow'] == [15.0, 25.0, 5.0, 5.0]
+        assert network.get_node('Out')._history['outflow'] == [15.0, 25.0, 5.0, 5.0]
+        assert network.get_link('J-R')._history['flow'] == [15.0, 25.0, 5.0, 5.0]
+
+    def test_storage_bounds(self):
+        """
+            The reservoir releases its target unless that would take it
+            above max_stor or below min_stor.
+        """
+        network = build_network()
+        reservoir = network.get_node('R')
+        reservoir.target_release = 0.0
+        run(network, RoutingEngine(network, storage_types=['Reservoir']), 4)
+
+        #Fills up to max_stor (100), then spills.
+        assert reservoir._history['S'] == [65.0, 90.0, 95.0, 100.0]
+        assert reservoir._history['actual_release'] == [0.0, 0.0, 0.0, 0.0]
+
+        network = build_network()
+        reservoir = network.get_node('R')
+        reservoir.target_release = 30.0
+        run(network, RoutingEngine(network, storage_types=['Reservoir']), 4)
+
+        assert reservoir._history['S'] == [35.0, 30.0, 10.0, 10.0]
+        assert reservoir._history['actual_release'] == [30.0, 30.0, 25.0, 5.0]
+        assert network.get_node('Out')._history['outflow'] == [30.0, 30.0, 25.0, 5.0]
+
+    def test_without_history(self):
+        """
+            The reservoir carries its storage over from one timestep to the
+            next without the history being recorded.
+        """
+        results = {}
+        for record_history in (True, False):
+            network = build_network()
+            network.get_node('R').target_release = 30.0
+            s = Simulator(network, record_history=record_history)
+            s.add_engine(RoutingEngine(network, storage_types=['Reservoir']))
+            s.set_timesteps(range(4))
+            results[record_history] = [step['R']['S'] for step in s.steps()]
+            if not record_history:
+                assert network.get_node('R')._history['S'] == [10.0]
+
+        assert results[False] == results[True] == [35.0, 30.0, 10.0, 10.0]
+
+    def test_split(self):
+        network = build_network()
+        j = network.get_node('J')
+        side = Junction(x=2, y=1, name="Side")
+        network.add_node(side)
+        network.add_link(River(start_node=j, end_node=side, name="J-Side", split=0.2))
+        network.get_link('J-R').split = 0.8
+        run(network, RoutingEngine(network), 1)
+
+        assert side.outflow == 3.0
+        assert network.get_node('Out').outflow == 12.0
+
+    def test_lag(self):
+        network = build_network({0: 10.0, 1: 20.0, 2: 30.0, 3: 40.0})
+        network.get_link('C1-J').lag = 2
+        run(network, RoutingEngine(network, routing='lag'), 4)
+
+        link = network.get_link('C1-J')
+        assert link._history['flow'] == [10.0, 20.0, 30.0, 40.0]
+        #Steady state before the first timestep
+        assert link._history['outflow'] == [10.0, 10.0, 10.0, 20.0]
+        assert network.get_node('Out')._history['outflow'] == [15.0, 15.0, 15.0, 25.0]
+
+    def test_muskingum(self):
+        network = build_network({0: 10.0, 1: 20.0, 2: 20.0, 3: 20.0})
+        link = network.get_link('C1-J')
+        link.muskingum_k = 2.0
+        link.muskingum_x = 0.25
+        run(network, RoutingEngine(network, routing='muskingum'), 4)
+
+        #C0 = 0, C1 = 0.5, C2 = 0.5
+        assert link._history['outflow'] == [10.0, 10.0, 15.0, 17.5]
+        #Links with K = 0 pass flow straight on
+        assert network.get_link('C2-J')._history['outflow'] == [5.0, 5.0, 5.0, 5.0]
+
+    def test_iterations(self):
+        """
+            Running the engine more than once in a timestep does not advance
+            the routing.
+        """
+        network = build_network({0: 10.0, 1: 20.0, 2: 30.0, 3: 40.0})
+        network.get_link('C1-J').lag = 1
+        s = Simulator(network, max_iterations=3)
+        s.add_engine(RoutingEngine(network, routing='lag'))
+        s.set_timesteps(range(4))
+        s.start()
+
+        assert network.get_link('C1-J')._history['outflow'] == [10.0, 10.0, 20.0, 30.0]
+
+    def test_large_network(self):
+        """
+            Route a long chain with tributaries.
+        """
+        network = Network("Large routing network")
+        n = 2000
+        main = [Junction(x=i, y=0, name="M%s" % i) for i in range(n)]
+        tributaries = []
+        for i in range(n):
+            c = Catchment(x=i, y=1, name="T%s" % i)
+            c._inflow = {0: 1.0}
+            tributaries.append(c)
+        network.add_nodes(*(main + tributaries))
+        network.add_links(*[River(start_node=main[i], end_node=main[i + 1], name="M%s" % i)
+                            for i in range(n - 1)])
+        network.add_links(*[River(start_node=tributaries[i], end_node=main[i], name="T%s" % i)
+                            for i in range(n)])
+        run(network, RoutingEngine(network), 1)
+
+        assert main[-1].outflow == float(n)
+        assert main[n // 2].outflow == float(n // 2 + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+from pynsim import Simulator, Network, Node, Engine
+from pynsim.shared import SharedHistory
+from multiprocessing import Process, Queue
+import os
+import tempfile
+import unittest
+
+
+class SharedTestNode(Node):
+    _properties = {
+        'Q': 0.0,
+    }
+
+
+class ScaleEngine(Engine):
+    def __init__(self, target, factor):
+        super(ScaleEngine, self).__init__(target)
+        self.factor = factor
+
+    def run(self):
+        for n in self.target.nodes:
+            n.Q = self.factor * (self.timestep_idx + 1)
+
+
+def run_member(member, descriptor, queue):
+    network = Network("Shared test network")
+    network.add_nodes(SharedTestNode(x=0, y=0, name="N1"),
+                      SharedTestNode(x=1, y=0, name="N2"))
+    s = Simulator(network)
+    s.add_engine(ScaleEngine(network, member))
+    s.set_timesteps(range(4))
+    s.start()
+
+    results = SharedHistory.attach(descriptor)
+    results.write(member, network)
+    results.close()
+    queue.put(member)
+
+
+class SharedHistoryTest(unittest.TestCase):
+
+    def _run_members(self, results, members):
+        queue = Queue()
+        processes = [Process(target=run_member,
+                             args=(m, results.descriptor, queue))
+                     for m in range(members)]
+        for p in processes:
+            p.start()
+        done = sorted(queue.get(timeout=30) for _ in processes)
+        for p in processes:
+            p.join()
+        assert done == list(range(members))
+
+    def test_shared_memory(self):
+        """
+            Test that workers can write their history into shared memory
+            owned by the parent.
+        """
+        with SharedHistory([('N1', 'Q'), ('N2', 'Q')], members=3,
+                           timesteps=4) as results:
+            self._run_members(results, 3)
+            q = results.get('N2', 'Q').copy()
+
+        assert q.shape == (3, 4)
+        assert q[2].tolist() == [2.0, 4.0, 6.0, 8.0]
+        assert q[0].tolist() == [0.0, 0.0, 0.0, 0.0]
+
+    def test_memory_mapped_file(self):
+        """
+            Test collecting results through a memory-mapped file.
+        """
+        filename = os.path.join(tempfile.mkdtemp(), 'results.dat')
+        with SharedHistory([('N1', 'Q')], members=2, timesteps=4,
+                           filename=filename) as results:
+            self._run_members(results, 2)
+            q = results.get('N1', 'Q').copy()
+
+        assert q[1].tolist() == [1.0, 2.0, 3.0, 4.0]
+        assert not os.path.exists(filename)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+from pynsim import Simulator, Network, Node, Engine
+import asyncio
+import itertools
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class Tank(Node):
+    _properties = {'inflow': 0.0, 'S': 0.0}
+
+    def setup(self, timestamp):
+        self.inflow = float(timestamp)
+
+
+class FillEngine(Engine):
+    torn_down = 0
+
+    def run(self):
+        for n in self.target.nodes:
+            n.S += n.inflow
+
+    def teardown(self):
+        self.torn_down += 1
+
+
+class FailingEngine(Engine):
+    def run(self):
+        if self.timestep == 2:
+            raise ValueError("Failed at timestep 2")
+
+
+def build_simulator(timesteps, **kwargs):
+    network = Network("Steps test network")
+    network.add_nodes(Tank(x=0, y=0, name="T1"), Tank(x=1, y=0, name="T2"))
+    s = Simulator(network, **kwargs)
+    s.add_engine(FillEngine(network))
+    s.set_timesteps(timesteps)
+    return s
+
+
+class StepsTest(unittest.TestCase):
+
+    def test_steps(self):
+        """
+            Each step shows the values at the end of its timestep, and the
+            history is the same as running start().
+        """
+        s = build_simulator(range(4))
+        seen = []
+        for step in s.steps():
+            seen.append((step.index, step.timestep, step['T1']['S'], step.get('T2', 'inflow')))
+            assert step.values('S') == {'T1': step['T1']['S'], 'T2': step['T2']['S']}
+
+        assert seen == [(0, 0, 0.0, 0.0), (1, 1, 1.0, 1.0), (2, 2, 3.0, 2.0), (3, 3, 6.0, 3.0)]
+
+        reference = build_simulator(range(4))
+        reference.start()
+        assert s.network.get_node('T1')._history == reference.network.get_node('T1')._history
+
+    def test_read_only(self):
+        s = build_simulator(range(2))
+        step = next(s.steps())
+        with self.assertRaises(TypeError):
+            step['T1']['S'] = 10.0
+        self.assertRaises(KeyError, step.__getitem__, 'T3')
+
+        #A copy stays as it was when the simulation moves on
+        copy = step.to_dict()
+        assert copy['T1']['S'] == 0.0
+        assert copy['Steps test network'] == {}
+
+    def test_stop_early(self):
+        """
+            The simulation only runs as far as the steps are consumed.
+        """
+        s = build_simulator(range(10))
+        for step in s.steps():
+            if step.index == 2:
+                break
+        assert s.network.get_node('T1')._history['S'] == [0.0, 1.0, 3.0]
+
+    def test_endless_without_history(self):
+        s = build_simulator(itertools.count(), record_history=False)
+        for step in s.steps():
+            if step.index == 999:
+                break
+
+        assert step['T1']['S'] == sum(range(1000))
+        #Only the last timestep, for engines which read the previous values
+        assert s.network.get_node('T1')._history['S'] == [sum(range(1000))]
+
+    def test_teardown(self):
+        """
+            The engines are torn down, and the tracer closed, when the steps
+            stop early or an engine fails.
+        """
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            s = build_simulator(range(10), trace=os.path.join(tmp_dir, 'trace.json'))
+            engine = s.engines[0]
+            steps = s.steps()
+            next(steps)
+            steps.close()
+            assert engine.torn_down == 1
+            assert s.tracer._file is None
+
+            s = build_simulator(range(10), trace=os.path.join(tmp_dir, 'trace2.json'))
+            s.add_engine(FailingEngine(s.network))
+            self.assertRaises(ValueError, s.start)
+            assert s.engines[0].torn_down == 1
+            assert s.tracer._file is None
+        finally:
+            shutil.rmtree(tmp_dir)
+
+    def test_steps_async(self):
+        s = build_simulator(range(3))
+
+        async def consume():
+            values = []
+            async for step in s.steps_async():
+                values.append(step['T2']['S'])
+            return values
+
+        assert asyncio.run(consume()) == [0.0, 1.0, 3.0]
+
+
+if __name__ == '__main__':
+    unittest.main()
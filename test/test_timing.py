@@ -0,0 +1,159 @@
+from pynsim import Simulator, Network, Node, Link, Engine
+from pynsim.timing import Histogram, bucket, bucket_value
+import asyncio
+import time
+import unittest
+
+
+class SlowNode(Node):
+    _properties = {'value': None}
+
+    def setup(self, timestamp):
+        time.sleep(0.002)
+        self.value = timestamp
+
+
+class FastNode(Node):
+    _properties = {'value': None}
+
+    def setup(self, timestamp):
+        self.value = timestamp
+
+
+class AsyncNode(Node):
+    _properties = {'value': None}
+
+    async def setup(self, timestamp):
+        await asyncio.sleep(0.002)
+        self.value = timestamp
+
+
+class River(Link):
+    _properties = {}
+
+
+class SleepEngine(Engine):
+    name = "Sleep engine"
+
+    def run(self):
+        time.sleep(0.001)
+
+
+def build_network(slow_class=SlowNode):
+    network = Network("Timing test network")
+    slow = slow_class(x=0, y=0, name="Slow")
+    fast = FastNode(x=1, y=0, name="Fast")
+    network.add_nodes(slow, fast)
+    network.add_link(River(start_node=slow, end_node=fast, name="Slow-Fast"))
+    return network
+
+
+class HistogramTest(unittest.TestCase):
+
+    def test_buckets(self):
+        for ns in [0, 1, 15, 16, 17, 1000, 123456, 10 ** 9, 10 ** 12]:
+            value = bucket_value(bucket(ns))
+            assert abs(value - ns) <= ns / 16.0 + 1, ns
+        assert bucket(10 ** 15) < 512
+
+    def test_percentiles(self):
+        histogram = Histogram()
+        for i in range(1, 101):
+            histogram.add(i * 1000)
+        assert abs(histogram.percentile(50) - 50e-6) < 50e-6 / 16
+        assert abs(histogram.percentile(99) - 99e-6) < 99e-6 / 16
+        assert histogram.summary()['count'] == 100
+        assert abs(histogram.summary()['mean'] - 50.5e-6) < 1e-12
+        assert Histogram().percentile(50) is None
+
+        #Adding an array of times gives the same histogram
+        import numpy as np
+        other = Histogram()
+        other.add_many(np.arange(1, 101, dtype=np.int64) * 1000)
+        assert list(other.counts) == list(histogram.counts)
+        other.merge(histogram)
+        assert other.count == 200
+
+
+class TimingTest(unittest.TestCase):
+
+    def test_record_time(self):
+        network = build_network()
+        s = Simulator(network, record_time=True)
+        s.add_engine(SleepEngine(network))
+        s.set_timesteps(range(5))
+        s.start()
+
+        #The network's timing is as it has always been
+        timing = network.timing
+        assert sorted(timing.keys()) == ['institutions', 'links', 'nodes', 'unknown']
+        assert sorted(timing['nodes'].keys()) == ['Fast', 'Slow']
+        assert timing['links'] == {'Slow-Fast': timing['links']['Slow-Fast']}
+        assert timing['nodes']['Slow'] >= 0.01
+        assert timing['nodes']['Fast'] < timing['nodes']['Slow']
+        assert abs(s.timing['nodes'] - sum(timing['nodes'].values())) < 1e-9
+        assert s.timing['engines']['Sleep engine'] >= 0.005
+
+        summary = s.timing_summary()
+        assert summary['engines']['Sleep engine']['count'] == 5
+        assert summary['engines']['Sleep engine']['p50'] >= 0.0009
+        assert summary['components']['SlowNode']['count'] == 5
+        assert summary['components']['SlowNode']['p99'] >= 0.0018
+        assert summary['components']['FastNode']['p50'] < 0.0018
+
+    def test_record_time_by_type(self):
+        network = build_network()
+        s = Simulator(network, record_time='types')
+        s.add_engine(SleepEngine(network))
+        s.set_timesteps(range(5))
+        s.start()
+
+        assert s.timing['nodes'] >= 0.01
+        assert s.timing['engines']['Sleep engine'] >= 0.005
+        summary = s.timing_summary()
+        assert summary['types']['SlowNode'] >= 0.01
+        assert summary['types']['FastNode'] < summary['types']['SlowNode']
+        assert abs(s.timing['nodes'] - summary['types']['SlowNode'] -
+                   summary['types']['FastNode']) < 1e-9
+        assert summary['engines']['Sleep engine']['count'] == 5
+        #Neither the components nor their histograms are timed
+        assert network.timing['nodes'] == {'Slow': 0, 'Fast': 0}
+        assert summary['components']['SlowNode']['count'] == 0
+
+        #The types' totals are also given when each component is timed
+        s = Simulator(build_network(), record_time=True)
+        s.set_timesteps(range(2))
+        s.start()
+        assert s.timing_summary()['types']['SlowNode'] >= 0.0036
+
+    def test_not_recorded(self):
+        network = build_network()
+        s = Simulator(network)
+        s.add_engine(SleepEngine(network))
+        s.set_timesteps(range(2))
+        s.start()
+
+        #Every component is listed, without any time
+        assert network.timing['nodes'] == {'Slow': 0, 'Fast': 0}
+        assert s.timing_summary()['engines']['Sleep engine']['count'] == 0
+
+    def test_new_components_keep_totals(self):
+        network = build_network()
+        network.setup_components(0, record_time=True)
+        slow = network.timing['nodes']['Slow']
+        network.add_node(FastNode(x=2, y=0, name="New"))
+        network.setup_components(1, record_time=True)
+        assert network.timing['nodes']['Slow'] >= slow + 0.0018
+        assert 'New' in network.timing['nodes']
+
+    def test_async_setup(self):
+        network = build_network(AsyncNode)
+        s = Simulator(network, record_time=True)
+        s.set_timesteps(range(2))
+        asyncio.run(s.start_async())
+        assert network.timing['nodes']['Slow'] >= 0.0036
+        assert s.timing_summary()['components']['AsyncNode']['count'] == 2
+
+
+if __name__ == '__main__':
+    unittest.main()
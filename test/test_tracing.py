@@ -0,0 +1,157 @@
+from pynsim import Simulator, Network, Node, Link, Engine
+from pynsim.tracing import Tracer
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+
+class Reservoir(Node):
+    _properties = {'S': 0.0}
+
+
+class Junction(Node):
+    _properties = {'Q': 0.0}
+
+
+class River(Link):
+    _properties = {}
+
+
+class FillEngine(Engine):
+    name = "Fill engine"
+
+    def run(self):
+        for n in self.target.get_nodes('Reservoir'):
+            n.S += 1.0
+
+
+class AsyncEngine(Engine):
+    name = "Async engine"
+
+    async def run(self):
+        await asyncio.sleep(0)
+
+
+def build_network():
+    network = Network("Tracing test network")
+    r1 = Reservoir(x=0, y=0, name="R1")
+    r2 = Reservoir(x=0, y=1, name="R2")
+    j = Junction(x=1, y=0, name="J")
+    network.add_nodes(r1, r2, j)
+    network.add_links(River(start_node=r1, end_node=j, name="R1-J"),
+                      River(start_node=r2, end_node=j, name="R2-J"))
+    return network
+
+
+class TracingTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def run_simulator(self, path, timesteps=3, **kwargs):
+        network = build_network()
+        s = Simulator(network, trace=path, max_iterations=2, **kwargs)
+        s.add_engine(FillEngine(network))
+        s.set_timesteps(range(timesteps))
+        s.start()
+        return s
+
+    def test_chrome(self):
+        path = os.path.join(self.tmp_dir, 'run.trace.json')
+        self.run_simulator(path)
+
+        with open(path) as f:
+            events = json.load(f)
+
+        names = [e['name'] for e in events]
+        assert names.count('timestep') == 6
+        assert names.count('Fill engine') == 6
+        assert names.count('post_process') == 3
+        assert names.count('network setup') == 3
+        #One span per run of components of the same type
+        assert names.count('Reservoir') == 3
+        assert names.count('River') == 3
+
+        engine = [e for e in events if e['name'] == 'Fill engine'][1]
+        assert engine['ph'] == 'X' and engine['args']['iteration'] == 2
+        reservoirs = [e for e in events if e['name'] == 'Reservoir'][0]
+        assert reservoirs['args']['components'] == 2
+
+        #Every span is within its timestep
+        begin = [e for e in events if e['name'] == 'timestep' and e['ph'] == 'B'][0]
+        end = [e for e in events if e['name'] == 'timestep' and e['ph'] == 'E'][0]
+        for e in events[events.index(begin) + 1:events.index(end)]:
+            assert begin['ts'] <= e['ts'] <= end['ts']
+            assert e['ts'] + e.get('dur', 0) <= end['ts']
+
+    def test_speedscope(self):
+        path = os.path.join(self.tmp_dir, 'run.speedscope.json')
+        self.run_simulator(path)
+
+        with open(path) as f:
+            data = json.load(f)
+        frames = [f['name'] for f in data['shared']['frames']]
+        events = data['profiles'][0]['events']
+        assert set(frames) == set(['timestep', 'network setup', 'Reservoir', 'Junction',
+                                   'River', 'Fill engine', 'post_process'])
+
+        #The events nest properly and are in order
+        stack = []
+        at = 0
+        for e in events:
+            assert e['at'] >= at
+            at = e['at']
+            if e['type'] == 'O':
+                stack.append(e['frame'])
+            else:
+                assert stack.pop() == e['frame']
+        assert stack == []
+        assert data['profiles'][0]['endValue'] == at
+
+    def test_small_buffer(self):
+        """
+            Events are written as the buffer fills up.
+        """
+        path = os.path.join(self.tmp_dir, 'run.trace.json')
+        tracer = Tracer(path, buffer_size=4)
+        tracer.open()
+        for i in range(10):
+            with tracer.span('span', args={'i': i}):
+                pass
+        assert tracer._n < 4
+        with open(path) as f:
+            written = f.read()
+        #Chrome can open a trace without its closing bracket
+        assert len(json.loads(written + ']')) >= 17
+        tracer.close()
+
+        with open(path) as f:
+            events = json.load(f)
+        assert len(events) == 21
+        assert [e['args']['i'] for e in events if e['ph'] == 'B'] == list(range(10))
+
+    def test_async(self):
+        path = os.path.join(self.tmp_dir, 'run.trace.json')
+        network = build_network()
+        s = Simulator(network, trace=path)
+        s.add_engine(FillEngine(network))
+        s.add_engine(AsyncEngine(network), depends_on=[])
+        s.set_timesteps(range(2))
+        asyncio.run(s.start_async())
+
+        with open(path) as f:
+            events = json.load(f)
+        engines = [e for e in events if e.get('cat') == 'engine' and e['ph'] == 'X']
+        assert sorted(set((e['name'], e['tid']) for e in engines)) == \
+            [('Async engine', 2), ('Fill engine', 1)]
+        assert len([e for e in events if e['name'] == 'engines']) == 4
+
+
+if __name__ == '__main__':
+    unittest.main()
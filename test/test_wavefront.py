@@ -0,0 +1,114 @@
+from pynsim import Simulator, Network, Node, Link
+from pynsim.engines import WavefrontEngine
+import unittest
+
+
+class Reach(Node):
+    _properties = {'inflow': 0.0, 'outflow': None}
+
+    def setup(self, timestamp):
+        self.inflow = 1.0 + timestamp
+
+
+class River(Link):
+    _properties = {}
+
+
+def route(positions, arrays, upstream):
+    """
+        Each reach loses 10% of the water flowing through it.
+    """
+    total = arrays['inflow'][positions] + upstream.sum(arrays['outflow'], positions)
+    arrays['outflow'][positions] = total * 0.9
+
+
+def failing(positions, arrays, upstream):
+    raise ValueError("Kernel failed")
+
+
+def build_network(depth=6, branching=3):
+    """
+        A dendritic network: every node has branching upstream nodes, down
+        to depth levels.
+    """
+    network = Network("Wavefront test network")
+    outlet = Reach(x=0, y=0, name="N0")
+    network.add_node(outlet)
+    level = [outlet]
+    count = 1
+    for _ in range(depth - 1):
+        next_level = []
+        for downstream in level:
+            for _ in range(branching):
+                node = Reach(x=count, y=0, name="N%s" % count)
+                count += 1
+                network.add_node(node)
+                network.add_link(River(start_node=node, end_node=downstream,
+                                       name="L%s" % node.name))
+                next_level.append(node)
+        level = next_level
+    return network
+
+
+def simulate(**kwargs):
+    network = build_network()
+    engine = WavefrontEngine(network, route, inputs=['inflow'], outputs=['outflow'], **kwargs)
+    s = Simulator(network)
+    s.add_engine(engine)
+    s.set_timesteps(range(2))
+    s.start()
+    return network, engine
+
+
+class WavefrontEngineTest(unittest.TestCase):
+
+    def test_serial(self):
+        network, engine = simulate(workers=0)
+        #A node with no upstream nodes
+        assert network.nodes[-1]._history['outflow'] == [0.9, 1.8]
+        #The outlet gets everything, less 10% per reach
+        expected = sum(3 ** d * 0.9 ** (d + 1) for d in range(6))
+        assert abs(network.get_node('N0')._history['outflow'][0] - expected) < 1e-9
+
+    def test_parallel(self):
+        """
+            Splitting the levels between workers gives the same results.
+        """
+        serial, _ = simulate(workers=0)
+        parallel, engine = simulate(workers=3, min_parallel=2)
+        assert engine._processes == []
+        for a, b in zip(serial.nodes, parallel.nodes):
+            assert a._history['outflow'] == b._history['outflow']
+
+    def test_worker_error(self):
+        network = build_network(depth=3)
+        engine = WavefrontEngine(network, failing, inputs=['inflow'], outputs=['outflow'],
+                                 workers=2, min_parallel=1)
+        engine.initialise()
+        try:
+            self.assertRaises(Exception, engine.run)
+        finally:
+            engine.teardown()
+
+    def test_topology_change(self):
+        network = build_network(depth=2)
+        for n in network.nodes:
+            n.inflow = 1.0
+        engine = WavefrontEngine(network, route, inputs=['inflow'], outputs=['outflow'],
+                                 workers=2, min_parallel=1)
+        engine.initialise()
+        try:
+            engine.run()
+            assert abs(network.get_node('N0').outflow - 0.9 * (1 + 3 * 0.9)) < 1e-9
+
+            extra = Reach(x=10, y=0, name="Extra", inflow=1.0)
+            network.add_node(extra)
+            network.add_link(River(start_node=extra, end_node=network.get_node('N0'), name="LExtra"))
+            engine.run()
+            assert abs(network.get_node('N0').outflow - 0.9 * (1 + 4 * 0.9)) < 1e-9
+        finally:
+            engine.teardown()
+
+
+if __name__ == '__main__':
+    unittest.main()